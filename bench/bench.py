@@ -0,0 +1,199 @@
+#!/usr/bin/env python3
+
+import sys
+import io
+import json
+import platform
+import subprocess
+import tracemalloc
+from argparse import ArgumentParser
+from contextlib import redirect_stdout
+from datetime import datetime
+from pathlib import Path
+from statistics import median
+from tempfile import TemporaryDirectory
+from time import perf_counter, process_time
+
+BENCH_DIR = Path(__file__).resolve().parent
+sys.path.insert(0, str(BENCH_DIR.parent / 'src'))
+
+from generate import TreeParams, add_tree_arguments, tree_params_from_args, write_fixture
+from bitportfolio import App
+from json2yml import convert_tree
+from compiled import COMPILED_SUFFIX
+
+RESULT_VERSION = 1
+COMPILED_DIR = 'portfolios-compiled'
+PHASES = ('traverse', 'calc', 'convert_symbols', 'get_quotes', 'quotes', 'render')
+
+class PhaseTimer():
+    wall: dict[str, float]
+    cpu: dict[str, float]
+    peak_memory: dict[str, int]
+
+    def __init__(self, memory: bool = False):
+        self.memory = memory
+        self.wall = {}
+        self.cpu = {}
+        self.peak_memory = {}
+
+    def run(self, name: str, func, *args, **kwargs):
+        if self.memory:
+            tracemalloc.reset_peak()
+            start_memory = tracemalloc.get_traced_memory()[0]
+
+        start_wall = perf_counter()
+        start_cpu = process_time()
+        result = func(*args, **kwargs)
+        self.wall[name] = perf_counter() - start_wall
+        self.cpu[name] = process_time() - start_cpu
+
+        if self.memory:
+            self.peak_memory[name] = tracemalloc.get_traced_memory()[1] - start_memory
+
+        return result
+
+def run_once(fixture_dir: Path, base_dir: Path, engine: str, jobs: int, detail: bool, memory: bool = False) -> PhaseTimer:
+    # The file data provider serves the generated quotes, no network needed.
+    app = App(
+        log_level='WARN',
+        base_dir=str(base_dir),
+        change_dir=str(fixture_dir),
+        show_transactions=detail,
+        data_provider_id='file',
+        cache=False,
+        quote_cache=False,
+        quote_store=False,
+        jobs=jobs,
+        engine=engine,
+    )
+    convert = app.config['convert']
+
+    timer = PhaseTimer(memory)
+    with redirect_stdout(io.StringIO()):
+        portfolio = timer.run('traverse', app._traverse, app.base_dir)
+        timer.run('calc', portfolio.calc)
+        symbols = timer.run('convert_symbols', portfolio.get_convert_symbols, convert)
+        quotes = timer.run('get_quotes', app._get_quotes, symbols, convert)
+        timer.run('quotes', portfolio.quotes, quotes, convert, engine=engine, detail=detail)
+        timer.run('render', app._print_portfolio, portfolio)
+
+    return timer
+
+def git_commit() -> str|None:
+    try:
+        result = subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=BENCH_DIR, capture_output=True, text=True, check=True)
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return result.stdout.strip()
+
+def run_bench(fixture_dir: Path, base_dir: Path, tree: dict, params: TreeParams, engine: str, jobs: int, detail: bool, repeat: int, memory: bool) -> dict:
+    # Warm up imports and file system caches.
+    run_once(fixture_dir, base_dir, engine, jobs, detail)
+
+    timers = [run_once(fixture_dir, base_dir, engine, jobs, detail) for _ in range(repeat)]
+
+    phases = {}
+    for name in PHASES:
+        wall = [timer.wall[name] for timer in timers]
+        cpu = [timer.cpu[name] for timer in timers]
+        phases[name] = {
+            'wall': wall,
+            'wall_min': min(wall),
+            'wall_median': median(wall),
+            'cpu_median': median(cpu),
+        }
+
+    # tracemalloc slows everything down, measure memory in a separate run.
+    if memory:
+        tracemalloc.start()
+        try:
+            timer = run_once(fixture_dir, base_dir, engine, jobs, detail, memory=True)
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+
+        for name in PHASES:
+            phases[name]['peak_memory'] = timer.peak_memory[name]
+
+    result = {
+        'version': RESULT_VERSION,
+        'meta': {
+            'date': datetime.now().isoformat(timespec='seconds'),
+            'commit': git_commit(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+        },
+        'params': {
+            **params.to_dict(),
+            'engine': engine,
+            'jobs': jobs,
+            'detail': detail,
+            'compiled': base_dir.name == COMPILED_DIR,
+            'repeat': repeat,
+        },
+        'tree': tree,
+        'phases': phases,
+        'total_wall_median': sum(phase['wall_median'] for phase in phases.values()),
+    }
+    if memory:
+        result['peak_memory'] = peak
+
+    return result
+
+def compare(base: dict, result: dict) -> str:
+    lines = [f'{"phase":<16} {"base":>10} {"new":>10} {"ratio":>7}']
+    for name in PHASES:
+        if name not in base['phases']:
+            continue
+
+        base_t = base['phases'][name]['wall_median']
+        new_t = result['phases'][name]['wall_median']
+        ratio = new_t / base_t if base_t > 0 else float('nan')
+        lines.append(f'{name:<16} {base_t * 1000:>8.1f}ms {new_t * 1000:>8.1f}ms {ratio:>6.2f}x')
+    return '\n'.join(lines)
+
+def main():
+    parser = ArgumentParser(prog='bench', description='Benchmark bitportfolio phases on a synthetic portfolio tree')
+    add_tree_arguments(parser)
+    parser.add_argument('-d', '--dir', type=str, nargs='?', required=False, help='Use/keep the fixture in this directory instead of a temporary one')
+    parser.add_argument('-e', '--engine', type=str, choices=['python', 'numpy'], required=False, help='Valuation engine', default='python')
+    parser.add_argument('-j', '--jobs', type=int, required=False, help='Number of processes to load portfolio files with', default=1)
+    parser.add_argument('-c', '--compiled', action='store_true', help='Load the tree compiled to .bpc files')
+    parser.add_argument('-t', '--transactions', action='store_true', help='Compute and render transaction details')
+    parser.add_argument('-r', '--repeat', type=int, required=False, help='Number of timed runs', default=5)
+    parser.add_argument('-m', '--memory', action='store_true', help='Measure peak memory per phase with tracemalloc')
+    parser.add_argument('-o', '--output', type=str, nargs='?', required=False, help='Write JSON result to file instead of stdout')
+    parser.add_argument('--compare', type=str, nargs='?', required=False, help='Print a comparison against a previous JSON result')
+
+    args = parser.parse_args()
+    params = tree_params_from_args(args)
+
+    with TemporaryDirectory(prefix='bitportfolio-bench-') as tmp_dir:
+        fixture_dir = Path(args.dir or tmp_dir)
+        if (fixture_dir / 'config.yml').exists():
+            tree = json.loads((fixture_dir / 'tree.json').read_text())
+        else:
+            tree = write_fixture(fixture_dir, params)
+            (fixture_dir / 'tree.json').write_text(json.dumps(tree))
+
+        base_dir = fixture_dir / 'portfolios'
+        if args.compiled:
+            base_dir = fixture_dir / COMPILED_DIR
+            if not base_dir.exists():
+                convert_tree('compile', fixture_dir / 'portfolios', base_dir, COMPILED_SUFFIX, jobs=0)
+
+        result = run_bench(fixture_dir, base_dir, tree, params, args.engine, args.jobs, args.transactions, args.repeat, args.memory)
+
+    result_s = json.dumps(result, indent=2)
+    if args.output is None:
+        print(result_s)
+    else:
+        Path(args.output).write_text(result_s + '\n')
+
+    if args.compare is not None:
+        base = json.loads(Path(args.compare).read_text())
+        print(compare(base, result), file=sys.stderr)
+
+if __name__ == '__main__':
+    main()
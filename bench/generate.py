@@ -0,0 +1,203 @@
+#!/usr/bin/env python3
+
+import json
+import random
+import yaml
+from argparse import ArgumentParser
+from pathlib import Path
+
+CONVERT = 'EUR'
+KNOWN_SYMBOLS = ['BTC', 'ETH', 'BNB', 'SOL', 'XRP', 'ADA', 'DOGE', 'DOT', 'LTC', 'LINK', 'XLM', 'EOS', 'SHIB', 'USDT', 'USDC']
+SOURCES = ['binance', 'kraken', 'coinbase', 'bitpanda']
+
+class TreeParams():
+    files: int
+    depth: int
+    fanout: int
+    pairs_per_file: int
+    trx_per_pair: int
+    symbols: int
+    spot_ratio: float
+    cross_ratio: float
+    file_format: str
+    seed: int
+
+    def __init__(self,
+                 files: int = 100,
+                 depth: int = 3,
+                 fanout: int = 3,
+                 pairs_per_file: int = 5,
+                 trx_per_pair: int = 20,
+                 symbols: int = 20,
+                 spot_ratio: float = 0.1,
+                 cross_ratio: float = 0.2,
+                 file_format: str = 'yml',
+                 seed: int = 1):
+        self.files = files
+        self.depth = depth
+        self.fanout = fanout
+        self.pairs_per_file = pairs_per_file
+        self.trx_per_pair = trx_per_pair
+        self.symbols = symbols
+        self.spot_ratio = spot_ratio
+        self.cross_ratio = cross_ratio
+        self.file_format = file_format
+        self.seed = seed
+
+    def to_dict(self) -> dict:
+        return dict(vars(self))
+
+def symbol_universe(n: int) -> list[str]:
+    symbols = KNOWN_SYMBOLS[:n]
+    symbols += [f'X{i:03d}' for i in range(n - len(symbols))]
+    return symbols
+
+def _make_dirs(base_dir: Path, params: TreeParams) -> list[Path]:
+    dirs = [base_dir]
+    level = [base_dir]
+    for depth in range(params.depth):
+        next_level = []
+        for parent in level:
+            for n in range(params.fanout):
+                next_level.append(parent / f'd{depth}_{n}')
+        dirs += next_level
+        level = next_level
+
+    for path in dirs:
+        path.mkdir(parents=True, exist_ok=True)
+    return dirs
+
+def _make_pair(rnd: random.Random, symbols: list[str], params: TreeParams) -> dict:
+    transactions = []
+
+    if rnd.random() < params.spot_ratio:
+        symbol = rnd.choice(symbols)
+        for n in range(params.trx_per_pair):
+            transactions.append({
+                'date': f'20{rnd.randint(18, 24)}-{rnd.randint(1, 12):02d}-{rnd.randint(1, 28):02d}',
+                'type': 'in' if rnd.random() < 0.7 else 'out',
+                'quantity': round(rnd.uniform(0.01, 10), 6),
+            })
+        return {'pair': symbol, 'transactions': transactions}
+
+    if len(symbols) > 1 and rnd.random() < params.cross_ratio:
+        sell_symbol, buy_symbol = rnd.sample(symbols, 2)
+    else:
+        sell_symbol, buy_symbol = CONVERT, rnd.choice(symbols)
+
+    for n in range(params.trx_per_pair):
+        transaction = {
+            'date': f'20{rnd.randint(18, 24)}-{rnd.randint(1, 12):02d}-{rnd.randint(1, 28):02d}',
+            'type': 'buy' if rnd.random() < 0.7 else 'sell',
+            'price': round(rnd.uniform(0.01, 50000), 4),
+            'quantity': round(rnd.uniform(0.001, 100), 6),
+        }
+        if rnd.random() < 0.5:
+            transaction['fee'] = [round(rnd.uniform(0, 5), 4), CONVERT]
+        if transaction['type'] == 'buy' and rnd.random() < 0.3:
+            transaction['state'] = 'open'
+            transaction['target'] = round(transaction['price'] * rnd.uniform(1.1, 3), 4)
+        transactions.append(transaction)
+
+    return {'pair': f'{sell_symbol}/{buy_symbol}', 'transactions': transactions}
+
+def generate_quotes(symbols: list[str], seed: int = 1) -> dict[str, dict[str, float]]:
+    rnd = random.Random(seed)
+
+    prices = {symbol: round(rnd.uniform(0.01, 50000), 4) for symbol in symbols}
+    quotes = {CONVERT: dict(prices)}
+    for convert in symbols:
+        quotes[convert] = {symbol: prices[symbol] / prices[convert] for symbol in symbols if symbol != convert}
+    return quotes
+
+def generate_tree(base_dir: Path, params: TreeParams) -> dict:
+    rnd = random.Random(params.seed)
+    symbols = symbol_universe(params.symbols)
+    dirs = _make_dirs(base_dir, params)
+
+    transactions_c = 0
+    for n in range(params.files):
+        pairs = [_make_pair(rnd, symbols, params) for _ in range(params.pairs_per_file)]
+        transactions_c += sum(len(pair['transactions']) for pair in pairs)
+
+        raw_data = {
+            'sources': [{
+                'source': rnd.choice(SOURCES),
+                'pairs': pairs,
+            }],
+        }
+
+        file = rnd.choice(dirs) / f'f{n:05d}.{params.file_format}'
+        with open(file, 'w') as f:
+            if params.file_format == 'json':
+                json.dump(raw_data, f)
+            else:
+                yaml.safe_dump(raw_data, f, default_flow_style=False, sort_keys=False)
+
+    return {
+        'files': params.files,
+        'dirs': len(dirs),
+        'transactions': transactions_c,
+        'symbols': len(symbols),
+    }
+
+def write_fixture(path: Path, params: TreeParams) -> dict:
+    path.mkdir(parents=True, exist_ok=True)
+
+    stats = generate_tree(path / 'portfolios', params)
+
+    quotes_file = path / 'quotes.yml'
+    with open(quotes_file, 'w') as f:
+        yaml.safe_dump(generate_quotes(symbol_universe(params.symbols), params.seed), f)
+
+    config = {
+        'convert': CONVERT,
+        'data_provider': {
+            'id': 'file',
+            'file': {'path': str(quotes_file.resolve())},
+        },
+    }
+    with open(path / 'config.yml', 'w') as f:
+        yaml.safe_dump(config, f, sort_keys=False)
+
+    return stats
+
+def add_tree_arguments(parser: ArgumentParser):
+    defaults = TreeParams()
+    parser.add_argument('--files', type=int, required=False, help='Number of portfolio files', default=defaults.files)
+    parser.add_argument('--depth', type=int, required=False, help='Directory depth', default=defaults.depth)
+    parser.add_argument('--fanout', type=int, required=False, help='Sub directories per directory', default=defaults.fanout)
+    parser.add_argument('--pairs', type=int, required=False, help='Pairs per file', default=defaults.pairs_per_file)
+    parser.add_argument('--trx', type=int, required=False, help='Transactions per pair', default=defaults.trx_per_pair)
+    parser.add_argument('--symbols', type=int, required=False, help='Size of the symbol universe', default=defaults.symbols)
+    parser.add_argument('--spot-ratio', type=float, required=False, help='Share of spot (in/out) pairs', default=defaults.spot_ratio)
+    parser.add_argument('--cross-ratio', type=float, required=False, help='Share of pairs not traded against the convert symbol', default=defaults.cross_ratio)
+    parser.add_argument('--format', type=str, choices=['yml', 'json'], required=False, help='File format', default=defaults.file_format)
+    parser.add_argument('--seed', type=int, required=False, help='Random seed', default=defaults.seed)
+
+def tree_params_from_args(args) -> TreeParams:
+    return TreeParams(
+        files=args.files,
+        depth=args.depth,
+        fanout=args.fanout,
+        pairs_per_file=args.pairs,
+        trx_per_pair=args.trx,
+        symbols=args.symbols,
+        spot_ratio=args.spot_ratio,
+        cross_ratio=args.cross_ratio,
+        file_format=args.format,
+        seed=args.seed,
+    )
+
+def main():
+    parser = ArgumentParser(prog='generate', description='Generate a synthetic portfolio tree with config and quotes file')
+    parser.add_argument('path', type=str, help='Output directory')
+    add_tree_arguments(parser)
+
+    args = parser.parse_args()
+
+    stats = write_fixture(Path(args.path), tree_params_from_args(args))
+    print(f'-> generated {stats["files"]} files in {stats["dirs"]} dirs, {stats["transactions"]} transactions: {args.path}')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,5 @@
+#!/usr/bin/env bash
+
+SCRIPT_BASEDIR=$(dirname "$0")
+source "${SCRIPT_BASEDIR}/../.venv/bin/activate"
+"${SCRIPT_BASEDIR}/../src/importer.py" "$@"
@@ -1,26 +1,37 @@
 #!/usr/bin/env python3
 
-import yaml
 import signal
 import shutil
-import pandas as pd
+from time import perf_counter, time
+from concurrent.futures import ThreadPoolExecutor
 from logging import getLogger, basicConfig
 from typing import cast
 from argparse import ArgumentParser, BooleanOptionalAction
-from yaml import safe_load, dump as ydump
 from json import loads, load, dumps, dump
-from cmc import get_quotes as cmc_get_quotes
+from providers import create_provider
 from sty import fg, bg, ef, rs
 from pathlib import Path
 from portfolio import Portfolio
+from lots import LotEngine, LOT_METHODS, EPSILON
 from transaction import Transaction
+from portfolio_loader import PortfolioDir, scan_portfolio_dir, load_portfolio_files
+from transaction_loader import DEFAULT_STREAM_SIZE, data_transactions, should_stream, stream_transactions
+from trx_cache import TrxCache, DEFAULT_MAX_SIZE
+from quote_cache import create_quote_cache
+from tsstore import create_quote_store, parse_time
+from profiling import create_profiler, profile_phase
 from apptypes import ConvertSymbols
 from json_helper import ComplexEncoder
+from table import render_table
 from quotes import Quotes
-from helper import sort_holdings
+from helper import sort_holdings, default_cache_dir
+from watcher import create_watcher
 
 _logger = getLogger(f'app.{__name__}')
 
+CLEAR_SCREEN = '\033[2J\033[1;1H'
+DEFAULT_CONCURRENCY = 4
+
 class App():
     show_transactions: bool
     data_provider_id: str|None
@@ -32,14 +43,31 @@ class App():
                  base_dir: str|None = None,
                  config_path: str|None = None,
                  show_transactions: bool = False,
-                 data_provider_id: str = 'cmc',
+                 data_provider_id: str|None = None,
                  quotes_file: str|None = None,
                  change_dir: str|None = None,
                  max_depth: int|None = None,
                  filter_symbol: str|None = None,
                  filter_ttype: bool|None = None,
                  load: bool|None = None,
-                 save: bool|None = None):
+                 save: bool|None = None,
+                 cache: bool = True,
+                 rebuild_cache: bool = False,
+                 cache_dir: str|None = None,
+                 quote_cache: bool|None = None,
+                 quote_store: bool|None = None,
+                 jobs: int = 1,
+                 engine: str = 'python',
+                 watch: bool = False,
+                 watch_interval: float = 1.0,
+                 profile: str|None = None,
+                 cprofile: str|None = None,
+                 history: str|None = None,
+                 history_end: str|None = None,
+                 history_period: str = 'day',
+                 history_prices: str|None = None,
+                 history_output: str|None = None,
+                 lot_method: str|None = None):
 
         logConfig = {
             'level': log_level,
@@ -75,13 +103,27 @@ class App():
 
         if self.config_path.exists():
             with open(self.config_path, 'r') as f:
-                self.config = safe_load(f)
+                if self.config_path.suffix == '.json':
+                    self.config = loads(f.read())
+                else:
+                    from yaml import safe_load
+                    self.config = safe_load(f)
 
         self.max_depth = max_depth
         self.filter_symbol = filter_symbol
         self.filter_ttype = filter_ttype
         self.load = load
         self.save = save
+        self.jobs = jobs
+        self.engine = engine
+        self.watch = watch
+        self.watch_interval = watch_interval
+        self.history = history
+        self.history_end = history_end
+        self.history_period = history_period
+        self.history_prices = history_prices
+        self.history_output = history_output
+        self.lot_method = lot_method
 
         self.holding_minimum_amount = 0.0
         self.holding_minimum_ignore = []
@@ -90,132 +132,416 @@ class App():
             self.holding_minimum_amount = holding_minimum['amount']
             self.holding_minimum_ignore = holding_minimum['ignore']
 
+        self.stream_size = self.config.get('loader', {}).get('stream_size', DEFAULT_STREAM_SIZE)
+
+        self.cache = None
+        if cache:
+            cache_config = self.config.get('cache', {})
+
+            if cache_dir is not None:
+                cache_path = Path(cache_dir)
+            elif 'dir' in cache_config:
+                cache_path = Path(cache_config['dir'])
+            else:
+                cache_path = default_cache_dir('portfolio')
+
+            self.cache = TrxCache(
+                cache_path,
+                max_size=cache_config.get('max_size', DEFAULT_MAX_SIZE),
+                rebuild=rebuild_cache,
+            )
+
+        self.quote_cache = create_quote_cache(self.config, quote_cache)
+        self.quote_store = create_quote_store(self.config, quote_store)
+
+        self.profiler = create_profiler(profile, cprofile)
+
     def run(self):
         self.running = True
 
-        portfolio = self._traverse(self.base_dir)
-        portfolio.calc()
+        if self.profiler is not None:
+            self.profiler.start()
+
+        try:
+            if self.history is not None:
+                self._run_history()
+                return
+
+            portfolio = self._load_portfolio()
+            quotes = self._load_quotes(portfolio)
+
+            with profile_phase(self.profiler, 'quotes'):
+                portfolio.quotes(quotes, self.config['convert'], engine=self.engine, detail=self.show_transactions, profiler=self.profiler)
+            with profile_phase(self.profiler, 'render'):
+                self._print_portfolio(portfolio)
+
+            if self.watch:
+                self._watch(portfolio, quotes)
+        finally:
+            if self.profiler is not None:
+                self.profiler.stop()
+
+    def _run_history(self):
+        # Values the portfolio for every period from a price series instead of the latest quotes.
+        from history import collect_deltas, period_ends, period_starts, store_prices, file_prices, missing_prices, value_curves
 
-        psymbols = portfolio.get_convert_symbols(self.config['convert'])
+        convert = self.config['convert']
+
+        with profile_phase(self.profiler, 'traverse'):
+            portfolio = self._traverse(self.base_dir)
+
+        with profile_phase(self.profiler, 'history_deltas'):
+            deltas = collect_deltas(portfolio)
+
+        if self.history != '':
+            start = parse_time(self.history)
+            if start is None:
+                raise ValueError(f'Invalid start of history: {self.history}')
+        else:
+            start = deltas.first_time()
+            if start is None:
+                raise ValueError('No dated transactions found, start of history is required')
+
+        if self.history_end is None:
+            end = time()
+        else:
+            end = parse_time(self.history_end)
+            if end is None:
+                raise ValueError(f'Invalid end of history: {self.history_end}')
+
+        ends = period_ends(start, end, self.history_period)
+
+        with profile_phase(self.profiler, 'history_prices'):
+            if self.history_prices is not None:
+                prices = file_prices(Path(self.history_prices), convert, deltas.symbols, ends)
+            else:
+                quote_store = self.quote_store or create_quote_store(self.config, enabled=True)
+                prices = store_prices(quote_store, convert, deltas.symbols, ends)
+
+        missing = missing_prices(deltas.symbols, prices)
+        if len(missing) > 0:
+            print(f'-> no prices for: {", ".join(missing)}')
+
+        with profile_phase(self.profiler, 'history'):
+            curves = value_curves(deltas, convert, ends, prices, minimum=self.holding_minimum_amount, ignore=self.holding_minimum_ignore)
+
+        with profile_phase(self.profiler, 'render'):
+            dates = period_starts(ends, self.history_period)
+            curve = curves[portfolio.path]
+            print(render_table([
+                ('date', dates),
+                (f'value({convert})', curve.value.tolist()),
+                (f'costs({convert})', curve.cost.tolist()),
+                (f'profit({convert})', curve.profit.tolist()),
+            ]))
+
+            if self.history_output is not None:
+                self._write_history(Path(self.history_output), dates, curves)
+                print(f'-> history: {self.history_output}')
+
+    def _write_history(self, path: Path, dates: list, curves: dict):
+        import csv
+
+        date_format = '%Y-%m-%d' if self.history_period == 'day' else '%Y-%m-%d %H:%M'
+        dates_s = [value.strftime(date_format) for value in dates]
+        with open(path, 'w', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(['path', 'date', 'value', 'costs', 'profit'])
+            for curve_path, curve in curves.items():
+                writer.writerows(zip([curve_path] * len(dates_s), dates_s, curve.value.tolist(), curve.cost.tolist(), curve.profit.tolist()))
+
+    def _load_portfolio(self) -> Portfolio:
+        with profile_phase(self.profiler, 'traverse'):
+            portfolio = self._traverse(self.base_dir)
+        if self.cache is not None:
+            _logger.info(f'cache: hits={self.cache.hits} misses={self.cache.misses}')
+            self.cache.evict()
+
+        with profile_phase(self.profiler, 'calc'):
+            portfolio.calc(self.profiler)
+
+        return portfolio
+
+    def _load_quotes(self, portfolio: Portfolio) -> Quotes:
+        with profile_phase(self.profiler, 'convert_symbols'):
+            psymbols = portfolio.get_convert_symbols(self.config['convert'])
 
         load_quotes = False
         if self.quotes_file is not None:
             if self.load:
                 _logger.info(f'load quotes file: {self.quotes_file}')
-                with open(self.quotes_file, 'r') as f:
+                from yaml import safe_load
+                with profile_phase(self.profiler, 'load_quotes'), open(self.quotes_file, 'r') as f:
                     quotes = Quotes(safe_load(f))
                     load_quotes = True
 
         if not load_quotes:
-            quotes = self._get_quotes(psymbols, self.config['convert'])
+            with profile_phase(self.profiler, 'get_quotes'):
+                quotes = self._get_quotes(psymbols, self.config['convert'])
 
         if self.quotes_file is not None:
             if self.save:
                 _logger.info(f'save quotes file: {self.quotes_file}')
+                from yaml import dump as ydump
                 with open(self.quotes_file, 'w') as f:
                     ydump(quotes.symbols, f, indent=2)
 
-        portfolio.quotes(quotes, self.config['convert'])
-        self._print_portfolio(portfolio)
+        if self.engine == 'numpy':
+            from quote_matrix import QuoteMatrix
 
-    def shutdown(self, reason: str):
-        print()
-        print(f'-> shutting down: {reason}')
+            # The numpy engine looks up quotes by ID in batches.
+            quotes = QuoteMatrix(quotes.symbols)
 
-        self.running = False
+        return quotes
 
-    def _traverse(self, dir: Path, parent: Portfolio|None = None, level: int = 0) -> Portfolio:
-        portfolio = Portfolio(name=dir.name, parent=parent)
+    def _watch(self, portfolio: Portfolio, quotes: Quotes):
+        from yaml import YAMLError
 
-        for file in dir.iterdir():
-            if file.is_dir():
-                nlevel = portfolio.level + 1
-                sub_portfolio = self._traverse(file, portfolio, nlevel)
-                portfolio.add_portfolio(sub_portfolio)
+        watcher = create_watcher(self.base_dir, self.watch_interval)
+        _logger.info(f'watch: {self.base_dir} ({type(watcher).__name__})')
+
+        try:
+            while self.running:
+                changes = watcher.poll()
+                if not changes or not self.running:
+                    continue
+
+                start = perf_counter()
+                errors = {}
+                if changes.dirs:
+                    _logger.info('watch: directories changed, reload')
+                    try:
+                        new_portfolio = self._load_portfolio()
+                    except (ValueError, YAMLError) as error:
+                        # A file saved halfway, the last portfolio is kept until the next change.
+                        _logger.warning(f'watch: reload failed: {error}')
+                        errors[self.base_dir] = error
+                    else:
+                        portfolio = new_portfolio
+                        self._update_quotes(portfolio, quotes)
+                        with profile_phase(self.profiler, 'quotes'):
+                            portfolio.quotes(quotes, self.config['convert'], engine=self.engine, detail=self.show_transactions, profiler=self.profiler)
+                else:
+                    with profile_phase(self.profiler, 'watch_update'):
+                        portfolio, errors = self._watch_update(changes.files, quotes)
+                duration = (perf_counter() - start) * 1000
+
+                print(CLEAR_SCREEN, end='')
+                with profile_phase(self.profiler, 'render'):
+                    self._print_portfolio(portfolio)
+                print()
+                print(f'-> updated {len(changes.files)} files in {duration:.1f} ms')
+                for file, error in errors.items():
+                    print(f'-> error: {file}: {error}')
+        finally:
+            watcher.close()
+
+    def _watch_update(self, files: set[Path], quotes: Quotes) -> tuple[Portfolio, dict[Path, Exception]]:
+        from yaml import YAMLError
+
+        # Files are loaded one by one, a file which doesn't parse (yet) keeps
+        # its last transactions.
+        file_transactions = {}
+        errors = {}
+        for file in files:
+            if not file.exists():
+                continue
+            try:
+                file_transactions.update(self._load_file_transactions([file]))
+            except FileNotFoundError:
+                continue
+            except (ValueError, YAMLError) as error:
+                _logger.warning(f'watch: {file}: {error}')
+                errors[file] = error
 
-            elif file.is_file():
-                raw_data = None
-                with open(file, 'r') as f:
-                    if str(file).endswith('.json'):
-                        raw_data = loads(f.read())
-                    if str(file).endswith('.yml'):
-                        raw_data = yaml.safe_load(f)
+        dirs = set()
+        for file in files:
+            if file in errors:
+                continue
 
-                if 'ignore' in raw_data:
-                    if raw_data['ignore']:
-                        continue
+            pdir = self._pdirs[file.parent]
+            if file in file_transactions:
+                if file not in self._file_transactions:
+                    pdir.entries.append(file)
+                self._file_transactions[file] = file_transactions[file]
+            elif file in self._file_transactions:
+                pdir.entries.remove(file)
+                del self._file_transactions[file]
+            else:
+                continue
+            dirs.add(file.parent)
+
+        # Rebuild the changed portfolios deepest first, then recalculate
+        # them and their ancestors. Everything else is kept as it is.
+        rebuilt = []
+        for path in sorted(dirs, key=lambda p: len(p.parts), reverse=True):
+            old_portfolio = self._portfolios[path]
+            if old_portfolio.lots is not None:
+                old_portfolio.lots.remove_portfolio(old_portfolio)
+            portfolio = self._build_portfolio(self._pdirs[path], old_portfolio.parent, reuse_subs=True, lots=old_portfolio.lots)
+
+            if old_portfolio.parent is not None:
+                subs = old_portfolio.parent.subs
+                subs[subs.index(old_portfolio)] = portfolio
+            rebuilt.append(portfolio)
+
+        nodes = {}
+        for portfolio in rebuilt:
+            node = portfolio
+            while node is not None:
+                nodes[id(node)] = node
+                node = node.parent
+        nodes = sorted(nodes.values(), key=lambda p: p.level, reverse=True)
+
+        for node in nodes:
+            node.calc_node()
+
+        root = self._portfolios[self.base_dir]
+        self._update_quotes(root, quotes)
+
+        for node in nodes:
+            if node in rebuilt:
+                engine = self.engine
+            else:
+                engine = None
+            node.quotes_node(quotes, self.config['convert'], engine=engine, detail=self.show_transactions)
+
+        if root.lots is not None:
+            root.quotes_lots(self.config['convert'])
+
+        return root, errors
+
+    def _update_quotes(self, portfolio: Portfolio, quotes: Quotes):
+        missing = {}
+        for convert, sym_list in portfolio.get_convert_symbols(self.config['convert']).items():
+            sym_list = [symbol for symbol in sym_list if not quotes.has(convert, symbol)]
+            if len(sym_list) > 0:
+                missing[convert] = sym_list
+
+        if len(missing) == 0:
+            return
 
-                if 'sources' not in raw_data:
-                    raise ValueError(f'No sources-field found in file: {file}')
+        _logger.info(f'fetch missing quotes: {missing}')
+        new_quotes = self._get_quotes(missing, self.config['convert'])
+        for convert, symbols in new_quotes.symbols.items():
+            for symbol, val in symbols.items():
+                quotes.add(convert, symbol, val)
 
-                for source in raw_data['sources']:
-                    if 'pairs' in source:
-                        pairs = source['pairs']
-                    if 'ignore' in source:
-                        if source['ignore']:
-                            continue
+    def shutdown(self, reason: str):
+        print()
+        print(f'-> shutting down: {reason}')
 
-                    for pair in pairs:
-                        if 'ignore' in pair and pair['ignore']:
-                            continue
+        self.running = False
 
-                        state = None
-                        if 'state' in pair:
-                            state = pair['state']
+    def _traverse(self, dir: Path) -> Portfolio:
+        pdir = scan_portfolio_dir(dir)
+        files = list(pdir.iter_files())
+        self._file_transactions = self._load_file_transactions(files, jobs=self.jobs)
+
+        self._pdirs = {}
+        self._portfolios = {}
+        return self._build_portfolio(pdir)
+
+    def _build_portfolio(self, pdir: PortfolioDir, parent: Portfolio|None = None, reuse_subs: bool = False, lots: LotEngine|None = None) -> Portfolio:
+        # One LotEngine for the whole tree, lots are moved between portfolios.
+        if parent is not None:
+            lots = parent.lots
+        elif lots is None and self.lot_method is not None:
+            lots = LotEngine(self.lot_method, self.config['convert'])
+
+        portfolio = Portfolio(name=pdir.path.name, parent=parent, lots=lots)
+        self._pdirs[pdir.path] = pdir
+        self._portfolios[pdir.path] = portfolio
+
+        for entry in pdir.entries:
+            if isinstance(entry, PortfolioDir):
+                if reuse_subs:
+                    sub_portfolio = self._portfolios[entry.path]
+                    sub_portfolio.parent = portfolio
+                else:
+                    sub_portfolio = self._build_portfolio(entry, portfolio)
+                portfolio.add_portfolio(sub_portfolio)
+            else:
+                for transaction in self._file_transactions[entry]:
+                    portfolio.add_transaction(transaction)
 
-                        for transaction_j in pair['transactions']:
-                            transaction_o = Transaction(
-                                source=source['source'],
-                                pair=pair['pair'],
-                                d=transaction_j,
-                            )
+        return portfolio
 
-                            if transaction_o.ignore:
-                                continue
+    def _load_file_transactions(self, files: list[Path], jobs: int = 1) -> dict[Path, list[Transaction]]:
+        # Large and compressed files are streamed one at a time and bypass the cache.
+        streamed = []
+        loaded = []
+        for file in files:
+            if should_stream(file, self.stream_size):
+                streamed.append(file)
+            else:
+                loaded.append(file)
 
-                            if state is not None and transaction_o.state is None:
-                                transaction_o.state = state
+        file_transactions = {}
+        if len(loaded) > 0:
+            raw_datas = load_portfolio_files(loaded, cache=self.cache, jobs=jobs)
+            for file, raw_data in zip(loaded, raw_datas):
+                file_transactions[file] = self._file_data_transactions(file, raw_data)
 
-                            if transaction_o.state is None:
-                                if transaction_o.ttype == 'buy':
-                                    transaction_o.state = 'open'
+        for file in streamed:
+            file_transactions[file] = stream_transactions(file, self._accept_transaction)
 
-                            handle_trx = True
+        return file_transactions
 
-                            if self.filter_symbol is not None:
-                                if transaction_o.sell_symbol != self.filter_symbol and transaction_o.buy_symbol != self.filter_symbol and (transaction_o.spot is not None and transaction_o.spot.symbol != self.filter_symbol or transaction_o.spot is None):
-                                    handle_trx = False
+    def _file_data_transactions(self, file: Path, raw_data: dict) -> list[Transaction]:
+        return data_transactions(file, raw_data, self._accept_transaction)
 
-                            if self.filter_ttype is not None:
-                                if transaction_o.ttype != self.filter_ttype:
-                                    handle_trx = False
+    def _accept_transaction(self, pair: str, transaction_j: dict) -> bool:
+        # The filters are applied before a Transaction is created.
+        if self.filter_symbol is not None:
+            if self.filter_symbol not in pair.split('/'):
+                return False
 
-                            if handle_trx:
-                                portfolio.add_transaction(transaction_o)
+        if self.filter_ttype is not None:
+            if transaction_j.get('type') != self.filter_ttype:
+                return False
 
-        return portfolio
+        return True
 
     def _get_quotes(self, symbols: ConvertSymbols, convert: str) -> Quotes:
         _logger.debug('_get_quotes()')
 
         dp_config = self.config['data_provider']
-        if dp_config['id'] == 'cmc':
-            data_fetch_func = cmc_get_quotes
-        else:
-            raise ValueError(f'Unknown data provider: {dp_config["id"]}')
+        provider_id = self.data_provider_id or dp_config['id']
+        concurrency = dp_config.get('concurrency', DEFAULT_CONCURRENCY)
+        client = create_provider(provider_id, dp_config, pool_size=concurrency, cache=self.quote_cache)
 
-        quotes = Quotes()
-
-        for convert, sym_list in symbols.items():
+        def fetch(item: tuple[str, list[str]]) -> dict:
+            convert, sym_list = item
             _logger.debug(f'fetch data: {convert} start')
-            data = data_fetch_func(
-                api_host=dp_config['api']['host'],
-                api_key=dp_config['api']['key'],
-                convert=convert,
-                symbols=sym_list,
-            )
+            data = client.get_quotes(convert=convert, symbols=sym_list)
             _logger.debug(f'fetch data: {convert} done')
+            return data
 
+        quotes = Quotes()
+
+        # Fetch all convert groups at once, merge them in order.
+        items = list(symbols.items())
+        max_workers = max(1, min(concurrency, len(items)))
+        try:
+            with ThreadPoolExecutor(max_workers=max_workers) as executor:
+                results = list(executor.map(fetch, items))
+        finally:
+            client.close()
+
+        if self.quote_cache is not None:
+            _logger.info(f'quote cache: hits={self.quote_cache.hits} misses={self.quote_cache.misses}')
+        _logger.info(f'data provider: calls={client.calls} credits={client.credits}')
+        if client.credits > 0:
+            # Only paid calls are printed, offline providers don't change the output.
+            print(f'-> data provider: {client.calls} calls, {client.credits} credits')
+
+        if self.quote_store is not None:
+            for (convert, _), data in zip(items, results):
+                self.quote_store.append_response(convert, data.get('data', {}))
+            _logger.info(f'quote store: {self.quote_store.appended} records appended')
+
+        for (convert, sym_list), data in zip(items, results):
             for symbol in sym_list:
                 _logger.debug(f'sym_list for {convert}: {symbol}')
                 if symbol in data['data']:
@@ -239,8 +565,13 @@ class App():
         return quotes
 
     def _print_portfolio(self, portfolio: Portfolio):
-        self._print_portfolio_holdings(portfolio)
-        self._print_portfolio_transactions(portfolio)
+        if self.profiler is None:
+            self._print_portfolio_holdings(portfolio)
+            self._print_portfolio_transactions(portfolio)
+        else:
+            with self.profiler.node(portfolio.path, 'render'):
+                self._print_portfolio_holdings(portfolio)
+                self._print_portfolio_transactions(portfolio)
         self._print_subportfolios(portfolio)
 
     def _print_portfolio_holdings(self, portfolio: Portfolio):
@@ -255,12 +586,20 @@ class App():
             'profit': [], # accumulated profit
             'trx': [],
         }
+        if portfolio.lots is not None:
+            holdings['realized'] = []
+            holdings['unrealized'] = []
         sorted_holdings = sorted(portfolio.holdings.items(), key=sort_holdings, reverse=True)
         total_value = 0.0
+        total_unrealized = 0.0
+        unmatched = []
         for hsym, holding in sorted_holdings:
             if holding.symbol == self.config['convert']:
                 continue
 
+            if holding.unmatched is not None and holding.unmatched > EPSILON:
+                unmatched.append(f'{holding.unmatched:.6f} {holding.symbol}')
+
             if self.holding_minimum_amount is not None and holding.quantity < self.holding_minimum_amount:
                 if holding.symbol not in self.holding_minimum_ignore:
                     continue
@@ -271,6 +610,10 @@ class App():
             holdings['value'].append(holding.value)
             holdings['profit'].append(holding.profit)
             holdings['trx'].append(holding.trx_count)
+            if portfolio.lots is not None:
+                holdings['realized'].append(holding.realized)
+                holdings['unrealized'].append(holding.unrealized)
+                total_unrealized += holding.unrealized
 
             total_value += holding.value
 
@@ -299,20 +642,27 @@ class App():
             print(f'Costs:  {costs_color}{costs_q:>10.2f} {portfolio.costs.symbol}{rs.all}')
         print(f'Value:  {total_value:>10.2f} {self.config["convert"]}')
         print(f'Profit: {profit_color}{profit:>10.2f} {self.config["convert"]}{rs.all}')
+        if portfolio.lots is not None:
+            print(f'Realized:   {portfolio.realized:>10.2f} {self.config["convert"]} ({portfolio.lots.method})')
+            # Like the value, of the holdings in the table only.
+            print(f'Unrealized: {total_unrealized:>10.2f} {self.config["convert"]}')
+            if len(unmatched) > 0:
+                print(f'Unmatched:  {", ".join(unmatched)} (given away without lots)')
 
         if len(holdings['sym']) == 0:
             return
 
-        df = pd.DataFrame(data=holdings)
-
-        df.rename(columns={'price': f'price({self.config["convert"]})'}, inplace=True)
-        df.rename(columns={'quote': f'quote({self.config["convert"]})'}, inplace=True)
-        df.rename(columns={'value': f'value({self.config["convert"]})'}, inplace=True)
-        df.rename(columns={'profit': f'profit({self.config["convert"]})'}, inplace=True)
+        labels = {
+            'quote': f'quote({self.config["convert"]})',
+            'value': f'value({self.config["convert"]})',
+            'profit': f'profit({self.config["convert"]})',
+            'realized': f'realized({self.config["convert"]})',
+            'unrealized': f'unrealized({self.config["convert"]})',
+        }
 
-        df_s = df.to_string(index=False)
+        table_s = render_table([(labels.get(key, key), values) for key, values in holdings.items()])
         print()
-        print(df_s)
+        print(table_s)
 
     def _print_portfolio_transactions(self, portfolio: Portfolio):
         if self.show_transactions:
@@ -416,30 +766,18 @@ class App():
             if len(transactions['pair']) == 0:
                 return
 
-            try:
-                df = pd.DataFrame(data=transactions)
-            except ValueError as error:
-                print('----- transactions -----')
-                print(dumps(transactions, indent=2, cls=ComplexEncoder))
-                print('------------------------')
-
-                raise error
-
-            df.style.format({
-                'quote': '{:.2f}',
-                'value': '{:.2f}',
-                'profit': '{:.2f}',
-            })
-
-            df.rename(columns={'quote': f'quote({self.config["convert"]})'}, inplace=True)
-            df.rename(columns={'profit': f'profit({self.config["convert"]})'}, inplace=True)
-            df.rename(columns={'sellq': 'squant'}, inplace=True)
-            df.rename(columns={'sells': 'ssym'}, inplace=True)
-            df.rename(columns={'buyq': 'bquant'}, inplace=True)
-            df.rename(columns={'buys': 'bsym'}, inplace=True)
-            df.rename(columns={'sellv': f'sellv({self.config["convert"]})'}, inplace=True)
-            df.rename(columns={'buyv': f'buyv({self.config["convert"]})'}, inplace=True)
-            df.rename(columns={'spotv': f'spotv({self.config["convert"]})'}, inplace=True)
+            labels = {
+                'quote': f'quote({self.config["convert"]})',
+                'profit': f'profit({self.config["convert"]})',
+                'sellq': 'squant',
+                'sells': 'ssym',
+                'buyq': 'bquant',
+                'buys': 'bsym',
+                'sellv': f'sellv({self.config["convert"]})',
+                'buyv': f'buyv({self.config["convert"]})',
+                'spotv': f'spotv({self.config["convert"]})',
+            }
+            columns = {labels.get(key, key): values for key, values in transactions.items()}
 
             df_cols = [
                 'date',
@@ -468,9 +806,17 @@ class App():
             df_cols.append('target')
             df_cols.append('source')
 
-            df_s = df.to_string(index=False, columns=df_cols)
+            try:
+                table_s = render_table([(label, columns[label]) for label in df_cols])
+            except ValueError as error:
+                print('----- transactions -----')
+                print(dumps(transactions, indent=2, cls=ComplexEncoder))
+                print('------------------------')
+
+                raise error
+
             print()
-            print(df_s)
+            print(table_s)
 
     def _print_subportfolios(self, portfolio: Portfolio):
         nlevel = portfolio.level + 1
@@ -483,16 +829,11 @@ class App():
             self._print_portfolio(sub_portfolio)
 
 def main():
-    pd.set_option('display.width', None)
-    pd.set_option('display.max_colwidth', None)
-    pd.set_option('display.max_columns', None)
-    pd.set_option('display.max_rows', None)
-
     parser = ArgumentParser(prog='bitportfolio', description='BitPortfolio')
     parser.add_argument('--log-level', type=str, nargs='?', required=False, help='Log Level', default='WARN')
     parser.add_argument('-c', '--config', type=str, nargs='?', required=False, help='Path to Config File')
     parser.add_argument('-d', '--basedir', type=str, nargs='?', required=False, help='Path to directory')
-    parser.add_argument('-p', '--dataprovider', type=str, nargs='?', required=False, help='ID', default='cmc')
+    parser.add_argument('-p', '--dataprovider', type=str, nargs='?', required=False, help='Data provider ID (cmc, file, record, replay), overwrites data_provider.id in config')
     parser.add_argument('-t', '--transactions', action=BooleanOptionalAction, help='Show transactions', default=False)
     parser.add_argument('-qf', '--quotes-file', type=str, nargs='?', required=False, help='Save/load quotes from file')
     parser.add_argument('-C', '--chdir', type=str, nargs='?', required=False, help='Change directory and look for files')
@@ -502,6 +843,23 @@ def main():
     parser.add_argument('--sell', action=BooleanOptionalAction, help='Show only sell Transactions')
     parser.add_argument('--load', action=BooleanOptionalAction, help='Load Quotes file')
     parser.add_argument('--save', action=BooleanOptionalAction, help='Save Quotes file')
+    parser.add_argument('--cache', action=BooleanOptionalAction, help='Cache parsed portfolio files', default=True)
+    parser.add_argument('--rebuild-cache', action=BooleanOptionalAction, help='Re-parse all portfolio files and refresh the cache', default=False)
+    parser.add_argument('--cache-dir', type=str, nargs='?', required=False, help='Path to cache directory')
+    parser.add_argument('--quote-cache', action=BooleanOptionalAction, help='Reuse recently fetched quotes (default: quote_cache.enabled in config)', default=None)
+    parser.add_argument('--quote-store', action=BooleanOptionalAction, help='Append fetched quotes to the time-series store (default: quote_store.enabled in config)', default=None)
+    parser.add_argument('-e', '--engine', type=str, nargs='?', required=False, choices=['python', 'numpy'], help='Valuation engine', default='python')
+    parser.add_argument('-w', '--watch', action=BooleanOptionalAction, help='Watch the base directory and update on changes', default=False)
+    parser.add_argument('--watch-interval', type=float, nargs='?', required=False, help='Seconds between checks for changes', default=1.0)
+    parser.add_argument('-j', '--jobs', type=int, nargs='?', required=False, help='Number of processes to load portfolio files with (0 = all CPUs)', default=1)
+    parser.add_argument('--profile', type=str, nargs='?', required=False, const='-', help='Print wall/CPU time and allocations per phase and portfolio as JSON to stderr or to the given file')
+    parser.add_argument('--history', type=str, nargs='?', required=False, const='', help='Show the value of the portfolio over time, from the given date (default: first transaction)')
+    parser.add_argument('--history-end', type=str, nargs='?', required=False, help='End of history (default: now)')
+    parser.add_argument('--period', type=str, nargs='?', required=False, choices=['day', 'hour'], help='History period', default='day')
+    parser.add_argument('--history-prices', type=str, nargs='?', required=False, help='CSV file with date, symbol and price columns (default: quote store)')
+    parser.add_argument('--history-output', type=str, nargs='?', required=False, help='Write the history of all portfolios to a CSV file')
+    parser.add_argument('--lots', type=str, nargs='?', required=False, choices=LOT_METHODS, help='Match transactions against lots and show realized and unrealized profit')
+    parser.add_argument('--cprofile', type=str, nargs='?', required=False, help='Write cProfile stats to file')
 
     args = parser.parse_args()
     # print(args)
@@ -525,6 +883,23 @@ def main():
         filter_ttype=filter_ttype,
         load=args.load,
         save=args.save,
+        cache=args.cache,
+        rebuild_cache=args.rebuild_cache,
+        cache_dir=args.cache_dir,
+        quote_cache=args.quote_cache,
+        quote_store=args.quote_store,
+        jobs=args.jobs,
+        engine=args.engine,
+        watch=args.watch,
+        watch_interval=args.watch_interval,
+        profile=args.profile,
+        cprofile=args.cprofile,
+        history=args.history,
+        history_end=args.history_end,
+        history_period=args.period,
+        history_prices=args.history_prices,
+        history_output=args.history_output,
+        lot_method=args.lots,
     )
 
     signal.signal(signal.SIGINT, lambda sig, frame: app.shutdown('SIGINT'))
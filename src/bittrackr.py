@@ -1,27 +1,47 @@
 #!/usr/bin/env python3
 
+import os
+import sys
 import signal
 import argparse
 import shutil
+import asyncio
+import threading
+from pathlib import Path
 from json import loads
-from time import sleep
-from cmc import get_quotes as cmc_get_quotes
-from sty import fg, bg, ef, rs
+from time import monotonic
+from providers import DataProvider, create_provider
+from quote_cache import create_quote_cache
+from tsstore import create_quote_store
+from profiling import create_profiler, profile_phase
+from sty import fg, bg, ef
 from datetime import datetime
+from frame import Frame, FrameRenderer
+from stream_feed import StreamFeed
+from ticker_server import TickerServer
+from helper import default_cache_dir
 
 CLEAR_SCREEN='\033[2J'
 JUMP_BEGINNING='\033[1;1H'
 
-def status(text: str):
-    # Jump to line 3.
-    print('\033[3;1H', end='', flush=True)
-    print(f'\033[2K   -> {text}\033[1G', end='', flush=True)
-    sleep(0.1)
+# Changed prices are highlighted for this many seconds.
+HIGHLIGHT_TIME = 2.0
 
-def clear():
-    # Jump to line 3.
-    print('\033[3;1H', end='', flush=True)
-    print('\033[2K\033[1G', end='', flush=True)
+# Redraw at least this often, for the countdown and to expire highlights.
+REDRAW_INTERVAL = 0.25
+
+TABLE_HEADER = 'SYM      PRICE      24%   24Vol%            24Vol  Dominance'
+TABLE_ROW = 6
+
+# Quote fields and where they are stored in App.data[sym]['dp'].
+DP_FIELDS = (
+    ('price', 'quote_price'),
+    ('last_updated', 'last_updated'),
+    ('volume_24h', 'volume_24h'),
+    ('volume_change_24h', 'volume_change_24h'),
+    ('percent_change_24h', 'percent_change_24h'),
+    ('market_cap_dominance', 'market_cap_dominance'),
+)
 
 class App():
     config: dict
@@ -29,8 +49,17 @@ class App():
     running: bool
     data: dict
     screen: dict
-
-    def __init__(self, config_path: str|None, scenario: str = 'all', update_interval: int|None = None, max_updates: int|None = None):
+    client: DataProvider|None
+    stream: StreamFeed|None
+    server: TickerServer|None
+    renderer: FrameRenderer
+    status_text: str
+    last_update: str
+    next_update_at: float|None
+    fetch_deadline: float
+    stream_updates: int
+
+    def __init__(self, config_path: str|None, scenario: str = 'all', update_interval: int|None = None, max_updates: int|None = None, quote_cache: bool|None = None, quote_store: bool|None = None, data_provider_id: str|None = None, profile: str|None = None, cprofile: str|None = None, serve: str|None = None, connect: str|None = None):
         print(f'-> config path: {config_path}')
         if config_path is None:
             self.config = self._default_config()
@@ -49,6 +78,12 @@ class App():
         if self.scenario in self.config['scenario']:
             self.symbols = self.config['scenario'][self.scenario]
 
+        # A server fetches the symbols of all scenarios, for any client.
+        self.server = None
+        if serve is not None:
+            self.symbols = list(dict.fromkeys(sym for symbols in self.config['scenario'].values() for sym in symbols))
+            self.server = TickerServer(self._server_socket(serve), self.config['convert'])
+
         if update_interval is not None:
             self.config['update_interval'] = update_interval
 
@@ -57,12 +92,19 @@ class App():
         else:
             self._rest_updates = max_updates
 
+        self.data_provider_id = data_provider_id
+        self.profiler = create_profiler(profile, cprofile)
+        self.client = None
+        self.quote_cache = create_quote_cache(self.config, quote_cache)
+        self.quote_store = create_quote_store(self.config, quote_store)
+
         self.data = {}
         for sym in self.symbols:
             self.data[sym] = {
                 'symbol': sym,
                 'direction': 0,
                 'prev_price': None,
+                'changed_at': None,
                 'dp': {
                     'quote_price': None,
                     'last_updated': None,
@@ -79,135 +121,403 @@ class App():
             'columns': terminal.columns,
         }
 
-    def run(self):
-        self.running = True
+        self.renderer = FrameRenderer()
+        self.status_text = ''
+        self.last_update = ''
+        self.next_update_at = None
 
-        sleep_list = list(reversed(list(range(1, self.config['update_interval']))))
+        # A fetch taking longer than this is left running in the background,
+        # the next update doesn't wait for it.
+        self.fetch_deadline = self.config['data_provider'].get('deadline', self.config['update_interval'])
 
-        # Clear screen
-        print(CLEAR_SCREEN, end='', flush=True)
+        self.running = False
+        self._shutdown_reason = None
+        self._stop = asyncio.Event()
+        self._redraw = asyncio.Event()
+        self._update_now = asyncio.Event()
+        self._fetch = None
+        self._input = False
+
+        # Push updates from a stream, coalesced per symbol until the next frame.
+        self.stream = None
+        self.stream_updates = 0
+        self._pending = {}
+        if connect is not None:
+            stream_config = {
+                **self.config['data_provider'].get('stream', {}),
+                'source': f'unix:{self._server_socket(connect)}',
+            }
+            self.stream = StreamFeed(stream_config, self.config['convert'], subscribe=self.symbols, on_status=self.status)
+        elif (self.data_provider_id or self.config['data_provider']['id']) == 'stream':
+            self.stream = StreamFeed(self.config['data_provider'].get('stream', {}), self.config['convert'], on_status=self.status)
 
-        # Jump to top left.
-        print(JUMP_BEGINNING, end='', flush=True)
+    def _server_socket(self, path: str) -> Path:
+        if path != '':
+            return Path(path)
+        if 'socket' in self.config.get('server', {}):
+            return Path(self.config['server']['socket'])
+        return default_cache_dir('ticker.sock')
+
+    def run(self):
+        self.running = True
 
-        cycle_n = 0
-        while self.running and self._rest_updates > 0:
-            cycle_n += 1
+        if self.profiler is not None:
+            self.profiler.start()
+
+        try:
+            asyncio.run(self._run())
+        except KeyboardInterrupt:
+            self.shutdown('KeyboardInterrupt')
+        finally:
+            if self._shutdown_reason is not None:
+                self._print_shutdown()
+
+            if self.profiler is not None:
+                self.profiler.stop()
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            loop.add_signal_handler(sig, self.shutdown, sig.name)
+        restore_input = None
+        if self.stream is None or self.stream.source_kind()[0] != 'stdin':
+            restore_input = self._start_input(loop)
+
+        if self.server is not None:
+            try:
+                await self.server.start()
+            except (OSError, ValueError) as error:
+                self.shutdown(f'{type(error).__name__}: {error}')
+                return
 
-            # Jump to top left.
-            print(JUMP_BEGINNING, end='', flush=True)
+        # Clear screen
+        print(CLEAR_SCREEN + JUMP_BEGINNING, end='', flush=True)
+        self.renderer.reset()
+
+        if self.stream is None:
+            tasks = [
+                asyncio.create_task(self._update_loop()),
+                asyncio.create_task(self._countdown_loop()),
+            ]
+        else:
+            tasks = [asyncio.create_task(self._stream_loop())]
+        tasks.append(asyncio.create_task(self._render_loop()))
+        try:
+            await self._stop.wait()
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+            # Show the state the app stopped in.
+            if len(self._pending) > 0:
+                self._apply_pending()
+            self._screen_update()
 
-            print(f'Update Interval: {self.config["update_interval"]} | Rest Updates: {self._rest_updates} | Scenario: {self.scenario}')
+            if self.server is not None:
+                await self.server.close()
 
-            now = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-            print(f'Last update: {now}')
+            for sig in (signal.SIGINT, signal.SIGTERM):
+                loop.remove_signal_handler(sig)
+            if restore_input is not None:
+                restore_input()
 
-            self._data_update()
-            self._screen_update()
+    async def _update_loop(self):
+        try:
+            while self.running and self._rest_updates > 0:
+                self.next_update_at = None
+                self.last_update = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
 
-            self._rest_updates -= 1
+                with profile_phase(self.profiler, 'data_update'):
+                    await self._data_update()
 
-            if self._rest_updates == 0:
-                self.shutdown('max updates reached')
-                break
+                self._rest_updates -= 1
 
-            for n in sleep_list:
-                status(f'Next update in {n}')
-                sleep(1)
-                if not self.running:
+                if self._rest_updates == 0:
+                    self.shutdown('max updates reached')
                     break
 
-    def _data_update(self):
-        status('Data update')
+                self.next_update_at = monotonic() + self.config['update_interval']
+                try:
+                    await asyncio.wait_for(self._update_now.wait(), timeout=self.config['update_interval'])
+                except asyncio.TimeoutError:
+                    pass
+                self._update_now.clear()
+        except Exception as error:
+            self.shutdown(f'{type(error).__name__}: {error}')
+
+    async def _countdown_loop(self):
+        while self.running:
+            if self.next_update_at is not None:
+                rest = self.next_update_at - monotonic()
+                self.status(f'Next update in {max(1, int(rest + 0.999))}')
+
+                # Wake up when the next full second is reached.
+                await asyncio.sleep(rest % 1.0 or 1.0)
+            else:
+                await asyncio.sleep(REDRAW_INTERVAL)
+
+    async def _stream_loop(self):
+        try:
+            async for sym, quote in self.stream.read():
+                if sym not in self.data:
+                    continue
+
+                # Only the latest values of a symbol are kept until the next frame.
+                self._pending.setdefault(sym, {}).update(quote)
+                self._redraw.set()
+        except Exception as error:
+            self.shutdown(f'{type(error).__name__}: {error}')
+        else:
+            self.shutdown('stream closed')
+
+    def _apply_pending(self):
+        pending = self._pending
+        self._pending = {}
+
+        now = monotonic()
+        for sym, quote in pending.items():
+            self._apply_quote(sym, quote, now)
+
+        self.stream_updates += 1
+        self.last_update = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+
+        self._rest_updates -= 1
+        if self._rest_updates == 0:
+            self.shutdown('max updates reached')
+
+    async def _render_loop(self):
+        frame_time = 1.0 / self.config['max_fps']
+        while self.running:
+            self._redraw.clear()
+            started = monotonic()
+
+            if len(self._pending) > 0:
+                with profile_phase(self.profiler, 'stream_apply'):
+                    self._apply_pending()
+
+            with profile_phase(self.profiler, 'screen_update'):
+                self._screen_update()
+
+            # Cap the frame rate, updates arriving in the meantime are coalesced.
+            await asyncio.sleep(max(0.0, frame_time - (monotonic() - started)))
+
+            try:
+                await asyncio.wait_for(self._redraw.wait(), timeout=REDRAW_INTERVAL)
+            except asyncio.TimeoutError:
+                pass
+
+    def _start_input(self, loop: asyncio.AbstractEventLoop):
+        if not sys.stdin.isatty():
+            return None
+
+        import termios
+        import tty
+
+        fd = sys.stdin.fileno()
+        attrs = termios.tcgetattr(fd)
+        tty.setcbreak(fd)
+        loop.add_reader(fd, self._on_input, fd)
+        self._input = True
+
+        def restore():
+            loop.remove_reader(fd)
+            termios.tcsetattr(fd, termios.TCSADRAIN, attrs)
+
+        return restore
+
+    def _on_input(self, fd: int):
+        keys = os.read(fd, 32).decode(errors='ignore')
+        if 'q' in keys:
+            self.shutdown('quit')
+        elif 'r' in keys:
+            self._update_now.set()
+
+    def _start_fetch(self, loop: asyncio.AbstractEventLoop, symbols: list[str]) -> asyncio.Future:
+        future = loop.create_future()
+
+        def resolve(response: dict|None, error: BaseException|None):
+            if future.done():
+                return
+            if error is None:
+                future.set_result(response)
+            else:
+                future.set_exception(error)
+
+        def fetch():
+            response = None
+            error = None
+            try:
+                response = self.client.get_quotes(self.config['convert'], symbols)
+            except Exception as e:
+                error = e
+
+            try:
+                loop.call_soon_threadsafe(resolve, response, error)
+            except RuntimeError:
+                # The loop is closed already, nobody waits for this fetch anymore.
+                pass
+
+        # A daemon thread, a hanging fetch must not keep the app from exiting.
+        threading.Thread(target=fetch, name='fetch', daemon=True).start()
+        return future
+
+    def status(self, text: str):
+        self.status_text = text
+        self._redraw.set()
+
+    async def _data_update(self):
+        self.status('Data update')
         dp_config = self.config['data_provider']
+        provider_id = self.data_provider_id or dp_config['id']
 
-        if dp_config['id'] == 'default':
+        if provider_id == 'default':
             raise ValueError('Found only default config')
-        elif dp_config['id'] == 'cmc':
-            self._data_update_from_cmc(dp_config)
-        else:
-            raise ValueError(f'Unknown data provider: {dp_config["id"]}')
-
-    def _data_update_from_cmc(self, dp_config: dict):
-        status('Get data from CMC ...')
-        response = cmc_get_quotes(
-            api_host=dp_config['api']['host'],
-            api_key=dp_config['api']['key'],
-            convert=self.config['convert'],
-            symbols=self.symbols,
-        )
+
+        if self.client is None:
+            # Keep the client between updates, the rate limit is tracked per client.
+            self.client = create_provider(provider_id, dp_config, pool_size=1, cache=self.quote_cache)
+
+        await self._data_update_from_provider()
+
+    async def _data_update_from_provider(self):
+        if self._fetch is not None and not self._fetch.done():
+            self.status(f'Previous fetch from {self.client.id} still running, skipped')
+            return
+
+        self.status(f'Get data from {self.client.id} ...')
+
+        symbols = self.symbols
+        if self.server is not None:
+            # Clients can subscribe to symbols which are not in any scenario.
+            symbols = symbols + sorted(self.server.symbols() - set(symbols))
+
+        self._fetch = self._start_fetch(asyncio.get_running_loop(), symbols)
+        try:
+            # shield() keeps the fetch running after the deadline, it can't be cancelled anyway.
+            response = await asyncio.wait_for(asyncio.shield(self._fetch), timeout=self.fetch_deadline)
+        except asyncio.TimeoutError:
+            self.status(f'Fetch from {self.client.id} timed out after {self.fetch_deadline}s')
+            return
+
+        if 'data' not in response:
+            self.status(f'Fetch from {self.client.id} failed')
+            return
+
+        now = monotonic()
         for sym, sdata in response['data'].items():
-            status(f'Process sym "{sym}" ...')
-            if len(sdata) == 0:
+            if len(sdata) == 0 or sym not in self.data:
                 continue
 
             fsdata = sdata[0]
-            fiat_quote = fsdata['quote'][self.config['convert']]
+            self._apply_quote(sym, fsdata['quote'][self.config['convert']], now)
+
+        if self.server is not None:
+            self.server.publish(response['data'])
+
+        if self.quote_store is not None:
+            self.quote_store.append_response(self.config['convert'], response['data'])
+
+        self.status(f'Processed {len(self.data)} symbols')
+
+    def _apply_quote(self, sym: str, quote: dict, now: float):
+        coin = self.data[sym]
+        for field, dp_field in DP_FIELDS:
+            if field in quote:
+                coin['dp'][dp_field] = quote[field]
+            elif coin['dp'][dp_field] is None and field != 'last_updated':
+                # Stream messages don't have to carry all fields.
+                coin['dp'][dp_field] = 0.0
+
+        if coin['prev_price'] is not None:
+            if coin['dp']['quote_price'] > coin['prev_price']:
+                coin['direction'] = 1
+            elif coin['dp']['quote_price'] < coin['prev_price']:
+                coin['direction'] = -1
+            else:
+                coin['direction'] = 0
 
-            self.data[sym]['dp']['quote_price'] = fiat_quote['price']
-            self.data[sym]['dp']['last_updated'] = fiat_quote['last_updated']
-            self.data[sym]['dp']['volume_24h'] = fiat_quote['volume_24h']
-            self.data[sym]['dp']['volume_change_24h'] = fiat_quote['volume_change_24h']
-            self.data[sym]['dp']['percent_change_24h'] = fiat_quote['percent_change_24h']
-            self.data[sym]['dp']['market_cap_dominance'] = fiat_quote['market_cap_dominance']
+        if coin['dp']['quote_price'] != coin['prev_price']:
+            coin['changed_at'] = now
 
-            if self.data[sym]['prev_price'] is not None:
-                if self.data[sym]['dp']['quote_price'] > self.data[sym]['prev_price']:
-                    self.data[sym]['direction'] = 1
-                elif self.data[sym]['dp']['quote_price'] < self.data[sym]['prev_price']:
-                    self.data[sym]['direction'] = -1
-                else:
-                    self.data[sym]['direction'] = 0
+        coin['prev_price'] = coin['dp']['quote_price']
 
-            self.data[sym]['prev_price'] = self.data[sym]['dp']['quote_price']
+    def _screen_update(self):
+        # The whole frame is built in memory, only the cells which changed
+        # since the last frame are written to the terminal.
+        frame = Frame(self.screen['columns'])
+
+        if self.stream is None:
+            credits = 0 if self.client is None else self.client.credits
+            if self.server is None:
+                frame.text(0, 0, f'Update Interval: {self.config["update_interval"]} | Rest Updates: {self._rest_updates} | Scenario: {self.scenario} | Credits: {credits}')
+            else:
+                frame.text(0, 0, f'Update Interval: {self.config["update_interval"]} | Rest Updates: {self._rest_updates} | Serving: {self.server.path} | Clients: {len(self.server.clients)} | Credits: {credits}')
+        else:
+            frame.text(0, 0, f'Stream: {self.stream.source} | Rest Updates: {self._rest_updates} | Scenario: {self.scenario} | Messages: {self.stream.received}')
+        if self._input:
+            frame.text(1, 0, f'Last update: {self.last_update} | q: quit, r: update now')
+        else:
+            frame.text(1, 0, f'Last update: {self.last_update}')
+        frame.text(2, 0, f'   -> {self.status_text}')
 
-        status(f'Processed {len(self.data)} symbols')
+        frame.text(TABLE_ROW - 2, 0, TABLE_HEADER)
+        frame.text(TABLE_ROW - 1, 0, '-' * len(TABLE_HEADER))
 
-    def _screen_update(self):
-        print()
-        print()
-        print('SYM      PRICE      24%   24Vol%            24Vol  Dominance')
-        print('------------------------------------------------------------')
-
-        for sym, coin in self.data.items():
-            out_r = '{:5s} {:>8.2f}{} {:>8.2f} {:>8.2f} {:>16.2f}     {:>6.2f}'.format(
-                sym,
-                coin['dp']['quote_price'],
-                rs.all,
-                coin['dp']['percent_change_24h'],
-                coin['dp']['volume_change_24h'],
-                coin['dp']['volume_24h'],
-                coin['dp']['market_cap_dominance'],
-            )
+        now = monotonic()
+        for n, (sym, coin) in enumerate(self.data.items()):
+            row = TABLE_ROW + n
+            if coin['dp']['quote_price'] is None:
+                frame.text(row, 0, f'{sym:5s}')
+                continue
 
             if coin['direction'] == 1:
                 fg_color = fg.green
             elif coin['direction'] == -1:
                 fg_color = fg.red
             else:
-                fg_color = rs.all
+                fg_color = ''
 
-            row_s = fg_color + out_r
-            print(row_s, end='', flush=True)
-            sleep(0.1)
-            print('\033[1G', end='', flush=True)
-            sleep(0.05)
-            print('\033[1B', end='', flush=True)
-            sleep(0.1)
+            if coin['changed_at'] is not None and now - coin['changed_at'] < HIGHLIGHT_TIME:
+                fg_color += ef.bold
 
-            if not self.running:
-                break
+            price_s = '{:5s} {:>8.2f}'.format(sym, coin['dp']['quote_price'])
+            frame.text(row, 0, price_s, fg_color)
+
+            frame.text(row, len(price_s), ' {:>8.2f} {:>8.2f} {:>16.2f}     {:>6.2f}'.format(
+                coin['dp']['percent_change_24h'],
+                coin['dp']['volume_change_24h'],
+                coin['dp']['volume_24h'],
+                coin['dp']['market_cap_dominance'],
+            ))
 
-        print('\033[1E', end='', flush=True)
+        self.renderer.render(frame)
 
     def shutdown(self, reason: str):
-        print()
-        print(f'-> shutting down: {reason}')
+        if self._shutdown_reason is not None:
+            return
+
+        self._shutdown_reason = reason
         self.running = False
+        self._stop.set()
+
+    def _print_shutdown(self):
+        self.renderer.move_below()
+        print()
+        print(f'-> shutting down: {self._shutdown_reason}')
+        if self.client is not None and self.client.credits > 0:
+            print(f'-> data provider: {self.client.calls} calls, {self.client.credits} credits')
+        if self.stream is not None:
+            print(f'-> stream: {self.stream.received} messages, {self.stream.errors} errors, {self.stream_updates} updates')
+        if self.server is not None:
+            print(f'-> server: {self.server.published} updates published')
+        if self.quote_store is not None and self.quote_store.appended > 0:
+            print(f'-> quote store: {self.quote_store.appended} records appended')
 
     def _default_config(self):
         return {
             'update_interval': 60,
+            'max_fps': 10,
             'convert': 'USD',
             'scenario': {
                 'all': ['BTC', 'ETH', 'BNB', 'SOL'],
@@ -224,6 +534,13 @@ def main():
     parser.add_argument('-s', '--scenario', type=str, nargs='?', required=False, help='Scenario', default='all')
     parser.add_argument('-i', '--update-interval', type=int, nargs='?', required=False, help='Overwrite update_interval in config', default=120)
     parser.add_argument('-u', '--max-updates', type=int, nargs='?', required=False, help='Max Updates')
+    parser.add_argument('-p', '--dataprovider', type=str, nargs='?', required=False, help='Data provider ID (cmc, file, record, replay, stream), overwrites data_provider.id in config')
+    parser.add_argument('--profile', type=str, nargs='?', required=False, const='-', help='Print wall/CPU time and allocations per phase as JSON to stderr or to the given file')
+    parser.add_argument('--cprofile', type=str, nargs='?', required=False, help='Write cProfile stats to file')
+    parser.add_argument('--quote-store', action=argparse.BooleanOptionalAction, help='Append fetched quotes to the time-series store (default: quote_store.enabled in config)', default=None)
+    parser.add_argument('--serve', type=str, nargs='?', required=False, const='', help='Fetch the symbols of all scenarios and publish them on a Unix socket (default: server.socket in config)')
+    parser.add_argument('--connect', type=str, nargs='?', required=False, const='', help='Get quotes for the scenario from a ticker server instead of a data provider')
+    parser.add_argument('--quote-cache', action=argparse.BooleanOptionalAction, help='Reuse recently fetched quotes (default: quote_cache.enabled in config)', default=None)
 
     args = parser.parse_args()
     print(args)
@@ -233,6 +550,13 @@ def main():
         scenario=args.scenario,
         update_interval=args.update_interval,
         max_updates=args.max_updates,
+        quote_cache=args.quote_cache,
+        quote_store=args.quote_store,
+        data_provider_id=args.dataprovider,
+        profile=args.profile,
+        cprofile=args.cprofile,
+        serve=args.serve,
+        connect=args.connect,
     )
 
     signal.signal(signal.SIGINT, lambda sig, frame: app.shutdown('SIGINT'))
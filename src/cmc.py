@@ -1,27 +1,235 @@
 
-from requests import Request, Session
+from requests import Request, Response, Session
+from requests.adapters import HTTPAdapter
 from requests.exceptions import ConnectionError, Timeout, TooManyRedirects
 import json
+import random
+from math import ceil
+from time import monotonic, sleep
+from threading import Lock
+from collections import deque
+from logging import getLogger
+from quote_cache import QuoteCache
 
-def get_quotes(api_host: str = 'sandbox-api.coinmarketcap.com', api_key: str = 'b54bcf4d-1bca-4e8e-9a24-22ff2c3d462c', convert: str = 'USD', symbols: list = ['BTC', 'ETH']):
-    symbol_s = ','.join(symbols)
-    url = f'https://{api_host}/v2/cryptocurrency/quotes/latest'
-    parameters = {
-        'convert': convert,
-        'symbol': symbol_s,
-    }
-    headers = {
-        'Accepts': 'application/json',
-        'X-CMC_PRO_API_KEY': api_key,
-    }
-
-    session = Session()
-    session.headers.update(headers)
+_logger = getLogger(f'app.{__name__}')
 
+DEFAULT_TIMEOUT = 10.0
+DEFAULT_BATCH_SIZE = 100
+DEFAULT_MAX_RETRIES = 3
+DEFAULT_BACKOFF = 1.0
+
+# CMC charges one credit per 100 symbols returned.
+SYMBOLS_PER_CREDIT = 100
+
+RETRY_STATUS_CODES = (429, 500, 502, 503, 504)
+
+# Upper limit for a Retry-After header, seconds.
+MAX_RETRY_AFTER = 60.0
+
+class RateLimiter():
+    calls_per_minute: int|None
+    credits_per_minute: int|None
+    window: float
+
+    def __init__(self, calls_per_minute: int|None = None, credits_per_minute: int|None = None, window: float = 60.0):
+        self.calls_per_minute = calls_per_minute
+        self.credits_per_minute = credits_per_minute
+        self.window = window
+        self._calls = deque()
+        self._lock = Lock()
+
+    def acquire(self, credits: int = 1):
+        while True:
+            with self._lock:
+                wait = self._wait_time(credits)
+                if wait <= 0:
+                    self._calls.append((monotonic(), credits))
+                    return
+
+            _logger.debug(f'rate limit: wait {wait:.2f}s')
+            sleep(wait)
+
+    def _wait_time(self, credits: int) -> float:
+        now = monotonic()
+        while len(self._calls) > 0 and now - self._calls[0][0] >= self.window:
+            self._calls.popleft()
+
+        if len(self._calls) == 0:
+            return 0.0
+
+        if self.calls_per_minute is not None and len(self._calls) >= self.calls_per_minute:
+            return self._calls[0][0] + self.window - now
+
+        if self.credits_per_minute is not None:
+            used = sum(c for _, c in self._calls)
+            if used + credits > self.credits_per_minute:
+                # Wait until enough credits have left the window.
+                for call_time, call_credits in self._calls:
+                    used -= call_credits
+                    if used + credits <= self.credits_per_minute:
+                        return call_time + self.window - now
+
+        return 0.0
+
+class CmcClient():
+    api_host: str
+    timeout: float
+    session: Session
+    cache: QuoteCache|None
+    limiter: RateLimiter
+    batch_size: int
+    max_retries: int
+    backoff: float
+    calls: int
+    credits: int
+
+    def __init__(self, api_host: str = 'sandbox-api.coinmarketcap.com', api_key: str = 'b54bcf4d-1bca-4e8e-9a24-22ff2c3d462c', timeout: float = DEFAULT_TIMEOUT, pool_size: int = 10, cache: QuoteCache|None = None, limiter: RateLimiter|None = None, batch_size: int = DEFAULT_BATCH_SIZE, max_retries: int = DEFAULT_MAX_RETRIES, backoff: float = DEFAULT_BACKOFF):
+        self.api_host = api_host
+        self.timeout = timeout
+        self.cache = cache
+        self.limiter = limiter or RateLimiter()
+        self.batch_size = batch_size
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.calls = 0
+        self.credits = 0
+        self._lock = Lock()
+
+        headers = {
+            'Accepts': 'application/json',
+            'X-CMC_PRO_API_KEY': api_key,
+        }
+
+        # One session for all requests, safe to share between threads.
+        self.session = Session()
+        self.session.headers.update(headers)
+        self.session.mount('https://', HTTPAdapter(pool_connections=1, pool_maxsize=pool_size))
+
+    def get_quotes(self, convert: str = 'USD', symbols: list = ['BTC', 'ETH']):
+        if self.cache is not None:
+            return self.cache.get_quotes(self._fetch_quotes, convert, symbols)
+        return self._fetch_quotes(convert, symbols)
+
+    def _fetch_quotes(self, convert: str, symbols: list):
+        response = {'data': {}}
+        credit_count = 0
+        failed = []
+        failed_data = None
+
+        # Long symbol lists exceed the URL length, split them into batches.
+        # A failed batch doesn't throw away the batches already fetched.
+        for n in range(0, len(symbols), self.batch_size):
+            batch = symbols[n:n + self.batch_size]
+
+            data = self._request(convert, batch)
+            if 'status' in data:
+                credit_count += data['status'].get('credit_count') or 0
+
+            if 'data' not in data:
+                _logger.warning(f'cmc: batch failed: {_error_message(data)}: {batch}')
+                failed.extend(batch)
+                failed_data = data
+                continue
+
+            response['data'].update(data['data'])
+            if 'status' in data:
+                response['status'] = data['status']
+
+        if len(failed) == len(symbols) and failed_data is not None:
+            return failed_data
+
+        if len(failed) > 0:
+            status = response.get('status', {})
+            failed_status = failed_data.get('status', {})
+            response['status'] = {
+                **status,
+                'error_code': failed_status.get('error_code'),
+                'error_message': f'{len(failed)} of {len(symbols)} symbols failed: {_error_message(failed_data)}',
+                'failed_symbols': failed,
+            }
+
+        if 'status' in response:
+            response['status'] = {**response['status'], 'credit_count': credit_count}
+
+        return response
+
+    def _request(self, convert: str, symbols: list):
+        url = f'https://{self.api_host}/v2/cryptocurrency/quotes/latest'
+        parameters = {
+            'convert': convert,
+            'symbol': ','.join(symbols),
+        }
+
+        attempt = 0
+        while True:
+            self.limiter.acquire(ceil(len(symbols) / SYMBOLS_PER_CREDIT))
+
+            response = None
+            try:
+                response = self.session.get(url, params=parameters, timeout=self.timeout)
+            except (ConnectionError, Timeout) as e:
+                if attempt >= self.max_retries:
+                    print(e)
+                    return {}
+                _logger.warning(f'cmc: {e}, retry {attempt + 1}/{self.max_retries}')
+            except TooManyRedirects as e:
+                print(e)
+                return {}
+            else:
+                if response.status_code not in RETRY_STATUS_CODES or attempt >= self.max_retries:
+                    data = json.loads(response.text)
+                    self._count(data)
+                    return data
+                _logger.warning(f'cmc: HTTP {response.status_code}, retry {attempt + 1}/{self.max_retries}')
+
+            sleep(self._retry_delay(attempt, response))
+            attempt += 1
+
+    def _retry_delay(self, attempt: int, response: Response|None) -> float:
+        if response is not None and 'Retry-After' in response.headers:
+            try:
+                return min(max(float(response.headers['Retry-After']), 0.0), MAX_RETRY_AFTER)
+            except ValueError:
+                pass
+
+        # Exponential backoff with full jitter, so parallel requests don't retry in lockstep.
+        return random.uniform(0, self.backoff * 2 ** attempt)
+
+    def _count(self, data: dict):
+        with self._lock:
+            self.calls += 1
+            if 'status' in data:
+                self.credits += data['status'].get('credit_count') or 0
+
+    def close(self):
+        self.session.close()
+
+def _error_message(data: dict) -> str:
+    status = data.get('status') or {}
+    return status.get('error_message') or 'no response'
+
+def create_client(dp_config: dict, pool_size: int = 10, cache: QuoteCache|None = None) -> CmcClient:
+    rate_limit = dp_config.get('rate_limit', {})
+    limiter = RateLimiter(
+        calls_per_minute=rate_limit.get('calls_per_minute'),
+        credits_per_minute=rate_limit.get('credits_per_minute'),
+    )
+
+    return CmcClient(
+        api_host=dp_config['api']['host'],
+        api_key=dp_config['api']['key'],
+        timeout=dp_config.get('timeout', DEFAULT_TIMEOUT),
+        pool_size=pool_size,
+        cache=cache,
+        limiter=limiter,
+        batch_size=dp_config.get('batch_size', DEFAULT_BATCH_SIZE),
+        max_retries=dp_config.get('max_retries', DEFAULT_MAX_RETRIES),
+        backoff=dp_config.get('backoff', DEFAULT_BACKOFF),
+    )
+
+def get_quotes(api_host: str = 'sandbox-api.coinmarketcap.com', api_key: str = 'b54bcf4d-1bca-4e8e-9a24-22ff2c3d462c', convert: str = 'USD', symbols: list = ['BTC', 'ETH'], timeout: float = DEFAULT_TIMEOUT, cache: QuoteCache|None = None):
+    client = CmcClient(api_host=api_host, api_key=api_key, timeout=timeout, pool_size=1, cache=cache)
     try:
-        response = session.get(url, params=parameters)
-        data = json.loads(response.text)
-        return data
-    except (ConnectionError, Timeout, TooManyRedirects) as e:
-        print(e)
-        return {}
+        return client.get_quotes(convert=convert, symbols=symbols)
+    finally:
+        client.close()
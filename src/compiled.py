@@ -0,0 +1,367 @@
+
+import sys
+import struct
+from array import array
+from json import dumps, loads
+from pathlib import Path
+
+# Compiled portfolio file (.bpc)
+#
+# All values are little-endian. The header is followed by the columns,
+# f64 columns first so they are 8-byte aligned for zero-copy casts:
+#
+#   header   magic, version, n_strings, blob_size, n_sources, n_pairs, n_trx, file_ignore, file_extra
+#   f64      trx_price, trx_quantity, trx_target, trx_fee_q                           [n_trx]
+#   i32      source_name, source_extra                                                [n_sources]
+#   i32      pair_source, pair_name, pair_state, pair_extra                           [n_pairs]
+#   i32      trx_pair, trx_date, trx_type, trx_state, trx_fee_sym, trx_extra          [n_trx]
+#   u32      string offsets                                                           [n_strings + 1]
+#   i8       source_ignore                                                            [n_sources]
+#   i8       pair_ignore                                                              [n_pairs]
+#   i8       trx_ignore                                                               [n_trx]
+#   u8       trx_ints                                                                 [n_trx]
+#   bytes    string blob (utf-8)                                                      [blob_size]
+#
+# Strings (symbols, sources, dates, ...) are interned in one table and
+# referenced by index, -1 means "not set". Numbers which are not set are
+# stored as NaN. An ignore flag is -1 (not set), 0 or 1. trx_ints marks
+# which numeric columns were integers in the source file. Keys without a
+# column are kept as a JSON object in the extra columns.
+
+COMPILED_SUFFIX = '.bpc'
+MAGIC = b'BPC1'
+VERSION = 1
+
+_HEADER = struct.Struct('<4sIIIIIIii')
+_HEADER_SIZE = 40 # padded to 8 bytes
+
+_NAN = float('nan')
+
+_TRX_NUMBERS = ('price', 'quantity', 'target')
+_INT_PRICE = 1
+_INT_QUANTITY = 2
+_INT_TARGET = 4
+_INT_FEE = 8
+_INT_FLAGS = {
+    'price': _INT_PRICE,
+    'quantity': _INT_QUANTITY,
+    'target': _INT_TARGET,
+}
+
+class _StringTable():
+    strings: list[str]
+    index: dict[str, int]
+
+    def __init__(self):
+        self.strings = []
+        self.index = {}
+
+    def add(self, s: str|None) -> int:
+        if s is None:
+            return -1
+
+        if s not in self.index:
+            self.index[s] = len(self.strings)
+            self.strings.append(s)
+
+        return self.index[s]
+
+def _number(value) -> tuple[float, bool]|None:
+    if isinstance(value, bool) or not isinstance(value, (int, float)):
+        return None
+
+    f = float(value)
+    if isinstance(value, int):
+        if f != value:
+            # Too large for a f64 column.
+            return None
+        return f, True
+
+    return f, False
+
+def _ignore(d: dict) -> int:
+    if 'ignore' not in d:
+        return -1
+    return 1 if d['ignore'] else 0
+
+def _extra(strings: _StringTable, extra: dict) -> int:
+    if len(extra) == 0:
+        return -1
+    return strings.add(dumps(extra, default=str, separators=(',', ':')))
+
+def compile_portfolio(raw_data: dict) -> bytes:
+    if 'sources' not in raw_data:
+        raise ValueError('No sources-field found')
+
+    strings = _StringTable()
+
+    source_name = array('i')
+    source_extra = array('i')
+    source_ignore = array('b')
+
+    pair_source = array('i')
+    pair_name = array('i')
+    pair_state = array('i')
+    pair_extra = array('i')
+    pair_ignore = array('b')
+
+    trx_price = array('d')
+    trx_quantity = array('d')
+    trx_target = array('d')
+    trx_fee_q = array('d')
+    trx_pair = array('i')
+    trx_date = array('i')
+    trx_type = array('i')
+    trx_state = array('i')
+    trx_fee_sym = array('i')
+    trx_extra = array('i')
+    trx_ignore = array('b')
+    trx_ints = array('B')
+
+    trx_numbers = {
+        'price': trx_price,
+        'quantity': trx_quantity,
+        'target': trx_target,
+    }
+
+    file_extra = {k: v for k, v in raw_data.items() if k not in ('ignore', 'sources')}
+
+    for source in raw_data['sources']:
+        source_i = len(source_name)
+        source_name.append(strings.add(source.get('source')))
+        source_ignore.append(_ignore(source))
+        source_extra.append(_extra(strings, {k: v for k, v in source.items() if k not in ('source', 'ignore', 'pairs')}))
+
+        for pair in source.get('pairs', []):
+            pair_i = len(pair_name)
+            pair_source.append(source_i)
+            pair_name.append(strings.add(pair.get('pair')))
+            pair_ignore.append(_ignore(pair))
+
+            extra = {}
+            state = -1
+            for key, value in pair.items():
+                if key in ('pair', 'ignore', 'transactions'):
+                    continue
+                if key == 'state' and isinstance(value, str):
+                    state = strings.add(value)
+                else:
+                    extra[key] = value
+            pair_state.append(state)
+            pair_extra.append(_extra(strings, extra))
+
+            for transaction in pair.get('transactions', []):
+                trx_pair.append(pair_i)
+                trx_ignore.append(_ignore(transaction))
+
+                extra = {}
+                date = -1
+                ttype = -1
+                state = -1
+                fee_q = _NAN
+                fee_sym = -1
+                ints = 0
+                numbers = {key: _NAN for key in _TRX_NUMBERS}
+
+                for key, value in transaction.items():
+                    if key == 'ignore':
+                        continue
+
+                    if key == 'date' and isinstance(value, str):
+                        date = strings.add(value)
+                    elif key == 'type' and isinstance(value, str):
+                        ttype = strings.add(value)
+                    elif key == 'state' and isinstance(value, str):
+                        state = strings.add(value)
+                    elif key in _TRX_NUMBERS and (number := _number(value)) is not None:
+                        numbers[key], is_int = number
+                        if is_int:
+                            ints |= _INT_FLAGS[key]
+                    elif key == 'fee' and isinstance(value, (list, tuple)) and len(value) == 2 and (number := _number(value[0])) is not None and isinstance(value[1], str):
+                        fee_q, is_int = number
+                        if is_int:
+                            ints |= _INT_FEE
+                        fee_sym = strings.add(value[1])
+                    else:
+                        extra[key] = value
+
+                for key, column in trx_numbers.items():
+                    column.append(numbers[key])
+
+                trx_date.append(date)
+                trx_type.append(ttype)
+                trx_state.append(state)
+                trx_fee_q.append(fee_q)
+                trx_fee_sym.append(fee_sym)
+                trx_ints.append(ints)
+                trx_extra.append(_extra(strings, extra))
+
+    file_extra_i = _extra(strings, file_extra)
+
+    blob = bytearray()
+    offsets = array('I', [0])
+    for s in strings.strings:
+        blob += s.encode('utf-8')
+        offsets.append(len(blob))
+
+    header = _HEADER.pack(
+        MAGIC,
+        VERSION,
+        len(strings.strings),
+        len(blob),
+        len(source_name),
+        len(pair_name),
+        len(trx_pair),
+        _ignore(raw_data),
+        file_extra_i,
+    )
+
+    columns = [
+        trx_price, trx_quantity, trx_target, trx_fee_q,
+        source_name, source_extra,
+        pair_source, pair_name, pair_state, pair_extra,
+        trx_pair, trx_date, trx_type, trx_state, trx_fee_sym, trx_extra,
+        offsets,
+        source_ignore, pair_ignore, trx_ignore, trx_ints,
+    ]
+
+    out = bytearray(header)
+    out += bytes(_HEADER_SIZE - len(header))
+    for column in columns:
+        if sys.byteorder != 'little':
+            column = array(column.typecode, column)
+            column.byteswap()
+        out += column.tobytes()
+    out += blob
+
+    return bytes(out)
+
+def _read_column(mv: memoryview, offset: int, typecode: str, count: int) -> tuple[list, int]:
+    size = array(typecode).itemsize * count
+    if offset + size > len(mv):
+        raise ValueError('Compiled portfolio is truncated')
+
+    if sys.byteorder != 'little':
+        column = array(typecode)
+        column.frombytes(mv[offset:offset + size])
+        column.byteswap()
+        return column.tolist(), offset + size
+
+    with mv[offset:offset + size] as chunk, chunk.cast(typecode) as column:
+        return column.tolist(), offset + size
+
+def decode_portfolio(buffer) -> dict:
+    with memoryview(buffer) as mv:
+        if len(mv) < _HEADER_SIZE:
+            raise ValueError('Compiled portfolio is too short')
+
+        magic, version, n_strings, blob_size, n_sources, n_pairs, n_trx, file_ignore, file_extra = _HEADER.unpack_from(mv)
+        if magic != MAGIC:
+            raise ValueError(f'Not a compiled portfolio: {magic}')
+        if version != VERSION:
+            raise ValueError(f'Unsupported compiled portfolio version: {version}')
+
+        offset = _HEADER_SIZE
+        trx_price, offset = _read_column(mv, offset, 'd', n_trx)
+        trx_quantity, offset = _read_column(mv, offset, 'd', n_trx)
+        trx_target, offset = _read_column(mv, offset, 'd', n_trx)
+        trx_fee_q, offset = _read_column(mv, offset, 'd', n_trx)
+        source_name, offset = _read_column(mv, offset, 'i', n_sources)
+        source_extra, offset = _read_column(mv, offset, 'i', n_sources)
+        pair_source, offset = _read_column(mv, offset, 'i', n_pairs)
+        pair_name, offset = _read_column(mv, offset, 'i', n_pairs)
+        pair_state, offset = _read_column(mv, offset, 'i', n_pairs)
+        pair_extra, offset = _read_column(mv, offset, 'i', n_pairs)
+        trx_pair, offset = _read_column(mv, offset, 'i', n_trx)
+        trx_date, offset = _read_column(mv, offset, 'i', n_trx)
+        trx_type, offset = _read_column(mv, offset, 'i', n_trx)
+        trx_state, offset = _read_column(mv, offset, 'i', n_trx)
+        trx_fee_sym, offset = _read_column(mv, offset, 'i', n_trx)
+        trx_extra, offset = _read_column(mv, offset, 'i', n_trx)
+        offsets, offset = _read_column(mv, offset, 'I', n_strings + 1)
+        source_ignore, offset = _read_column(mv, offset, 'b', n_sources)
+        pair_ignore, offset = _read_column(mv, offset, 'b', n_pairs)
+        trx_ignore, offset = _read_column(mv, offset, 'b', n_trx)
+        trx_ints, offset = _read_column(mv, offset, 'B', n_trx)
+
+        if offset + blob_size > len(mv):
+            raise ValueError('Compiled portfolio is truncated')
+        blob = bytes(mv[offset:offset + blob_size])
+
+    strings = [blob[offsets[i]:offsets[i + 1]].decode('utf-8') for i in range(n_strings)]
+
+    raw_data = {}
+    if file_ignore >= 0:
+        raw_data['ignore'] = bool(file_ignore)
+    if file_extra >= 0:
+        raw_data.update(loads(strings[file_extra]))
+
+    sources = []
+    for i in range(n_sources):
+        source = {}
+        if source_name[i] >= 0:
+            source['source'] = strings[source_name[i]]
+        if source_ignore[i] >= 0:
+            source['ignore'] = bool(source_ignore[i])
+        if source_extra[i] >= 0:
+            source.update(loads(strings[source_extra[i]]))
+        source['pairs'] = []
+        sources.append(source)
+    raw_data['sources'] = sources
+
+    pairs = []
+    for i in range(n_pairs):
+        pair = {}
+        if pair_name[i] >= 0:
+            pair['pair'] = strings[pair_name[i]]
+        if pair_ignore[i] >= 0:
+            pair['ignore'] = bool(pair_ignore[i])
+        if pair_state[i] >= 0:
+            pair['state'] = strings[pair_state[i]]
+        if pair_extra[i] >= 0:
+            pair.update(loads(strings[pair_extra[i]]))
+        pair['transactions'] = []
+        sources[pair_source[i]]['pairs'].append(pair)
+        pairs.append(pair)
+
+    for i in range(n_trx):
+        transaction = {}
+        ints = trx_ints[i]
+
+        if trx_date[i] >= 0:
+            transaction['date'] = strings[trx_date[i]]
+        if trx_type[i] >= 0:
+            transaction['type'] = strings[trx_type[i]]
+
+        price = trx_price[i]
+        if price == price:
+            transaction['price'] = int(price) if ints & _INT_PRICE else price
+        quantity = trx_quantity[i]
+        if quantity == quantity:
+            transaction['quantity'] = int(quantity) if ints & _INT_QUANTITY else quantity
+        target = trx_target[i]
+        if target == target:
+            transaction['target'] = int(target) if ints & _INT_TARGET else target
+        if trx_fee_sym[i] >= 0:
+            fee_q = trx_fee_q[i]
+            transaction['fee'] = [int(fee_q) if ints & _INT_FEE else fee_q, strings[trx_fee_sym[i]]]
+
+        if trx_state[i] >= 0:
+            transaction['state'] = strings[trx_state[i]]
+        if trx_ignore[i] >= 0:
+            transaction['ignore'] = bool(trx_ignore[i])
+        if trx_extra[i] >= 0:
+            transaction.update(loads(strings[trx_extra[i]]))
+
+        pairs[trx_pair[i]]['transactions'].append(transaction)
+
+    return raw_data
+
+def load_compiled(file: Path, data: bytes|None = None) -> dict:
+    # All transactions are decoded into dicts at once, so the file is read
+    # as a whole, a memory map would be copied just the same.
+    if data is None:
+        data = file.read_bytes()
+    if len(data) == 0:
+        raise ValueError(f'Compiled portfolio is empty: {file}')
+    return decode_portfolio(data)
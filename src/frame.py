@@ -0,0 +1,116 @@
+
+import sys
+from typing import TextIO
+
+RESET = '\033[0m'
+
+# A cell is a character with the ANSI style it is drawn with.
+Cell = tuple[str, str]
+
+BLANK: Cell = (' ', '')
+
+class Frame():
+    columns: int
+    rows: dict[int, list[Cell]]
+
+    def __init__(self, columns: int = 80):
+        self.columns = columns
+        self.rows = {}
+
+    def text(self, row: int, col: int, text: str, style: str = ''):
+        if col >= self.columns:
+            return
+        text = text[:self.columns - col]
+
+        cells = self.rows.get(row)
+        if cells is None:
+            cells = self.rows[row] = []
+
+        if len(cells) < col + len(text):
+            cells.extend([BLANK] * (col + len(text) - len(cells)))
+
+        for n, char in enumerate(text):
+            cells[col + n] = (char, style)
+
+    @property
+    def height(self) -> int:
+        if len(self.rows) == 0:
+            return 0
+        return max(self.rows) + 1
+
+def _gap(cells: list[Cell], start: int, end: int, style: str|None) -> tuple[str, str|None]:
+    # The cells start..end as written by render(), and the style after them.
+    buf = []
+    for col in range(start, end):
+        char, cell_style = cells[col] if col < len(cells) else BLANK
+        if cell_style != style:
+            buf.append(RESET + cell_style)
+            style = cell_style
+        buf.append(char)
+    return ''.join(buf), style
+
+class FrameRenderer():
+    out: TextIO
+    frame: Frame
+    changed_cells: int
+
+    def __init__(self, out: TextIO|None = None):
+        self.out = out or sys.stdout
+        self.frame = Frame()
+        self.changed_cells = 0
+
+    def reset(self):
+        # Forget what is on the screen, the next frame is drawn completely.
+        self.frame = Frame()
+
+    def render(self, frame: Frame) -> int:
+        buf = []
+        changed = 0
+
+        for row in sorted(frame.rows.keys() | self.frame.rows.keys()):
+            new_cells = frame.rows.get(row, [])
+            old_cells = self.frame.rows.get(row, [])
+            if new_cells == old_cells:
+                continue
+
+            style = None
+            run_col = None
+            for col in range(max(len(new_cells), len(old_cells))):
+                new_cell = new_cells[col] if col < len(new_cells) else BLANK
+                old_cell = old_cells[col] if col < len(old_cells) else BLANK
+                if new_cell == old_cell:
+                    continue
+
+                if run_col != col:
+                    # Start a run of changed cells. A short gap of unchanged
+                    # cells is written again, it's shorter than a cursor move.
+                    move = f'\033[{row + 1};{col + 1}H'
+                    if run_col is not None and col - run_col < len(move):
+                        gap, gap_style = _gap(new_cells, run_col, col, style)
+                        if len(gap) < len(move):
+                            move = gap
+                            style = gap_style
+                    buf.append(move)
+                if new_cell[1] != style:
+                    buf.append(RESET + new_cell[1])
+                    style = new_cell[1]
+
+                buf.append(new_cell[0])
+                run_col = col + 1
+                changed += 1
+
+        self.frame = frame
+        self.changed_cells = changed
+
+        if changed > 0:
+            buf.append(RESET)
+            # Park the cursor below the frame.
+            buf.append(f'\033[{frame.height + 1};1H')
+            self.out.write(''.join(buf))
+            self.out.flush()
+
+        return changed
+
+    def move_below(self):
+        self.out.write(f'\033[{self.frame.height + 1};1H')
+        self.out.flush()
@@ -1,4 +1,6 @@
 
+import os
+from pathlib import Path
 from holding import Holding
 from transaction import Transaction
 
@@ -10,3 +12,19 @@ def sort_holdings(item: tuple[str, Holding]):
 
 def sort_transactions(item: Transaction):
     return item.date
+
+def default_cache_dir(name: str) -> Path:
+    xdg_cache = os.environ.get('XDG_CACHE_HOME')
+    if xdg_cache:
+        base = Path(xdg_cache)
+    else:
+        base = Path.home() / '.cache'
+    return base / 'bittrackr' / name
+
+def default_data_dir(name: str) -> Path:
+    xdg_data = os.environ.get('XDG_DATA_HOME')
+    if xdg_data:
+        base = Path(xdg_data)
+    else:
+        base = Path.home() / '.local' / 'share'
+    return base / 'bittrackr' / name
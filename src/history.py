@@ -0,0 +1,283 @@
+
+import csv
+import numpy as np
+from datetime import date, datetime, timezone
+from logging import getLogger
+from pathlib import Path
+from portfolio import Portfolio
+from tsstore import QuoteStore, parse_time
+
+_logger = getLogger(f'app.{__name__}')
+
+PERIODS = {
+    'day': 24 * 60 * 60,
+    'hour': 60 * 60,
+}
+
+# Quantities are summed up for this many (portfolio, symbol, period) cells at a
+# time, so the memory used doesn't grow with the size of the tree.
+BLOCK_CELLS = 1 << 21
+
+class Deltas():
+    # Quantity changes of all transactions of a tree, one per symbol of a transaction.
+    nodes: list[Portfolio]
+    parents: list[int]
+    symbols: list[str]
+    node: np.ndarray
+    symbol: np.ndarray
+    time: np.ndarray
+    quantity: np.ndarray
+
+    def __init__(self, nodes: list[Portfolio], parents: list[int], symbols: list[str], node: list[int], symbol: list[int], time: list[float], quantity: list[float]):
+        self.nodes = nodes
+        self.parents = parents
+        self.symbols = symbols
+        self.node = np.array(node, dtype=np.intp)
+        self.symbol = np.array(symbol, dtype=np.intp)
+        self.time = np.array(time, dtype=np.float64)
+        self.quantity = np.array(quantity, dtype=np.float64)
+
+    def first_time(self) -> float|None:
+        times = self.time[np.isfinite(self.time)]
+        if len(times) == 0:
+            return None
+        return float(times.min())
+
+class ValueCurve():
+    path: str
+    value: np.ndarray
+    cost: np.ndarray
+
+    def __init__(self, path: str, value: np.ndarray, cost: np.ndarray):
+        self.path = path
+        self.value = value
+        self.cost = cost
+
+    @property
+    def profit(self) -> np.ndarray:
+        return self.value - self.cost
+
+def _trx_time(value) -> float:
+    if isinstance(value, datetime):
+        if value.tzinfo is None:
+            value = value.replace(tzinfo=timezone.utc)
+        return value.timestamp()
+    if isinstance(value, date):
+        return datetime(value.year, value.month, value.day, tzinfo=timezone.utc).timestamp()
+
+    # Transactions without a date are counted from the beginning.
+    trx_time = parse_time(value)
+    if trx_time is None:
+        return -np.inf
+    return trx_time
+
+def collect_deltas(portfolio: Portfolio) -> Deltas:
+    nodes = []
+    parents = []
+    stack = [(portfolio, -1)]
+    while len(stack) > 0:
+        node, parent = stack.pop()
+        parents.append(parent)
+        nodes.append(node)
+        for sub_portfolio in reversed(node.subs):
+            stack.append((sub_portfolio, len(nodes) - 1))
+
+    symbols = {}
+    times = {}
+    d_node = []
+    d_symbol = []
+    d_time = []
+    d_quantity = []
+
+    def add(n: int, symbol: str, trx_time: float, quantity: float):
+        if symbol not in symbols:
+            symbols[symbol] = len(symbols)
+        d_node.append(n)
+        d_symbol.append(symbols[symbol])
+        d_time.append(trx_time)
+        d_quantity.append(quantity)
+
+    for n, node in enumerate(nodes):
+        for transaction in node.own_transactions:
+            # Dates repeat a lot, parse every one only once.
+            trx_time = times.get(transaction.date)
+            if trx_time is None:
+                trx_time = times[transaction.date] = _trx_time(transaction.date)
+
+            # The same quantities Portfolio.calc() adds to the holdings.
+            if transaction.is_pair:
+                if transaction.ttype == 'buy':
+                    sign = 1.0
+                elif transaction.ttype == 'sell':
+                    sign = -1.0
+                else:
+                    raise ValueError(f'Unknown Transaction type: {transaction.ttype}')
+
+                add(n, transaction.sell_symbol, trx_time, -sign * transaction.sell_quantity)
+                if transaction.buy_symbol != transaction.sell_symbol:
+                    add(n, transaction.buy_symbol, trx_time, sign * transaction.quantity)
+            else:
+                if transaction.ttype == 'in':
+                    add(n, transaction.pair_s, trx_time, transaction.quantity)
+                elif transaction.ttype == 'out':
+                    add(n, transaction.pair_s, trx_time, -transaction.quantity)
+                else:
+                    raise ValueError(f'Unknown Transaction type: {transaction.ttype}')
+
+    return Deltas(nodes, parents, list(symbols), d_node, d_symbol, d_time, d_quantity)
+
+def period_ends(start: float, end: float, period: str) -> np.ndarray:
+    if period not in PERIODS:
+        raise ValueError(f'Unknown period: {period}')
+    if end < start:
+        raise ValueError('End of history is before its start')
+
+    # Periods start at full days/hours (UTC), a period ends where the next one starts.
+    step = PERIODS[period]
+    first = start // step * step
+    n = int((end - first) // step) + 1
+    return first + step * np.arange(1, n + 1, dtype=np.float64)
+
+def period_starts(ends: np.ndarray, period: str) -> list[datetime]:
+    step = PERIODS[period]
+    return [datetime.fromtimestamp(value - step, timezone.utc).replace(tzinfo=None) for value in ends.tolist()]
+
+def _fill_prices(row: np.ndarray, times: np.ndarray, values: np.ndarray, ends: np.ndarray):
+    # The price of a period is the last one before it ends, periods before the first price stay NaN.
+    order = np.argsort(times, kind='stable')
+    times = times[order]
+    values = values[order]
+
+    idx = np.searchsorted(times, ends, side='left') - 1
+    known = idx >= 0
+    row[known] = values[idx[known]]
+
+def store_prices(store: QuoteStore, convert: str, symbols: list[str], ends: np.ndarray) -> np.ndarray:
+    prices = np.full((len(symbols), len(ends)), np.nan)
+    for n, symbol in enumerate(symbols):
+        if symbol == convert:
+            prices[n] = 1.0
+            continue
+
+        # The last price before the first period is carried into it.
+        records = store.range(convert, symbol, ends[0], ends[-1])
+        before = store.latest(convert, symbol, at=ends[0])
+        if before is not None:
+            records.insert(0, before)
+        if len(records) == 0:
+            continue
+
+        columns = np.array(records, dtype=np.float64)
+        _fill_prices(prices[n], columns[:, 0], columns[:, 1], ends)
+
+    return prices
+
+def file_prices(path: Path, convert: str, symbols: list[str], ends: np.ndarray) -> np.ndarray:
+    # CSV file with the columns date, symbol and price (in convert).
+    series = {}
+    with open(path, 'r', newline='') as f:
+        for row in csv.DictReader(f):
+            price_time = parse_time(row['date'])
+            if price_time is None:
+                raise ValueError(f'Invalid date in {path}: {row["date"]}')
+            times, values = series.setdefault(row['symbol'], ([], []))
+            times.append(price_time)
+            values.append(float(row['price']))
+
+    prices = np.full((len(symbols), len(ends)), np.nan)
+    for n, symbol in enumerate(symbols):
+        if symbol == convert:
+            prices[n] = 1.0
+        elif symbol in series:
+            times, values = series[symbol]
+            _fill_prices(prices[n], np.array(times, dtype=np.float64), np.array(values, dtype=np.float64), ends)
+
+    return prices
+
+def missing_prices(symbols: list[str], prices: np.ndarray) -> list[str]:
+    return [symbol for n, symbol in enumerate(symbols) if np.isnan(prices[n]).all()]
+
+def value_curves(deltas: Deltas, convert: str, ends: np.ndarray, prices: np.ndarray, minimum: float|None = None, ignore: list[str]|None = None) -> dict[str, ValueCurve]:
+    # Like the portfolio output, holdings with a quantity below minimum
+    # (unless their symbol is in ignore) don't count into the value.
+    n_nodes = len(deltas.nodes)
+    n_periods = len(ends)
+
+    value = np.zeros((n_nodes, n_periods))
+    cost = np.zeros((n_nodes, n_periods))
+
+    # Period of every delta, transactions before the start count into the first period.
+    period = np.searchsorted(ends, deltas.time, side='right')
+    keep = np.flatnonzero(period < n_periods)
+
+    # A delta counts for its portfolio and all parent portfolios, so a row
+    # holds the quantity of a symbol in a whole sub tree.
+    parents = np.array(deltas.parents, dtype=np.intp)
+    r_node = []
+    r_delta = []
+    node = deltas.node[keep]
+    while len(node) > 0:
+        r_node.append(node)
+        r_delta.append(keep)
+        node = parents[node]
+        has_parent = node >= 0
+        node = node[has_parent]
+        keep = keep[has_parent]
+
+    if len(r_node) > 0:
+        r_delta = np.concatenate(r_delta)
+
+        # One row per symbol and portfolio. Sorted by symbol first, the rows of a
+        # symbol are a slice and the deltas of a block of rows too.
+        key = deltas.symbol[r_delta] * n_nodes + np.concatenate(r_node)
+        order = np.argsort(key, kind='stable')
+        key = key[order]
+        new_row = np.empty(len(key), dtype=bool)
+        new_row[0] = True
+        np.not_equal(key[1:], key[:-1], out=new_row[1:])
+        rows = np.cumsum(new_row) - 1
+        keys = key[new_row]
+        period = period[r_delta[order]]
+        quantity = deltas.quantity[r_delta[order]]
+
+        row_symbol = keys // n_nodes
+        row_node = keys % n_nodes
+        ignored = [symbol in (ignore or []) for symbol in deltas.symbols]
+
+        block_rows = max(1, BLOCK_CELLS // n_periods)
+        for first in range(0, len(keys), block_rows):
+            last = min(len(keys), first + block_rows)
+            lo, hi = np.searchsorted(rows, [first, last])
+
+            # Quantity changes per row and period, summed up to the quantity held at the end of each period.
+            flat = (rows[lo:hi] - first) * n_periods + period[lo:hi]
+            held = np.bincount(flat, weights=quantity[lo:hi], minlength=(last - first) * n_periods).reshape(last - first, n_periods)
+            np.cumsum(held, axis=1, out=held)
+
+            symbols = row_symbol[first:last]
+            nodes = row_node[first:last]
+            starts = np.flatnonzero(np.diff(symbols)) + 1
+            for a, b in zip([0, *starts.tolist()], [*starts.tolist(), last - first]):
+                symbol = int(symbols[a])
+                seg = held[a:b]
+
+                if deltas.symbols[symbol] == convert:
+                    # What was spent in convert are the costs, like Portfolio.costs.
+                    cost[nodes[a:b]] = -seg
+                    continue
+
+                if minimum is None or ignored[symbol]:
+                    counts = seg != 0.0
+                elif minimum > 0.0:
+                    counts = seg >= minimum
+                else:
+                    counts = (seg >= minimum) & (seg != 0.0)
+
+                # Periods without a price are NaN, unless nothing is held.
+                seg *= prices[symbol]
+                np.putmask(seg, ~counts, 0.0)
+
+                # A portfolio has one row per symbol.
+                value[nodes[a:b]] += seg
+
+    return {node.path: ValueCurve(node.path, value[n], cost[n]) for n, node in enumerate(deltas.nodes)}
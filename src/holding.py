@@ -1,10 +1,17 @@
 
 from spot import Spot
-from transaction import Transaction
 
 class Holding(Spot):
+    __slots__ = ('quote', 'cost_basis', 'realized', 'unrealized', 'unmatched')
+
     quote: float
-    transactions: list[Transaction]
+
+    # Only with a lot method, see lots.py.
+    cost_basis: float|None
+    realized: float|None
+    unrealized: float|None
+    # Quantity given away beyond the lots held.
+    unmatched: float|None
 
     def __init__(self, s: str, q: float = 0.0):
         super().__init__(s, q)
@@ -13,8 +20,16 @@ class Holding(Spot):
         self.value = 0.0
         self.profit = 0.0
 
+        self.cost_basis = None
+        self.realized = None
+        self.unrealized = None
+        self.unmatched = None
+
     def to_json(self):
         return {
             **super().to_json(),
             'quote': self.quote,
+            'realized': self.realized,
+            'unrealized': self.unrealized,
+            'unmatched': self.unmatched,
         }
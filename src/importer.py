@@ -0,0 +1,550 @@
+#!/usr/bin/env python3
+
+import csv
+import io
+import os
+import json
+import pickle
+import re
+import tempfile
+from argparse import ArgumentParser
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date, datetime, timezone
+from hashlib import sha1
+from logging import getLogger
+from pathlib import Path
+from typing import BinaryIO
+from portfolio_file import open_portfolio_file, create_portfolio_file, portfolio_suffix
+from transaction_loader import portfolio_reader
+
+_logger = getLogger(f'app.{__name__}')
+
+# Bytes of CSV lines parsed at a time, by one process.
+CHUNK_SIZE = 1024 * 1024
+
+FIELDS = ('id', 'date', 'pair', 'base', 'quote', 'side', 'price', 'total', 'quantity', 'fee', 'fee_symbol')
+
+# Column names of the trade history exports, per exchange.
+PRESETS = {
+    'coinbase': {
+        'id': 'trade id',
+        'date': 'created at',
+        'pair': 'product',
+        'side': 'side',
+        'price': 'price',
+        'quantity': 'size',
+        'fee': 'fee',
+        'fee_symbol': 'price/fee/total unit',
+    },
+    'binance': {
+        'date': 'Date(UTC)',
+        'pair': 'Market',
+        'side': 'Type',
+        'price': 'Price',
+        'quantity': 'Amount',
+        'total': 'Total',
+        'fee': 'Fee',
+        'fee_symbol': 'Fee Coin',
+    },
+    'kraken': {
+        'id': 'txid',
+        'date': 'time',
+        'pair': 'pair',
+        'side': 'type',
+        'price': 'price',
+        'quantity': 'vol',
+        'total': 'cost',
+        'fee': 'fee',
+    },
+    'generic': {field: field for field in FIELDS},
+}
+
+# Quote symbols of markets without a separator (BTCUSDT), longest first.
+QUOTE_SYMBOLS = sorted((
+    'USDT', 'BUSD', 'USDC', 'FDUSD', 'TUSD', 'DAI', 'EUR', 'GBP', 'USD', 'TRY', 'BRL', 'AUD', 'JPY',
+    'BTC', 'XBT', 'ETH', 'BNB',
+), key=len, reverse=True)
+
+# ISO 8601 in UTC, the format of most exports: 2021-03-04T12:34:56.789Z
+_UTC_DATE = re.compile(r'(\d{4}-\d\d-\d\d)[T ](\d\d:\d\d:\d\d)(?:\.\d+)?Z?')
+
+_json = json.JSONEncoder(default=str)
+_json_unicode = json.JSONEncoder(ensure_ascii=False)
+
+SYMBOL_ALIASES = {
+    'XBT': 'BTC',
+    'XDG': 'DOGE',
+}
+
+class CsvFormat():
+    # Maps the columns of a CSV header to the fields of a transaction.
+    name: str
+    columns: dict[str, str]
+    separator: str
+
+    def __init__(self, name: str, columns: dict[str, str], separator: str = '-'):
+        if name not in PRESETS:
+            raise ValueError(f'Unknown CSV format: {name}')
+        for field in columns:
+            if field not in FIELDS:
+                raise ValueError(f'Unknown CSV field: {field}')
+
+        self.name = name
+        self.columns = {**PRESETS[name], **columns}
+        self.separator = separator
+
+    def __repr__(self):
+        return f'CsvFormat[{self.name}]'
+
+    def indexes(self, header: list[str]) -> dict[str, int]:
+        names = {name.strip().lower(): index for index, name in enumerate(header)}
+
+        indexes = {}
+        for field, column in self.columns.items():
+            index = names.get(column.strip().lower())
+            if index is not None:
+                indexes[field] = index
+
+        missing = [field for field in ('date', 'side', 'price', 'quantity') if field not in indexes]
+        if 'pair' not in indexes and ('base' not in indexes or 'quote' not in indexes):
+            missing.append('pair')
+        if 'price' in missing and 'total' in indexes:
+            missing.remove('price')
+        if len(missing) > 0:
+            raise ValueError(f'Missing CSV columns for {self.name}: {", ".join(missing)}')
+        return indexes
+
+def _symbol(value: str) -> str:
+    symbol = value.strip().upper()
+    return SYMBOL_ALIASES.get(symbol, symbol)
+
+def split_market(market: str, separator: str = '-') -> tuple[str, str]:
+    # Returns base and quote of a market: BTC-EUR, BTC/EUR, BTCUSDT or XXBTZEUR.
+    market = market.strip().upper()
+    for sep in (separator, '/', '-', '_'):
+        if sep and sep in market:
+            base, quote = market.split(sep, 1)
+            return _symbol(base), _symbol(quote)
+
+    if len(market) == 8 and market[0] in 'XZ' and market[4] in 'XZ':
+        return _symbol(market[1:4]), _symbol(market[5:8])
+
+    for quote in QUOTE_SYMBOLS:
+        if market.endswith(quote) and len(market) > len(quote):
+            return _symbol(market[:-len(quote)]), _symbol(quote)
+
+    raise ValueError(f'Unknown market: {market}')
+
+def _date(value: str) -> str:
+    value = value.strip()
+    match = _UTC_DATE.fullmatch(value)
+    if match is not None:
+        return f'{match[1]} {match[2]}'
+    if len(value) == 10:
+        # Only a date.
+        return value
+
+    try:
+        dt = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    except ValueError:
+        return value
+
+    if dt.tzinfo is not None:
+        dt = dt.astimezone(timezone.utc).replace(tzinfo=None)
+    return dt.strftime('%Y-%m-%d %H:%M:%S')
+
+def yaml_flow(value) -> str:
+    # A value in YAML flow style, without the PyYAML emitter which is too slow
+    # for millions of transactions. Mostly JSON, which is valid YAML.
+    if isinstance(value, dict):
+        return '{' + ', '.join(f'{yaml_flow(key)}: {yaml_flow(item)}' for key, item in value.items()) + '}'
+    if isinstance(value, (list, tuple)):
+        return '[' + ', '.join(yaml_flow(item) for item in value) + ']'
+    if isinstance(value, datetime):
+        return value.isoformat(sep=' ')
+    if isinstance(value, date):
+        return value.isoformat()
+    if isinstance(value, float):
+        if value != value:
+            return '.nan'
+        if value in (float('inf'), float('-inf')):
+            return '.inf' if value > 0 else '-.inf'
+
+        # YAML 1.1 floats need a dot: 1e-05 would be a string.
+        text = repr(value)
+        if '.' not in text and 'e' in text:
+            text = text.replace('e', '.0e', 1)
+        return text
+    return _json_unicode.encode(value)
+
+def _number(value: str) -> float:
+    return float(value.strip().replace(',', ''))
+
+def map_row(fmt: CsvFormat, indexes: dict[str, int], row: list[str], markets: dict[str, tuple[str, str]]) -> tuple[str, str, dict]:
+    # Returns the trade id, the pair (QUOTE/BASE, sell/buy of a buy) and the transaction.
+    # Markets repeat, they are split once per chunk.
+    side = row[indexes['side']].strip().lower()
+    if side not in ('buy', 'sell'):
+        raise ValueError(f'Unknown side: {side}')
+
+    if 'pair' in indexes:
+        market = row[indexes['pair']]
+        if market not in markets:
+            markets[market] = split_market(market, fmt.separator)
+        base, quote = markets[market]
+    else:
+        base, quote = _symbol(row[indexes['base']]), _symbol(row[indexes['quote']])
+
+    quantity = abs(_number(row[indexes['quantity']]))
+    if 'price' in indexes and row[indexes['price']].strip() != '':
+        price = _number(row[indexes['price']])
+    elif quantity > 0.0:
+        price = abs(_number(row[indexes['total']])) / quantity
+    else:
+        raise ValueError('No price')
+
+    if 'id' in indexes:
+        trade_id = row[indexes['id']].strip()
+    else:
+        # Exports without trade ids: the same row gets the same id on every import,
+        # csv_chunks() tells identical rows of a file apart.
+        trade_id = sha1('\x1f'.join(row).encode('utf-8')).hexdigest()[:20]
+
+    transaction = {
+        'id': trade_id,
+        'date': _date(row[indexes['date']]),
+        'type': side,
+        'price': price,
+        'quantity': quantity,
+    }
+
+    if 'fee' in indexes and row[indexes['fee']].strip() != '':
+        fee = abs(_number(row[indexes['fee']]))
+        if fee > 0.0:
+            fee_symbol = quote
+            if 'fee_symbol' in indexes and row[indexes['fee_symbol']].strip() != '':
+                fee_symbol = _symbol(row[indexes['fee_symbol']])
+            transaction['fee'] = [fee, fee_symbol]
+
+    return trade_id, f'{quote}/{base}', transaction
+
+def parse_chunk(job: tuple[CsvFormat, list[str], bytes]) -> tuple[list[tuple[str, str, dict]], int]:
+    # Parses complete CSV lines. Returns the records and the number of skipped rows.
+    fmt, header, chunk = job
+    indexes = fmt.indexes(header)
+
+    records = []
+    skipped = 0
+    markets = {}
+    for row in csv.reader(io.StringIO(chunk.decode('utf-8-sig'))):
+        if len(row) == 0 or (len(row) == 1 and row[0].strip() == ''):
+            continue
+        try:
+            records.append(map_row(fmt, indexes, row, markets))
+        except (ValueError, IndexError, KeyError) as e:
+            _logger.debug(f'skip row: {e}: {row}')
+            skipped += 1
+    return records, skipped
+
+def _read_chunks(f: BinaryIO, size: int = CHUNK_SIZE):
+    # Yields blocks of whole lines. Rows must not contain line breaks,
+    # which holds for the exchange exports.
+    rest = b''
+    while True:
+        block = f.read(size)
+        if block == b'':
+            break
+
+        block = rest + block
+        end = block.rfind(b'\n')
+        if end < 0:
+            rest = block
+            continue
+        rest = block[end + 1:]
+        yield block[:end + 1]
+
+    if rest.strip() != b'':
+        yield rest
+
+def _parse_chunks(fmt: CsvFormat, header: list[str], chunks, jobs: int = 1):
+    # With more than one job, only a few chunks per process are read ahead.
+    if jobs == 1:
+        for chunk in chunks:
+            yield parse_chunk((fmt, header, chunk))
+        return
+
+    with ProcessPoolExecutor(max_workers=jobs) as executor:
+        pending = deque()
+        for chunk in chunks:
+            pending.append(executor.submit(parse_chunk, (fmt, header, chunk)))
+            if len(pending) >= jobs * 2:
+                yield pending.popleft().result()
+        while len(pending) > 0:
+            yield pending.popleft().result()
+
+def csv_chunks(fmt: CsvFormat, file: Path, jobs: int = 1):
+    # Yields the parsed chunks of a CSV file in file order.
+    with open_portfolio_file(file) as f:
+        header_line = f.readline().decode('utf-8-sig')
+        header = next(csv.reader([header_line]), [])
+        indexes = fmt.indexes(header)
+
+        parsed = _parse_chunks(fmt, header, _read_chunks(f), jobs)
+        if 'id' in indexes:
+            yield from parsed
+            return
+
+        # Identical rows without a trade id are separate fills. The n-th one
+        # in the file gets '-n' appended to its id, so they are all kept and
+        # importing the same file again still skips them.
+        occurrences = {}
+        for records, skipped in parsed:
+            for i, (trade_id, pair, transaction) in enumerate(records):
+                n = occurrences.get(trade_id, 0) + 1
+                occurrences[trade_id] = n
+                if n > 1:
+                    trade_id = f'{trade_id}-{n}'
+                    transaction['id'] = trade_id
+                    records[i] = (trade_id, pair, transaction)
+            yield records, skipped
+
+class _Spill():
+    # Transactions of one pair, kept in a temporary file until they are written.
+    meta: dict
+    count: int
+
+    def __init__(self, meta: dict):
+        self.meta = meta
+        self.count = 0
+        self.f = tempfile.TemporaryFile()
+
+    def add(self, transaction: dict):
+        # One pickle per transaction, a shared Pickler/Unpickler would remember all of them.
+        pickle.dump(transaction, self.f, protocol=pickle.HIGHEST_PROTOCOL)
+        self.count += 1
+
+    def transactions(self):
+        self.f.flush()
+        self.f.seek(0)
+        for _ in range(self.count):
+            yield pickle.load(self.f)
+
+    def close(self):
+        self.f.close()
+
+class _SourceOut():
+    meta: dict
+    pairs: list[_Spill]
+    by_pair: dict[str, _Spill]
+
+    def __init__(self, meta: dict):
+        self.meta = meta
+        self.pairs = []
+        self.by_pair = {}
+
+    def pair(self, name: str) -> _Spill:
+        if name not in self.by_pair:
+            spill = _Spill({'pair': name})
+            self.pairs.append(spill)
+            self.by_pair[name] = spill
+        return self.by_pair[name]
+
+class PortfolioWriter():
+    # Collects the transactions of one portfolio file: those already in the
+    # file first, then the imported ones which are not in it yet.
+    file: Path
+    meta: dict
+    sources: list[_SourceOut]
+    seen: set[str]
+    added: int
+    duplicates: int
+
+    def __init__(self, file: Path):
+        if portfolio_suffix(file) not in ('.json', '.yml'):
+            raise ValueError(f'Unsupported portfolio file: {file}')
+
+        self.file = file
+        self.meta = {}
+        self.sources = []
+        self.seen = set()
+        self.added = 0
+        self.duplicates = 0
+
+        if file.exists():
+            self._load()
+
+    def __repr__(self):
+        return f'PortfolioWriter[{self.file},a={self.added},d={self.duplicates}]'
+
+    def _load(self):
+        with open_portfolio_file(self.file) as f:
+            reader = portfolio_reader(self.file, f)
+            if not reader.is_map():
+                raise ValueError(f'No sources-field found in file: {self.file}')
+
+            for key in reader.map_keys():
+                if key == 'sources' and reader.is_list():
+                    for _ in reader.list_items():
+                        self._load_source(reader)
+                else:
+                    self.meta[key] = reader.value()
+
+    def _load_source(self, reader):
+        source = _SourceOut({})
+        self.sources.append(source)
+        for key in reader.map_keys():
+            if key == 'pairs' and reader.is_list():
+                for _ in reader.list_items():
+                    self._load_pair(reader, source)
+            else:
+                source.meta[key] = reader.value()
+
+    def _load_pair(self, reader, source: _SourceOut):
+        spill = _Spill({})
+        source.pairs.append(spill)
+        for key in reader.map_keys():
+            if key == 'transactions' and reader.is_list():
+                for _ in reader.list_items():
+                    transaction = reader.value()
+                    if 'id' in transaction:
+                        self.seen.add(str(transaction['id']))
+                    spill.add(transaction)
+            else:
+                spill.meta[key] = reader.value()
+
+        name = spill.meta.get('pair')
+        if name is not None and name not in source.by_pair:
+            source.by_pair[name] = spill
+
+    def source(self, name: str) -> _SourceOut:
+        for source in self.sources:
+            if source.meta.get('source') == name:
+                return source
+        source = _SourceOut({'source': name})
+        self.sources.append(source)
+        return source
+
+    def add(self, source: _SourceOut, trade_id: str, pair: str, transaction: dict) -> bool:
+        if trade_id in self.seen:
+            self.duplicates += 1
+            return False
+        self.seen.add(trade_id)
+
+        source.pair(pair).add(transaction)
+        self.added += 1
+        return True
+
+    def write(self):
+        self.file.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.file.with_name(f'.{self.file.name}.tmp')
+        with io.TextIOWrapper(create_portfolio_file(self.file, tmp_path), encoding='utf-8') as f:
+            if portfolio_suffix(self.file) == '.json':
+                self._write_json(f)
+            else:
+                self._write_yaml(f)
+        os.replace(tmp_path, self.file)
+
+    def close(self):
+        for source in self.sources:
+            for spill in source.pairs:
+                spill.close()
+
+    def _write_json(self, f):
+        # Same layout as transaction-example.json, one transaction per line.
+        def meta_lines(meta: dict, indent: str):
+            for key, value in meta.items():
+                f.write(f'{indent}{_json.encode(key)}: {_json.encode(value)},\n')
+
+        f.write('{\n')
+        meta_lines(self.meta, '    ')
+        f.write('    "sources": [')
+        for source_n, source in enumerate(self.sources):
+            f.write(',\n' if source_n > 0 else '\n')
+            f.write('        {\n')
+            meta_lines(source.meta, '            ')
+            f.write('            "pairs": [')
+            for pair_n, spill in enumerate(source.pairs):
+                f.write(',\n' if pair_n > 0 else '\n')
+                f.write('                {\n')
+                meta_lines(spill.meta, '                    ')
+                f.write('                    "transactions": [')
+                for transaction_n, transaction in enumerate(spill.transactions()):
+                    f.write(',\n' if transaction_n > 0 else '\n')
+                    f.write(f'                        {_json.encode(transaction)}')
+                f.write('\n                    ]\n                }')
+            f.write('\n            ]\n        }')
+        f.write('\n    ]\n}\n')
+
+    def _write_yaml(self, f):
+        import yaml
+
+        def meta_lines(meta: dict, first: str, indent: str):
+            for key, value in meta.items():
+                lines = yaml.safe_dump({key: value}, default_flow_style=False, sort_keys=False).splitlines()
+                for line in lines:
+                    f.write(f'{first}{line}\n')
+                    first = indent
+            return first
+
+        meta_lines(self.meta, '', '')
+        f.write('sources:\n')
+        for source in self.sources:
+            indent = meta_lines(source.meta, '- ', '  ')
+            f.write(f'{indent}pairs:\n')
+            for spill in source.pairs:
+                indent = meta_lines(spill.meta, '  - ', '    ')
+                f.write(f'{indent}transactions:\n')
+                for transaction in spill.transactions():
+                    f.write(f'    - {yaml_flow(transaction)}\n')
+
+def import_csv(fmt: CsvFormat, files: list[Path], writer: PortfolioWriter, source_name: str, jobs: int = 1) -> int:
+    # Returns the number of skipped rows.
+    if jobs == 0:
+        jobs = os.cpu_count() or 1
+
+    source = writer.source(source_name)
+    skipped = 0
+    for file in files:
+        _logger.debug(f'import: {file}')
+        for records, chunk_skipped in csv_chunks(fmt, file, jobs=jobs):
+            skipped += chunk_skipped
+            for trade_id, pair, transaction in records:
+                writer.add(source, trade_id, pair, transaction)
+    return skipped
+
+def _parse_columns(values: list[str]) -> dict[str, str]:
+    columns = {}
+    for value in values:
+        if '=' not in value:
+            raise ValueError(f'Invalid column mapping: {value} (expected FIELD=COLUMN)')
+        field, column = value.split('=', 1)
+        columns[field.strip()] = column
+    return columns
+
+def main():
+    parser = ArgumentParser(prog='importer', description='Import exchange CSV exports into portfolio files')
+    parser.add_argument('exchange', type=str, choices=list(PRESETS), help='CSV format')
+    parser.add_argument('csv_files', type=str, nargs='+', help='CSV files (also .gz/.zst)')
+    parser.add_argument('-o', '--output', type=str, required=True, help='Portfolio file (JSON/YAML), transactions are appended to an existing file')
+    parser.add_argument('-s', '--source', type=str, nargs='?', required=False, help='Name of the source (default: exchange)')
+    parser.add_argument('--column', type=str, action='append', required=False, help='Map a field to a CSV column, FIELD=COLUMN (fields: ' + ', '.join(FIELDS) + ')', default=[])
+    parser.add_argument('--separator', type=str, nargs='?', required=False, help='Separator of base and quote in the pair column', default='-')
+    parser.add_argument('-j', '--jobs', type=int, required=False, help='Number of processes to parse with (0 = all CPUs)', default=0)
+
+    args = parser.parse_args()
+
+    fmt = CsvFormat(args.exchange, _parse_columns(args.column), separator=args.separator)
+    writer = PortfolioWriter(Path(args.output))
+    try:
+        skipped = import_csv(fmt, [Path(file) for file in args.csv_files], writer, args.source or args.exchange, jobs=args.jobs)
+        if writer.added > 0 or not writer.file.exists():
+            writer.write()
+    finally:
+        writer.close()
+
+    print(f'-> imported: {writer.added} transactions, {writer.duplicates} duplicates, {skipped} skipped rows')
+    print(f'-> portfolio: {writer.file}')
+
+if __name__ == '__main__':
+    main()
@@ -1,8 +1,16 @@
 #!/usr/bin/env python3
 
+import os
 import json
 import yaml
 import sys
+from argparse import ArgumentParser
+from pathlib import Path
+from concurrent.futures import ProcessPoolExecutor
+from compiled import COMPILED_SUFFIX, compile_portfolio, load_compiled
+from portfolio_file import parse_portfolio_file
+
+COMMANDS = ('yaml', 'compile', 'decompile')
 
 def json_to_yaml(json_file_path: str, yaml_file_path: str):
     # Read the JSON file
@@ -13,15 +21,97 @@ def json_to_yaml(json_file_path: str, yaml_file_path: str):
     with open(yaml_file_path, 'w') as yaml_file:
         yaml.dump(json_data, yaml_file, default_flow_style=False, sort_keys=False)
 
-if __name__ == '__main__':
-    if len(sys.argv) != 3:
-        print('Usage: python json2yml.py <input_json_file> <output_yaml_file>')
-        sys.exit(1)
+def compile_file(src_path: Path, dst_path: Path):
+    raw_data = parse_portfolio_file(src_path)
+    dst_path.write_bytes(compile_portfolio(raw_data))
+
+def decompile_file(src_path: Path, dst_path: Path):
+    raw_data = load_compiled(src_path)
+
+    with open(dst_path, 'w') as f:
+        if dst_path.suffix == '.json':
+            json.dump(raw_data, f, indent=4)
+        else:
+            yaml.dump(raw_data, f, default_flow_style=False, sort_keys=False)
+
+def _convert_file(job: tuple[str, Path, Path]) -> Path:
+    command, src_path, dst_path = job
+
+    dst_path.parent.mkdir(parents=True, exist_ok=True)
+    if command == 'compile':
+        compile_file(src_path, dst_path)
+    else:
+        decompile_file(src_path, dst_path)
+
+    return dst_path
+
+def convert_tree(command: str, src_dir: Path, dst_dir: Path, dst_suffix: str, jobs: int = 1) -> list[Path]:
+    if command == 'compile':
+        src_suffixes = ('.json', '.yml')
+    else:
+        src_suffixes = (COMPILED_SUFFIX,)
+
+    convert_jobs = []
+    dst_paths = {}
+    for src_path in sorted(src_dir.rglob('*')):
+        if not src_path.is_file() or src_path.suffix not in src_suffixes:
+            continue
+
+        dst_path = (dst_dir / src_path.relative_to(src_dir)).with_suffix(dst_suffix)
+        if dst_path in dst_paths:
+            # a.json and a.yml would both be written to a.bpc.
+            raise ValueError(f'{src_path} and {dst_paths[dst_path]} are both converted to {dst_path}')
+        dst_paths[dst_path] = src_path
+        convert_jobs.append((command, src_path, dst_path))
+
+    if jobs == 0:
+        jobs = os.cpu_count() or 1
 
-    json_file_path = sys.argv[1]
-    yaml_file_path = sys.argv[2]
+    if jobs == 1:
+        return [_convert_file(job) for job in convert_jobs]
 
-    json_to_yaml(json_file_path, yaml_file_path)
-    print(f'-> json: {json_file_path}')
-    print(f'-> yaml: {yaml_file_path}')
+    chunksize = max(1, len(convert_jobs) // (jobs * 4))
+    with ProcessPoolExecutor(max_workers=jobs) as executor:
+        return list(executor.map(_convert_file, convert_jobs, chunksize=chunksize))
 
+def main():
+    parser = ArgumentParser(prog='json2yml', description='Convert portfolio files')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    yaml_parser = subparsers.add_parser('yaml', help='Convert one JSON file to YAML')
+    yaml_parser.add_argument('json_file', type=str, help='Input JSON file')
+    yaml_parser.add_argument('yaml_file', type=str, help='Output YAML file')
+
+    compile_parser = subparsers.add_parser('compile', help=f'Compile a portfolio tree (JSON/YAML) to {COMPILED_SUFFIX} files')
+    compile_parser.add_argument('src_dir', type=str, help='Portfolio directory')
+    compile_parser.add_argument('dst_dir', type=str, help='Output directory')
+    compile_parser.add_argument('-j', '--jobs', type=int, required=False, help='Number of processes (0 = all CPUs)', default=0)
+
+    decompile_parser = subparsers.add_parser('decompile', help=f'Convert a tree of {COMPILED_SUFFIX} files back to YAML/JSON')
+    decompile_parser.add_argument('src_dir', type=str, help='Compiled portfolio directory')
+    decompile_parser.add_argument('dst_dir', type=str, help='Output directory')
+    decompile_parser.add_argument('-f', '--format', type=str, choices=['yml', 'json'], required=False, help='Output format', default='yml')
+    decompile_parser.add_argument('-j', '--jobs', type=int, required=False, help='Number of processes (0 = all CPUs)', default=0)
+
+    argv = sys.argv[1:]
+    if len(argv) == 2 and argv[0] not in COMMANDS:
+        # Old usage: json2yml.py <input_json_file> <output_yaml_file>
+        argv = ['yaml'] + argv
+
+    args = parser.parse_args(argv)
+
+    if args.command == 'yaml':
+        json_to_yaml(args.json_file, args.yaml_file)
+        print(f'-> json: {args.json_file}')
+        print(f'-> yaml: {args.yaml_file}')
+
+    elif args.command == 'compile':
+        dst_paths = convert_tree('compile', Path(args.src_dir), Path(args.dst_dir), COMPILED_SUFFIX, args.jobs)
+        print(f'-> compiled {len(dst_paths)} files: {args.dst_dir}')
+
+    elif args.command == 'decompile':
+        dst_paths = convert_tree('decompile', Path(args.src_dir), Path(args.dst_dir), f'.{args.format}', args.jobs)
+        print(f'-> decompiled {len(dst_paths)} files: {args.dst_dir}')
+
+if __name__ == '__main__':
+    main()
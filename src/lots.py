@@ -0,0 +1,284 @@
+
+from collections import deque
+from logging import getLogger
+from helper import sort_transactions
+from transaction import Transaction
+
+_logger = getLogger(f'app.{__name__}')
+
+LOT_METHODS = ('fifo', 'lifo', 'average')
+
+# Remainders of a lot below this quantity are rounding errors, the lot is used up.
+EPSILON = 1e-12
+
+class LotBook():
+    # Lots of one symbol, the cost of a lot is in convert.
+    symbol: str
+    method: str
+    lots: deque
+    quantity: float
+    cost: float
+    realized: float
+    unmatched: float
+
+    def __init__(self, symbol: str, method: str):
+        if method not in LOT_METHODS:
+            raise ValueError(f'Unknown lot method: {method}')
+
+        self.symbol = symbol
+        self.method = method
+        # [quantity, cost] per lot, oldest first. Average cost needs only the totals.
+        self.lots = deque()
+        self.quantity = 0.0
+        self.cost = 0.0
+        self.realized = 0.0
+        self.unmatched = 0.0
+
+    def __repr__(self):
+        return f'LotBook[s={self.symbol},m={self.method},q={self.quantity},c={self.cost},r={self.realized},l={len(self.lots)}]'
+
+    def acquire(self, quantity: float, cost: float):
+        self.quantity += quantity
+        self.cost += cost
+        if self.method != 'average':
+            self.lots.append([quantity, cost])
+
+    def dispose(self, quantity: float) -> float:
+        # Removes quantity from the lots and returns its cost.
+        return sum(part[1] for part in self.remove(quantity))
+
+    def remove(self, quantity: float) -> list[list[float]]:
+        # Removes quantity from the lots and returns the removed [quantity, cost]
+        # parts. What is removed beyond the lots held has no cost.
+        if quantity > self.quantity:
+            self.unmatched += quantity - self.quantity
+            quantity = self.quantity
+        if quantity <= 0.0:
+            return []
+
+        if self.method == 'average':
+            parts = [[quantity, self.cost * quantity / self.quantity]]
+        else:
+            parts = self._take(quantity)
+
+        self.quantity -= quantity
+        self.cost -= sum(part[1] for part in parts)
+        if self.quantity < EPSILON:
+            self.quantity = 0.0
+            self.cost = 0.0
+            self.lots.clear()
+        return parts
+
+    def _take(self, quantity: float) -> list[list[float]]:
+        parts = []
+        fifo = self.method == 'fifo'
+        while quantity > EPSILON and len(self.lots) > 0:
+            lot = self.lots[0] if fifo else self.lots[-1]
+            if lot[0] <= quantity + EPSILON:
+                if fifo:
+                    self.lots.popleft()
+                else:
+                    self.lots.pop()
+                quantity -= lot[0]
+                parts.append(lot)
+            else:
+                part = lot[1] * quantity / lot[0]
+                lot[0] -= quantity
+                lot[1] -= part
+                parts.append([quantity, part])
+                quantity = 0.0
+        return parts
+
+    def sell(self, quantity: float, proceeds: float) -> float:
+        cost = self.dispose(quantity)
+        realized = proceeds - cost
+        self.realized += realized
+        return realized
+
+class LotEngine():
+    # Matches the transactions of a portfolio tree against lots, per
+    # portfolio and symbol, in date order over the whole tree.
+    #
+    # A trade against convert opens a lot (buying) or realizes profit
+    # (selling). A trade between two other symbols carries the cost of the
+    # given lots over to the received symbol, without realizing anything.
+    # Transfers with a price open lots at that price (in) or realize at
+    # that price (out). Transfers without a price move lots: an out puts
+    # them in transit, a later in of the same symbol (in any portfolio of
+    # the tree) takes them over with their cost, or opens a lot at no cost.
+    method: str
+    convert: str
+    books: dict[object, dict[str, LotBook]]
+    transit: dict[str, deque]
+    portfolios: list
+
+    def __init__(self, method: str, convert: str):
+        if method not in LOT_METHODS:
+            raise ValueError(f'Unknown lot method: {method}')
+
+        self.method = method
+        self.convert = convert
+        self.books = {}
+        self.transit = {}
+        # The own transactions of these portfolios are matched again on a replay.
+        self.portfolios = []
+        self._last_key = None
+        self._stale = False
+
+    def __repr__(self):
+        return f'LotEngine[m={self.method},p={len(self.portfolios)},b={len(self.books)}]'
+
+    def add_portfolio(self, portfolio):
+        self.portfolios.append(portfolio)
+        if len(portfolio.own_transactions) > 0:
+            self._stale = True
+
+    def remove_portfolio(self, portfolio):
+        self.portfolios.remove(portfolio)
+        self.books.pop(portfolio, None)
+        self._stale = True
+
+    def book(self, portfolio, symbol: str) -> LotBook:
+        if self._stale:
+            self._replay()
+        return self._book(portfolio, symbol)
+
+    def _book(self, portfolio, symbol: str) -> LotBook:
+        books = self.books.get(portfolio)
+        if books is None:
+            books = self.books[portfolio] = {}
+        if symbol not in books:
+            books[symbol] = LotBook(symbol, self.method)
+        return books[symbol]
+
+    def realized(self, portfolio, symbol: str) -> float:
+        if self._stale:
+            self._replay()
+        book = self.books.get(portfolio, {}).get(symbol)
+        if book is None:
+            return 0.0
+        return book.realized
+
+    def unmatched(self, portfolio, symbol: str) -> float:
+        if self._stale:
+            self._replay()
+        book = self.books.get(portfolio, {}).get(symbol)
+        if book is None:
+            return 0.0
+        return book.unmatched
+
+    def cost(self, portfolio, symbol: str) -> float:
+        if self._stale:
+            self._replay()
+        book = self.books.get(portfolio, {}).get(symbol)
+        if book is None:
+            return 0.0
+        return book.cost
+
+    def add_transaction(self, portfolio, transaction: Transaction):
+        # Lots are matched in date order. A transaction older than the last one
+        # makes the books stale, they are rebuilt once on the next read.
+        if self._stale:
+            return
+        key = _sort_key(transaction)
+        if self._last_key is not None and key < self._last_key:
+            self._stale = True
+            return
+
+        self._last_key = key
+        self._apply(portfolio, transaction)
+
+    def _replay(self):
+        transactions = []
+        for portfolio in self.portfolios:
+            for transaction in portfolio.own_transactions:
+                transactions.append((_sort_key(transaction), len(transactions), portfolio, transaction))
+        transactions.sort(key=lambda item: item[:2])
+        _logger.debug(f'replay {len(transactions)} transactions')
+
+        self.books = {}
+        self.transit = {}
+        self._stale = False
+        self._last_key = None
+        for key, _, portfolio, transaction in transactions:
+            self._last_key = key
+            self._apply(portfolio, transaction)
+
+    def _apply(self, portfolio, transaction: Transaction):
+        fee = 0.0
+        if transaction.fee_symbol == self.convert:
+            fee = transaction.fee_quantity
+
+        # Quantities are taken from the transaction, without creating its Pair or Spot.
+        if transaction.is_pair:
+            sell_symbol = transaction.sell_symbol
+            buy_symbol = transaction.buy_symbol
+            if transaction.ttype == 'buy':
+                self._trade(portfolio, sell_symbol, transaction.sell_quantity, buy_symbol, transaction.quantity, fee)
+            elif transaction.ttype == 'sell':
+                self._trade(portfolio, buy_symbol, transaction.quantity, sell_symbol, transaction.sell_quantity, fee)
+            else:
+                raise ValueError(f'Unknown Transaction type: {transaction.ttype}')
+        else:
+            if transaction.ttype == 'in':
+                self._transfer_in(portfolio, transaction.pair_s, transaction.quantity, transaction.price)
+            elif transaction.ttype == 'out':
+                self._transfer_out(portfolio, transaction.pair_s, transaction.quantity, transaction.price)
+            else:
+                raise ValueError(f'Unknown Transaction type: {transaction.ttype}')
+
+    def _trade(self, portfolio, given: str, given_q: float, received: str, received_q: float, fee: float):
+        if given == received:
+            return
+
+        if given == self.convert:
+            self._book(portfolio, received).acquire(received_q, given_q + fee)
+        elif received == self.convert:
+            self._book(portfolio, given).sell(given_q, received_q - fee)
+        else:
+            cost = self._book(portfolio, given).dispose(given_q)
+            self._book(portfolio, received).acquire(received_q, cost + fee)
+
+    def _transfer_in(self, portfolio, symbol: str, quantity: float, price: float|None):
+        if symbol == self.convert:
+            return
+
+        book = self._book(portfolio, symbol)
+        if price is not None:
+            book.acquire(quantity, quantity * price)
+            return
+
+        transit = self.transit.get(symbol)
+        while quantity > EPSILON and transit:
+            part = transit[0]
+            if part[0] <= quantity + EPSILON:
+                transit.popleft()
+                book.acquire(part[0], part[1])
+                quantity -= part[0]
+            else:
+                cost = part[1] * quantity / part[0]
+                part[0] -= quantity
+                part[1] -= cost
+                book.acquire(quantity, cost)
+                quantity = 0.0
+
+        if quantity > EPSILON:
+            book.acquire(quantity, 0.0)
+
+    def _transfer_out(self, portfolio, symbol: str, quantity: float, price: float|None):
+        if symbol == self.convert:
+            return
+
+        book = self._book(portfolio, symbol)
+        if price is not None:
+            book.sell(quantity, quantity * price)
+            return
+
+        # Moved, not disposed of: the lots keep their cost for the next in.
+        parts = book.remove(quantity)
+        if len(parts) > 0:
+            self.transit.setdefault(symbol, deque()).extend(parts)
+
+def _sort_key(transaction: Transaction) -> tuple:
+    # On the same date, transfers out come before the transfers in which take their lots over.
+    return (sort_transactions(transaction), transaction.ttype == 'in' and transaction.price is None)
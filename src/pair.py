@@ -2,10 +2,12 @@
 from spot import Spot
 
 class Pair():
+    __slots__ = ('name', 'sell_spot', 'buy_spot', '_transactions', 'trx_count', 'value', 'profit')
+
     name: str
     sell_spot: Spot
     buy_spot: Spot
-    transactions: list
+    trx_count: int
 
     value: float|None
     profit: float|None
@@ -14,7 +16,8 @@ class Pair():
         self.name = name
         self.sell_spot = None
         self.buy_spot = None
-        self.transactions = []
+        self._transactions = None
+        self.trx_count = 0
 
         self.value = None
         self.profit = None
@@ -31,6 +34,13 @@ class Pair():
             'profit': self.profit,
         }
 
+    @property
+    def transactions(self) -> list:
+        # The pairs of single transactions don't need a list.
+        if self._transactions is None:
+            self._transactions = []
+        return self._transactions
+
     def _init_pair(self, pair: 'Pair'):
         if self.sell_spot is None:
             self.sell_spot = Spot(s=pair.sell)
@@ -41,14 +51,24 @@ class Pair():
     def add_buy(self, pair: 'Pair'):
         self._init_pair(pair)
 
-        self.sell_spot.add_spot(pair.sell_spot)
-        self.buy_spot.add_spot(pair.buy_spot)
+        self.add_quantities(pair.sell_spot.quantity, pair.buy_spot.quantity)
 
     def add_sell(self, pair: 'Pair'):
         self._init_pair(pair)
 
-        self.sell_spot.sub_spot(pair.sell_spot)
-        self.buy_spot.sub_spot(pair.buy_spot)
+        self.sub_quantities(pair.sell_spot.quantity, pair.buy_spot.quantity)
+
+    def add_quantities(self, sell_q: float, buy_q: float):
+        self.sell_spot.quantity += sell_q
+        self.buy_spot.quantity += buy_q
+
+    def sub_quantities(self, sell_q: float, buy_q: float):
+        self.sell_spot.quantity -= sell_q
+        self.buy_spot.quantity -= buy_q
+
+    def add_trx_count(self, c: int = 1):
+        self.trx_count += c
 
     def add_transaction(self, transaction):
         self.transactions.append(transaction)
+        self.trx_count += 1
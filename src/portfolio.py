@@ -1,5 +1,5 @@
 
-from logging import getLogger
+from logging import getLogger, DEBUG
 from typing import cast
 from apptypes import ConvertSymbols
 from json_helper import ComplexEncoder
@@ -9,7 +9,9 @@ from holding import Holding
 from pair import Pair
 from transaction import Transaction
 from quotes import Quotes
+from lots import LotEngine
 from helper import sort_holdings, sort_transactions
+from profiling import Profiler
 
 _logger = getLogger(f'app.{__name__}')
 
@@ -21,15 +23,22 @@ class Portfolio():
     sell_symbols: set
     buy_symbols: set
     fees: dict[str, Spot]
-    transactions: list[Transaction]
+    own_transactions: list[Transaction]
+    own_pairs: dict[str, Pair]
+    own_spots: dict[str, Spot]
+    own_fees: dict[str, Spot]
     transactions_c: int
     subs: list['Portfolio']
     pairs: dict[str, Pair]
     spots: dict[str, Spot]
     holdings: dict[str, Holding]
+    symbol_pairs: dict[str, list[Pair]]
     costs: Spot|None
+    lots: LotEngine|None
+    realized: float|None
+    unrealized: float|None
 
-    def __init__(self, name: str, parent: 'Portfolio' = None):
+    def __init__(self, name: str, parent: 'Portfolio' = None, lots: LotEngine|None = None):
         self.name = name
         if parent is not None:
             self.level = parent.level + 1
@@ -41,13 +50,26 @@ class Portfolio():
         self.buy_symbols = set()
         self.fees = {}
         self.fee_value = 0.0
-        self.transactions = []
+        self.own_transactions = []
+        self.own_pairs = {}
+        self.own_spots = {}
+        self.own_fees = {}
+        self.own_sell_symbols = set()
+        self.own_buy_symbols = set()
         self.transactions_c = 0
         self.subs = []
+        self._sub_marks = []
         self.pairs = {}
         self.spots = {}
         self.holdings = {}
+        self.symbol_pairs = {}
         self.costs = None
+        self.lots = lots
+        self.realized = None
+        self.unrealized = None
+
+        if lots is not None:
+            lots.add_portfolio(self)
 
     def to_json(self):
         return {
@@ -57,57 +79,73 @@ class Portfolio():
             'fees': self.fees,
             'fee_value': self.fee_value,
             'spots': self.spots,
+            'realized': self.realized,
+            'unrealized': self.unrealized,
         }
 
+    @property
+    def transactions(self) -> list[Transaction]:
+        return list(self.iter_transactions())
+
+    def iter_transactions(self):
+        # Same order as the transactions were added, including sub portfolios.
+        pos = 0
+        for mark, sub_portfolio in zip(self._sub_marks, self.subs):
+            yield from self.own_transactions[pos:mark]
+            yield from sub_portfolio.iter_transactions()
+            pos = mark
+        yield from self.own_transactions[pos:]
+
     def add_portfolio(self, portfolio: 'Portfolio'):
         self.subs.append(portfolio)
+        self._sub_marks.append(len(self.own_transactions))
 
     def add_transaction(self, transaction: Transaction):
         _logger.debug(f'add_transaction({self.name})')
 
-        if self.parent is not None:
-            self.parent.add_transaction(transaction)
+        self.own_transactions.append(transaction)
 
-        self.transactions.append(transaction)
-        self.transactions_c += 1
-
-        if transaction.fee is not None:
-            self.add_fee(transaction.fee)
+        # The quantities are taken from the transaction directly, its Pair
+        # and Spot objects are only created when they are valued.
+        if transaction.fee_symbol is not None:
+            self._add_fee(transaction.fee_symbol, transaction.fee_quantity)
 
         if transaction.is_pair:
-            ppair = self.add_pair(transaction.pair, transaction.ttype)
+            ppair = self._get_own_pair(transaction.pair_s, transaction.sell_symbol, transaction.buy_symbol)
+            if transaction.ttype == 'buy':
+                ppair.add_quantities(transaction.sell_quantity, transaction.quantity)
+            elif transaction.ttype == 'sell':
+                ppair.sub_quantities(transaction.sell_quantity, transaction.quantity)
+            else:
+                raise ValueError(f'Unknown Transaction type: {transaction.ttype}')
             ppair.add_transaction(transaction)
 
-            self.sell_symbols.add(transaction.sell_symbol)
-            self.buy_symbols.add(transaction.buy_symbol)
+            self.own_sell_symbols.add(transaction.sell_symbol)
+            self.own_buy_symbols.add(transaction.buy_symbol)
         else:
-            if transaction.spot.symbol in self.spots:
-                spot = self.spots[transaction.spot.symbol]
+            if transaction.pair_s in self.own_spots:
+                spot = self.own_spots[transaction.pair_s]
             else:
-                spot = Spot(s=transaction.spot.symbol)
-                self.spots[transaction.spot.symbol] = spot
+                spot = Spot(s=transaction.pair_s)
+                self.own_spots[transaction.pair_s] = spot
 
             spot.add_trx_count()
             spot.transactions.append(transaction)
 
             if transaction.ttype == 'in':
-                spot.add_spot(transaction.spot)
+                spot.quantity += transaction.quantity
             elif transaction.ttype == 'out':
-                spot.sub_spot(transaction.spot)
+                spot.quantity -= transaction.quantity
             else:
                 raise ValueError(f'Unknown Transaction type: {transaction.ttype}')
 
+        if self.lots is not None:
+            self.lots.add_transaction(self, transaction)
+
     def add_pair(self, tpair: Pair, ttype: str) -> Pair:
         _logger.debug(f'add_pair({self.name},{tpair},{ttype})')
 
-        if tpair.name in self.pairs:
-            ppair = self.pairs[tpair.name]
-        else:
-            ppair = Pair(tpair.name)
-            ppair.sell_spot = Spot(tpair.sell_spot.symbol)
-            ppair.buy_spot = Spot(tpair.buy_spot.symbol)
-
-            self.pairs[ppair.name] = ppair
+        ppair = self._get_own_pair(tpair.name, tpair.sell_spot.symbol, tpair.buy_spot.symbol)
 
         if ttype == 'buy':
             ppair.add_buy(tpair)
@@ -118,90 +156,172 @@ class Portfolio():
 
         return ppair
 
+    def _get_own_pair(self, name: str, sell_symbol: str, buy_symbol: str) -> Pair:
+        if name in self.own_pairs:
+            return self.own_pairs[name]
+
+        ppair = Pair(name)
+        ppair.sell_spot = Spot(sell_symbol)
+        ppair.buy_spot = Spot(buy_symbol)
+        self.own_pairs[name] = ppair
+        return ppair
+
     def add_fee(self, fee: Spot):
-        if fee.symbol in self.fees:
-            pfee = self.fees[fee.symbol]
+        self._add_fee(fee.symbol, fee.quantity)
+
+    def _add_fee(self, symbol: str, quantity: float):
+        if symbol in self.own_fees:
+            pfee = self.own_fees[symbol]
         else:
-            pfee = Spot(s=fee.symbol)
-            self.fees[fee.symbol] = pfee
+            pfee = Spot(s=symbol)
+            self.own_fees[symbol] = pfee
 
-        pfee.add_spot(fee)
+        pfee.quantity += quantity
 
-    def calc(self):
+    @property
+    def path(self) -> str:
+        if self.parent is None:
+            return self.name
+        return f'{self.parent.path}/{self.name}'
+
+    def calc(self, profiler: Profiler|None = None):
         _logger.debug(f'calc({self.name})')
 
         for sub_portfolio in self.subs:
-            sub_portfolio.calc()
+            sub_portfolio.calc(profiler)
+
+        if profiler is None:
+            self.calc_node()
+        else:
+            with profiler.node(self.path, 'calc'):
+                self.calc_node()
+
+    def calc_node(self):
+        # Expects the sub portfolios to be calculated already.
+        self._calc_aggregates()
+        self._calc_holdings()
+
+    def _calc_aggregates(self):
+        # Roll up the aggregates of the sub portfolios instead of keeping
+        # a copy of every transaction in every ancestor.
+        self.transactions_c = len(self.own_transactions)
+        self.sell_symbols = set(self.own_sell_symbols)
+        self.buy_symbols = set(self.own_buy_symbols)
+
+        if len(self.subs) == 0:
+            self.pairs = self.own_pairs
+            self.spots = self.own_spots
+            self.fees = self.own_fees
+            return
 
+        self.pairs = {}
+        self.spots = {}
+        self.fees = {}
+        self._merge_aggregates(self.own_pairs, self.own_spots, self.own_fees)
+
+        for sub_portfolio in self.subs:
+            self.transactions_c += sub_portfolio.transactions_c
+            self.sell_symbols |= sub_portfolio.sell_symbols
+            self.buy_symbols |= sub_portfolio.buy_symbols
+            self._merge_aggregates(sub_portfolio.pairs, sub_portfolio.spots, sub_portfolio.fees)
+
+    def _merge_aggregates(self, pairs: dict[str, Pair], spots: dict[str, Spot], fees: dict[str, Spot]):
+        for pair_id, pair in pairs.items():
+            if pair_id in self.pairs:
+                ppair = self.pairs[pair_id]
+            else:
+                ppair = Pair(pair_id)
+                ppair.sell_spot = Spot(pair.sell_spot.symbol)
+                ppair.buy_spot = Spot(pair.buy_spot.symbol)
+                self.pairs[pair_id] = ppair
+
+            ppair.add_buy(pair)
+            ppair.add_trx_count(pair.trx_count)
+
+        for ssym, spot in spots.items():
+            if ssym not in self.spots:
+                self.spots[ssym] = Spot(s=spot.symbol)
+
+            self.spots[ssym].add_spot(spot)
+            self.spots[ssym].add_trx_count(spot.trx_count)
+
+        for fee_id, fee in fees.items():
+            if fee_id not in self.fees:
+                self.fees[fee_id] = Spot(s=fee.symbol)
+
+            self.fees[fee_id].add_spot(fee)
+
+    def _calc_holdings(self):
         self.holdings = {}
+        self.symbol_pairs = {}
+
+        # One pass over pairs and spots, every holding gets its quantities
+        # in the same order as the pairs and spots are stored.
         for pair_id, pair in self.pairs.items():
-            trx_count = len(pair.transactions)
+            sell_symbol = pair.sell_spot.symbol
+            buy_symbol = pair.buy_spot.symbol
 
-            if pair.sell_spot.symbol not in self.holdings:
-                self.holdings[pair.sell_spot.symbol] = Holding(pair.sell_spot.symbol)
+            sell_holding = self._get_holding(sell_symbol)
+            sell_holding.add_trx_count(pair.trx_count)
+            sell_holding.sub_spot(pair.sell_spot)
+            self.symbol_pairs.setdefault(sell_symbol, []).append(pair)
 
-            self.holdings[pair.sell_spot.symbol].add_trx_count(trx_count)
-            self.holdings[pair.sell_spot.symbol].transactions.extend(pair.transactions)
+            buy_holding = self._get_holding(buy_symbol)
+            buy_holding.add_trx_count(pair.trx_count)
+            if buy_symbol != sell_symbol:
+                buy_holding.add_spot(pair.buy_spot)
+                self.symbol_pairs.setdefault(buy_symbol, []).append(pair)
 
-            if pair.buy_spot.symbol not in self.holdings:
-                self.holdings[pair.buy_spot.symbol] = Holding(pair.buy_spot.symbol)
+        for sym, spot in self.spots.items():
+            holding = self._get_holding(spot.symbol)
+            holding.add_trx_count(spot.trx_count)
+            holding.add_spot(spot)
 
-            self.holdings[pair.buy_spot.symbol].add_trx_count(trx_count)
+        # Only the own transactions, the profit of the sub portfolios is
+        # rolled up in _quotes_holdings().
+        for pair_id, pair in self.own_pairs.items():
+            self.holdings[pair.sell_spot.symbol].transactions.extend(pair.transactions)
             self.holdings[pair.buy_spot.symbol].transactions.extend(pair.transactions)
 
-        for sym, spot in self.spots.items():
-            if spot.symbol not in self.holdings:
-                self.holdings[spot.symbol] = Holding(spot.symbol)
-
-            self.holdings[spot.symbol].add_trx_count(spot.trx_count)
+        for sym, spot in self.own_spots.items():
             self.holdings[spot.symbol].transactions.extend(spot.transactions)
 
         # TODO
         #for fee_id, fee in self.fees.items():
 
-        for hsym, holding in self.holdings.items():
-
-            for pair_id, pair in self.pairs.items():
-
-                if holding.symbol == pair.sell_spot.symbol:
-                    holding.sub_spot(pair.sell_spot)
-
-                elif holding.symbol == pair.buy_spot.symbol:
-                    holding.add_spot(pair.buy_spot)
-
-            for ssym, spot in self.spots.items():
-                if holding.symbol == spot.symbol:
-                    holding.add_spot(spot)
+    def _get_holding(self, symbol: str) -> Holding:
+        if symbol not in self.holdings:
+            self.holdings[symbol] = Holding(symbol)
+        return self.holdings[symbol]
 
     def get_convert_symbols(self, convert: str) -> ConvertSymbols:
         symbols = {}
 
         def add(sym: str, val: str):
             if sym not in symbols:
-                symbols[sym] = []
-            if val not in symbols[sym]:
-                symbols[sym].append(val)
-
-        # Pairs
-        for pair_id, pair in self.pairs.items():
-            if pair.sell_spot.symbol != convert and pair.buy_spot.symbol != convert:
-                add(pair.sell_spot.symbol, pair.buy_spot.symbol)
-
-            elif pair.sell_spot.symbol == convert:
-                add(pair.sell_spot.symbol, pair.buy_spot.symbol)
-
-            elif pair.buy_spot.symbol == convert:
-                add(pair.buy_spot.symbol, pair.sell_spot.symbol)
+                symbols[sym] = {}
+            symbols[sym][val] = None
+
+        # Pairs, from the symbol map of calc(). A pair is listed under both
+        # of its symbols, it is taken once under its sell symbol.
+        for sym, pairs in self.symbol_pairs.items():
+            for pair in pairs:
+                if pair.sell_spot.symbol != sym:
+                    continue
+                if pair.buy_spot.symbol == convert and sym != convert:
+                    add(convert, sym)
+                else:
+                    add(sym, pair.buy_spot.symbol)
 
-        # Spots
-        for ssym, spot in self.spots.items():
-            add(convert, spot.symbol)
+        # Spots, keyed by their symbol
+        for ssym in self.spots:
+            add(convert, ssym)
 
         # Holdings
-        for hsym, holding in self.holdings.items():
-            if holding.symbol == convert:
+        for hsym in self.holdings:
+            if hsym == convert:
                 continue
-            add(convert, holding.symbol)
+            add(convert, hsym)
 
         # Fees
         for fee_id, fee in self.fees.items():
@@ -209,21 +329,52 @@ class Portfolio():
                 continue
             add(convert, fee.symbol)
 
-        return symbols
+        return {sym: list(vals) for sym, vals in symbols.items()}
+
+    def quotes(self, quotes: Quotes, convert: str, engine: str = 'python', detail: bool = True, profiler: Profiler|None = None):
+        if engine == 'numpy':
+            from valuation import valuate_transactions
+
+            # All transactions of the tree are valued at once.
+            if profiler is None:
+                valuate_transactions(self.transactions, quotes, convert, detail)
+            else:
+                with profiler.node(self.path, 'valuate'):
+                    valuate_transactions(self.transactions, quotes, convert, detail)
+            engine = None
+
+        self._quotes_tree(quotes, convert, engine, detail, profiler)
 
-    def quotes(self, quotes: Quotes, convert: str):
+    def _quotes_tree(self, quotes: Quotes, convert: str, engine: str|None, detail: bool, profiler: Profiler|None = None):
         for sub_portfolio in self.subs:
             _logger.debug(f'quotes({sub_portfolio.name})')
-            sub_portfolio.quotes(quotes, convert)
+            sub_portfolio._quotes_tree(quotes, convert, engine, detail, profiler)
+
+        if profiler is None:
+            self.quotes_node(quotes, convert, engine, detail)
+        else:
+            with profiler.node(self.path, 'quotes'):
+                self.quotes_node(quotes, convert, engine, detail)
+
+    def quotes_node(self, quotes: Quotes, convert: str, engine: str|None = 'python', detail: bool = True):
+        # Expects the sub portfolios to be quoted already. With engine None
+        # the own transactions are not valued again.
+        if engine == 'python':
+            self._quotes_transactions(quotes, convert)
+        elif engine == 'numpy':
+            from valuation import valuate_transactions
+
+            valuate_transactions(self.own_transactions, quotes, convert, detail)
+        elif engine is not None:
+            raise ValueError(f'Unknown valuation engine: {engine}')
 
-        self._quotes_transactions(quotes, convert)
         self._quotes_holdings(quotes, convert)
         self._quotes_fees(quotes, convert)
 
     def _quotes_transactions(self, quotes: Quotes, convert: str):
         _logger.debug(f'quotes_transactions({self.name})')
 
-        transactions = cast(list[Transaction], sorted(self.transactions, key=sort_transactions))
+        transactions = cast(list[Transaction], sorted(self.own_transactions, key=sort_transactions))
         for transaction in transactions:
 
             if transaction.is_pair:
@@ -326,6 +477,7 @@ class Portfolio():
         _logger.debug(f'quotes_holdings({self.name})')
 
         # Holdings
+        self.costs = None
         for hsym, holding in self.holdings.items():
             if holding.symbol == convert:
                 self.costs = Spot(s=holding.symbol)
@@ -353,8 +505,10 @@ class Portfolio():
                 profit = 0.0
 
                 if transaction.is_pair:
-                    _logger.debug(f' |  sell_spot: {transaction.pair.sell_spot}')
-                    _logger.debug(f' |  buy_spot: {transaction.pair.buy_spot}')
+                    # Would create the Pair of every transaction.
+                    if _logger.isEnabledFor(DEBUG):
+                        _logger.debug(f' |  sell_spot: {transaction.pair.sell_spot}')
+                        _logger.debug(f' |  buy_spot: {transaction.pair.buy_spot}')
 
                     profit = transaction.profit
 
@@ -363,17 +517,59 @@ class Portfolio():
                     elif holding.symbol == transaction.buy_symbol:
                         _logger.debug(' |  holding is transaction.buy_symbol')
                 else:
-                    _logger.debug(f' |  spot: {transaction.spot}')
-                    profit = transaction.spot.profit
+                    if _logger.isEnabledFor(DEBUG):
+                        _logger.debug(f' |  spot: {transaction.spot}')
+                    profit = transaction.profit
 
                 holding.profit += profit
 
                 _logger.debug(f' |  holding({holding.symbol}): profit={profit}    hp={holding.profit}')
 
+            for sub_portfolio in self.subs:
+                if holding.symbol in sub_portfolio.holdings:
+                    holding.profit += sub_portfolio.holdings[holding.symbol].profit
+
+        self._quotes_lots(convert)
+
+    def quotes_lots(self, convert: str):
+        # Lots are matched over the whole tree, a changed portfolio can move
+        # the cost of the others. Expects the holdings to be quoted already.
+        for sub_portfolio in self.subs:
+            sub_portfolio.quotes_lots(convert)
+        self._quotes_lots(convert)
+
+    def _quotes_lots(self, convert: str):
+        if self.lots is None:
+            self.realized = None
+            self.unrealized = None
+            return
+
+        # The own lots of every portfolio, the sub portfolios are rolled up like the profit.
+        self.realized = 0.0
+        self.unrealized = 0.0
+        for hsym, holding in self.holdings.items():
+            if holding.symbol == convert:
+                continue
+
+            holding.cost_basis = self.lots.cost(self, holding.symbol)
+            holding.realized = self.lots.realized(self, holding.symbol)
+            holding.unmatched = self.lots.unmatched(self, holding.symbol)
+            for sub_portfolio in self.subs:
+                sub_holding = sub_portfolio.holdings.get(holding.symbol)
+                if sub_holding is not None and sub_holding.cost_basis is not None:
+                    holding.cost_basis += sub_holding.cost_basis
+                    holding.realized += sub_holding.realized
+                    holding.unmatched += sub_holding.unmatched
+
+            holding.unrealized = holding.value - holding.cost_basis
+            self.realized += holding.realized
+            self.unrealized += holding.unrealized
+
     def _quotes_fees(self, quotes: Quotes, convert: str):
         _logger.debug(f'quotes_fees({self.name})')
 
         # Fees
+        self.fee_value = 0.0
         for fee_id, fee in self.fees.items():
 
             if fee.symbol == convert:
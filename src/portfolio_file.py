@@ -0,0 +1,74 @@
+import gzip
+from pathlib import Path
+from json import loads
+from typing import BinaryIO
+from compiled import COMPILED_SUFFIX, load_compiled
+
+FILE_SUFFIXES = ('.json', '.yml', COMPILED_SUFFIX)
+
+# Portfolio files can be compressed, like export.json.gz or export.yml.zst.
+COMPRESSED_SUFFIXES = ('.gz', '.zst')
+
+def portfolio_suffix(file: Path) -> str:
+    # Suffix of the portfolio file without the compression.
+    if file.suffix in COMPRESSED_SUFFIXES:
+        return Path(file.stem).suffix
+    return file.suffix
+
+def portfolio_stem(file: Path) -> str:
+    # Name of the portfolio file without the suffix and the compression.
+    if file.suffix in COMPRESSED_SUFFIXES:
+        file = Path(file.stem)
+    return file.stem
+
+def is_portfolio_file(file: Path) -> bool:
+    return portfolio_suffix(file) in FILE_SUFFIXES
+
+def _zstandard(file: Path):
+    # Optional, only needed for .zst files.
+    try:
+        import zstandard
+    except ImportError as error:
+        raise ValueError(f'zstandard is required for {file}') from error
+    return zstandard
+
+def open_portfolio_file(file: Path) -> BinaryIO:
+    if file.suffix == '.gz':
+        return gzip.open(file, 'rb')
+    if file.suffix == '.zst':
+        return _zstandard(file).ZstdDecompressor().stream_reader(open(file, 'rb'), closefd=True)
+    return open(file, 'rb')
+
+def create_portfolio_file(file: Path, path: Path|None = None) -> BinaryIO:
+    # Opens path (default: file) for writing, compressed by the suffix of file.
+    if path is None:
+        path = file
+    if file.suffix == '.gz':
+        return gzip.open(path, 'wb')
+    if file.suffix == '.zst':
+        return _zstandard(file).ZstdCompressor().stream_writer(open(path, 'wb'), closefd=True)
+    return open(path, 'wb')
+
+def parse_portfolio_file(file: Path, data: bytes|None = None) -> dict:
+    if file.suffix == COMPILED_SUFFIX:
+        return load_compiled(file, data)
+
+    if data is None:
+        data = file.read_bytes()
+
+    if file.suffix == '.gz':
+        data = gzip.decompress(data)
+    elif file.suffix == '.zst':
+        data = _zstandard(file).ZstdDecompressor().decompressobj().decompress(data)
+
+    suffix = portfolio_suffix(file)
+    if suffix == COMPILED_SUFFIX:
+        return load_compiled(file, data)
+    if suffix == '.json':
+        return loads(data)
+    if suffix == '.yml':
+        # Imported here, cached and compiled files don't need a YAML parser.
+        from yaml import safe_load
+        return safe_load(data)
+
+    raise ValueError(f'Unknown portfolio file type: {file}')
@@ -0,0 +1,96 @@
+
+import os
+from logging import getLogger
+from pathlib import Path
+from portfolio_file import is_portfolio_file, portfolio_stem, parse_portfolio_file
+from trx_cache import TrxCache
+
+_logger = getLogger(f'app.{__name__}')
+
+class PortfolioDir():
+    path: Path
+    entries: list['PortfolioDir|Path']
+
+    def __init__(self, path: Path):
+        self.path = path
+        self.entries = []
+
+    def __repr__(self):
+        return f'PortfolioDir[{self.path},e={len(self.entries)}]'
+
+    def iter_files(self):
+        for entry in self.entries:
+            if isinstance(entry, PortfolioDir):
+                yield from entry.iter_files()
+            else:
+                yield entry
+
+def scan_portfolio_dir(path: Path) -> PortfolioDir:
+    pdir = PortfolioDir(path)
+
+    with os.scandir(path) as it:
+        for entry in it:
+            if entry.is_dir():
+                pdir.entries.append(scan_portfolio_dir(Path(entry.path)))
+            elif entry.is_file() and is_portfolio_file(Path(entry.name)):
+                pdir.entries.append(Path(entry.path))
+
+    # Transactions with the same date keep the order of their files, sorted
+    # without the suffix so a tree and its compiled copy load the same.
+    pdir.entries.sort(key=_entry_key)
+
+    return pdir
+
+def _entry_key(entry: 'PortfolioDir|Path') -> tuple[str, bool]:
+    if isinstance(entry, PortfolioDir):
+        return entry.path.name, True
+    return portfolio_stem(entry), False
+
+def load_portfolio_files(files: list[Path], cache: TrxCache|None = None, jobs: int = 1) -> list[dict]:
+    if jobs == 0:
+        jobs = os.cpu_count() or 1
+
+    if jobs == 1 or len(files) <= 1:
+        if cache is None:
+            return [parse_portfolio_file(file) for file in files]
+        return [cache.load(file) for file in files]
+
+    _logger.debug(f'load {len(files)} files with {jobs} jobs')
+
+    # Only needed with several jobs, importing it costs more than loading a few files.
+    from concurrent.futures import ProcessPoolExecutor
+
+    if cache is None:
+        initargs = (None, 0, False)
+    else:
+        initargs = (cache.path, cache.max_size, cache.rebuild)
+
+    chunksize = max(1, len(files) // (jobs * 4))
+    raw_datas = []
+    with ProcessPoolExecutor(max_workers=jobs, initializer=_init_worker, initargs=initargs) as executor:
+        for raw_data, hit in executor.map(_load_file, files, chunksize=chunksize):
+            raw_datas.append(raw_data)
+
+            if cache is not None:
+                if hit:
+                    cache.hits += 1
+                else:
+                    cache.misses += 1
+
+    return raw_datas
+
+_worker_cache: TrxCache|None = None
+
+def _init_worker(cache_path: Path|None, max_size: int, rebuild: bool):
+    global _worker_cache
+
+    if cache_path is not None:
+        _worker_cache = TrxCache(cache_path, max_size=max_size, rebuild=rebuild)
+
+def _load_file(file: Path) -> tuple[dict, bool]:
+    if _worker_cache is None:
+        return parse_portfolio_file(file), False
+
+    hits = _worker_cache.hits
+    raw_data = _worker_cache.load(file)
+    return raw_data, _worker_cache.hits > hits
@@ -0,0 +1,130 @@
+
+import sys
+import json
+import cProfile
+from contextlib import contextmanager, nullcontext
+from logging import getLogger
+from pathlib import Path
+from time import perf_counter, process_time
+
+_logger = getLogger(f'app.{__name__}')
+
+class PhaseStats():
+    count: int
+    wall: float
+    cpu: float
+    blocks: int
+
+    def __init__(self):
+        self.count = 0
+        self.wall = 0.0
+        self.cpu = 0.0
+        self.blocks = 0
+
+    def to_json(self):
+        return {
+            'count': self.count,
+            'wall': self.wall,
+            'cpu': self.cpu,
+            'blocks': self.blocks,
+        }
+
+class Profiler():
+    phases: dict[str, PhaseStats]
+    nodes: dict[str, dict[str, PhaseStats]]
+    output: Path|None
+    cprofile_path: Path|None
+
+    def __init__(self, output: Path|None = None, cprofile_path: Path|None = None):
+        self.phases = {}
+        self.nodes = {}
+        self.output = output
+        self.cprofile_path = cprofile_path
+        self._cprofile = None
+        self._start_wall = 0.0
+        self._start_cpu = 0.0
+
+    def start(self):
+        self._start_wall = perf_counter()
+        self._start_cpu = process_time()
+
+        if self.cprofile_path is not None:
+            self._cprofile = cProfile.Profile()
+            self._cprofile.enable()
+
+    @contextmanager
+    def phase(self, name: str):
+        stats = self.phases.get(name)
+        if stats is None:
+            stats = self.phases[name] = PhaseStats()
+
+        with self._measure(stats):
+            yield
+
+    @contextmanager
+    def node(self, path: str, name: str):
+        node_stats = self.nodes.get(path)
+        if node_stats is None:
+            node_stats = self.nodes[path] = {}
+
+        stats = node_stats.get(name)
+        if stats is None:
+            stats = node_stats[name] = PhaseStats()
+
+        with self._measure(stats):
+            yield
+
+    @contextmanager
+    def _measure(self, stats: PhaseStats):
+        # Allocated blocks is a cheap stand-in for allocation counts, tracemalloc would slow everything down.
+        start_blocks = sys.getallocatedblocks()
+        start_cpu = process_time()
+        start_wall = perf_counter()
+        try:
+            yield
+        finally:
+            stats.wall += perf_counter() - start_wall
+            stats.cpu += process_time() - start_cpu
+            stats.blocks += sys.getallocatedblocks() - start_blocks
+            stats.count += 1
+
+    def stop(self):
+        if self._cprofile is not None:
+            self._cprofile.disable()
+            self._cprofile.dump_stats(self.cprofile_path)
+            _logger.info(f'cProfile stats: {self.cprofile_path}')
+            self._cprofile = None
+
+        summary = json.dumps(self.to_json(), indent=2)
+        if self.output is None:
+            print(summary, file=sys.stderr)
+        else:
+            self.output.write_text(summary + '\n')
+
+    def to_json(self):
+        return {
+            'total': {
+                'wall': perf_counter() - self._start_wall,
+                'cpu': process_time() - self._start_cpu,
+            },
+            'phases': {name: stats.to_json() for name, stats in self.phases.items()},
+            'nodes': {path: {name: stats.to_json() for name, stats in node_stats.items()} for path, node_stats in self.nodes.items()},
+        }
+
+def profile_phase(profiler: Profiler|None, name: str):
+    if profiler is None:
+        return nullcontext()
+    return profiler.phase(name)
+
+def create_profiler(profile: str|None, cprofile_path: str|None) -> Profiler|None:
+    if profile is None and cprofile_path is None:
+        return None
+
+    output = None
+    if profile is not None and profile != '-':
+        output = Path(profile)
+
+    if cprofile_path is not None:
+        cprofile_path = Path(cprofile_path)
+
+    return Profiler(output=output, cprofile_path=cprofile_path)
@@ -0,0 +1,205 @@
+
+import json
+from abc import ABC, abstractmethod
+from time import sleep
+from threading import Lock
+from logging import getLogger
+from pathlib import Path
+from quote_cache import QuoteCache
+
+_logger = getLogger(f'app.{__name__}')
+
+# Fields of a CMC quote which are used by the apps.
+QUOTE_FIELDS = ('price', 'volume_24h', 'volume_change_24h', 'percent_change_24h', 'market_cap_dominance')
+
+class DataProvider(ABC):
+    id: str
+    dp_config: dict
+    calls: int
+    credits: int
+
+    def __init__(self, dp_config: dict, pool_size: int = 1, cache: QuoteCache|None = None):
+        self.dp_config = dp_config
+        self.calls = 0
+        self.credits = 0
+
+    @abstractmethod
+    def get_quotes(self, convert: str, symbols: list[str]) -> dict:
+        pass
+
+    def close(self):
+        pass
+
+PROVIDERS: dict[str, type[DataProvider]] = {}
+
+def register_provider(provider_id: str):
+    def register(cls: type[DataProvider]) -> type[DataProvider]:
+        cls.id = provider_id
+        PROVIDERS[provider_id] = cls
+        return cls
+    return register
+
+def create_provider(provider_id: str, dp_config: dict, pool_size: int = 1, cache: QuoteCache|None = None) -> DataProvider:
+    if provider_id not in PROVIDERS:
+        raise ValueError(f'Unknown data provider: {provider_id}')
+
+    _logger.debug(f'create_provider({provider_id})')
+    return PROVIDERS[provider_id](dp_config, pool_size=pool_size, cache=cache)
+
+@register_provider('cmc')
+class CmcProvider(DataProvider):
+    def __init__(self, dp_config: dict, pool_size: int = 1, cache: QuoteCache|None = None):
+        super().__init__(dp_config, pool_size=pool_size, cache=cache)
+
+        # requests is only needed when talking to CMC.
+        from cmc import create_client
+        self.client = create_client(dp_config, pool_size=pool_size, cache=cache)
+
+    def get_quotes(self, convert: str, symbols: list[str]) -> dict:
+        response = self.client.get_quotes(convert=convert, symbols=symbols)
+        self.calls = self.client.calls
+        self.credits = self.client.credits
+        return response
+
+    def close(self):
+        self.client.close()
+
+# Serves quotes from a static file. The file uses the same format as the quotes
+# file (convert -> symbol -> price), a symbol can also map to a dict of CMC quote fields.
+@register_provider('file')
+class FileProvider(DataProvider):
+    path: Path
+    symbols: dict[str, dict[str, float|dict]]
+
+    def __init__(self, dp_config: dict, pool_size: int = 1, cache: QuoteCache|None = None):
+        super().__init__(dp_config, pool_size=pool_size, cache=cache)
+
+        file_config = dp_config.get('file', {})
+        if 'path' not in file_config:
+            raise ValueError('data_provider.file.path is required for the file data provider')
+
+        from yaml import safe_load
+
+        self.path = Path(file_config['path'])
+        with open(self.path, 'r') as f:
+            self.symbols = safe_load(f) or {}
+
+    def get_quotes(self, convert: str, symbols: list[str]) -> dict:
+        self.calls += 1
+
+        csymbols = self.symbols.get(convert, {})
+        data = {}
+        for symbol in symbols:
+            if symbol not in csymbols:
+                continue
+
+            quote = csymbols[symbol]
+            if not isinstance(quote, dict):
+                quote = {'price': quote}
+
+            data[symbol] = [{
+                'symbol': symbol,
+                'quote': {convert: {
+                    **{field: 0.0 for field in QUOTE_FIELDS},
+                    'last_updated': None,
+                    **quote,
+                }},
+            }]
+
+        return {'data': data}
+
+# Passes requests to another provider and appends every response to a
+# recording file (JSON lines) which can be served by the replay provider.
+@register_provider('record')
+class RecordProvider(DataProvider):
+    path: Path
+
+    def __init__(self, dp_config: dict, pool_size: int = 1, cache: QuoteCache|None = None):
+        super().__init__(dp_config, pool_size=pool_size, cache=cache)
+
+        replay_config = dp_config.get('replay', {})
+        if 'path' not in replay_config:
+            raise ValueError('data_provider.replay.path is required for the record data provider')
+
+        self.path = Path(replay_config['path'])
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        # Without the quote cache, so only live responses are recorded.
+        self.provider = create_provider(replay_config.get('provider', 'cmc'), dp_config, pool_size=pool_size, cache=None)
+        self._lock = Lock()
+
+    def get_quotes(self, convert: str, symbols: list[str]) -> dict:
+        response = self.provider.get_quotes(convert, symbols)
+        self.calls = self.provider.calls
+        self.credits = self.provider.credits
+
+        record = {
+            'convert': convert,
+            'symbols': symbols,
+            'response': response,
+        }
+        with self._lock:
+            with open(self.path, 'a') as f:
+                f.write(json.dumps(record) + '\n')
+
+        return response
+
+    def close(self):
+        self.provider.close()
+
+# Serves responses from a recording file in the recorded order. Requests which were
+# not recorded as such are answered with the latest recorded data of each symbol.
+@register_provider('replay')
+class ReplayProvider(DataProvider):
+    path: Path
+    latency: float
+    loop: bool
+    records: dict[tuple[str, tuple[str, ...]], list[dict]]
+    latest: dict[str, dict[str, list]]
+
+    def __init__(self, dp_config: dict, pool_size: int = 1, cache: QuoteCache|None = None):
+        super().__init__(dp_config, pool_size=pool_size, cache=cache)
+
+        replay_config = dp_config.get('replay', {})
+        if 'path' not in replay_config:
+            raise ValueError('data_provider.replay.path is required for the replay data provider')
+
+        self.path = Path(replay_config['path'])
+        self.latency = replay_config.get('latency', 0.0)
+        self.loop = replay_config.get('loop', True)
+
+        self.records = {}
+        self.latest = {}
+        with open(self.path, 'r') as f:
+            for line in f:
+                if line.strip() == '':
+                    continue
+
+                record = json.loads(line)
+                key = (record['convert'], tuple(record['symbols']))
+                self.records.setdefault(key, []).append(record['response'])
+
+                latest = self.latest.setdefault(record['convert'], {})
+                for symbol, sdata in record['response'].get('data', {}).items():
+                    latest[symbol] = sdata
+
+        self._positions = {}
+        self._lock = Lock()
+
+    def get_quotes(self, convert: str, symbols: list[str]) -> dict:
+        if self.latency > 0:
+            sleep(self.latency)
+
+        key = (convert, tuple(symbols))
+        with self._lock:
+            self.calls += 1
+
+            if key in self.records:
+                responses = self.records[key]
+                position = self._positions.get(key, 0)
+                if position >= len(responses):
+                    position = 0 if self.loop else len(responses) - 1
+                self._positions[key] = position + 1
+                return responses[position]
+
+        latest = self.latest.get(convert, {})
+        return {'data': {symbol: latest[symbol] for symbol in symbols if symbol in latest}}
@@ -0,0 +1,140 @@
+
+import os
+import json
+from time import time
+from threading import Lock
+from logging import getLogger
+from pathlib import Path
+from typing import Callable
+from helper import default_cache_dir
+
+_logger = getLogger(f'app.{__name__}')
+
+DEFAULT_TTL = 60.0
+DEFAULT_MAX_AGE = 24 * 60 * 60.0
+
+FetchFunc = Callable[[str, list[str]], dict]
+
+class QuoteCache():
+    path: Path
+    ttl: float
+    max_age: float
+    entries: dict[str, dict[str, dict]]
+    hits: int
+    misses: int
+
+    def __init__(self, path: Path, ttl: float = DEFAULT_TTL, max_age: float = DEFAULT_MAX_AGE):
+        self.path = path
+        self.ttl = ttl
+        self.max_age = max_age
+        self.entries = {}
+        self.hits = 0
+        self.misses = 0
+        self._lock = Lock()
+        self._loaded = False
+
+    def get_quotes(self, fetch: FetchFunc, convert: str, symbols: list[str]) -> dict:
+        now = time()
+
+        with self._lock:
+            self._load()
+
+            centries = self.entries.get(convert, {})
+            data = {}
+            missing = []
+            for symbol in symbols:
+                entry = centries.get(symbol)
+                if entry is not None and now - entry['time'] < self.ttl:
+                    data[symbol] = entry['data']
+                else:
+                    missing.append(symbol)
+
+            self.hits += len(data)
+            self.misses += len(missing)
+
+        _logger.debug(f'quote cache {convert}: hits={len(data)} missing={missing}')
+
+        if len(missing) == 0:
+            return {'data': data}
+
+        response = fetch(convert, missing)
+        if 'data' not in response:
+            return {**response, 'data': data}
+
+        with self._lock:
+            centries = self.entries.setdefault(convert, {})
+            for symbol, sdata in response['data'].items():
+                data[symbol] = sdata
+
+                if len(sdata) == 0 or convert not in sdata[0].get('quote', {}):
+                    continue
+
+                # Keep only what is needed to answer the same request again.
+                centries[symbol] = {
+                    'time': now,
+                    'data': [{
+                        'symbol': sdata[0].get('symbol', symbol),
+                        'quote': {convert: sdata[0]['quote'][convert]},
+                    }],
+                }
+
+            self._save(now)
+
+        return {**response, 'data': data}
+
+    def _load(self):
+        if self._loaded:
+            return
+        self._loaded = True
+
+        self.entries = self._read()
+
+    def _read(self) -> dict[str, dict[str, dict]]:
+        try:
+            with open(self.path, 'r') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
+        except ValueError as error:
+            _logger.warning(f'quote cache broken: {self.path}: {error}')
+            return {}
+
+    def _save(self, now: float):
+        # Another process might have written entries in the meantime.
+        for convert, centries in self._read().items():
+            own = self.entries.setdefault(convert, {})
+            for symbol, entry in centries.items():
+                if symbol not in own or own[symbol]['time'] < entry['time']:
+                    own[symbol] = entry
+
+        for convert in list(self.entries):
+            centries = self.entries[convert]
+            for symbol in [s for s, e in centries.items() if now - e['time'] > self.max_age]:
+                del centries[symbol]
+            if len(centries) == 0:
+                del self.entries[convert]
+
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.path.with_suffix(f'.{os.getpid()}.tmp')
+        with open(tmp_path, 'w') as f:
+            json.dump(self.entries, f)
+        os.replace(tmp_path, self.path)
+
+def create_quote_cache(config: dict, enabled: bool|None = None) -> QuoteCache|None:
+    # Opt-in with quote_cache.enabled, enabled (--quote-cache) overrides the config.
+    cache_config = config.get('quote_cache', {})
+    if enabled is None:
+        enabled = cache_config.get('enabled', False)
+    if not enabled:
+        return None
+
+    ttl = cache_config.get('ttl', DEFAULT_TTL)
+    if ttl <= 0:
+        return None
+
+    if 'path' in cache_config:
+        path = Path(cache_config['path'])
+    else:
+        path = default_cache_dir('quotes') / 'quotes.json'
+
+    return QuoteCache(path, ttl=ttl, max_age=cache_config.get('max_age', DEFAULT_MAX_AGE))
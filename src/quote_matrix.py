@@ -0,0 +1,145 @@
+
+import numpy as np
+from quotes import QuotesDict
+from symbol_table import SymbolTable
+
+# Columns are added in steps of this many symbols.
+GROW = 64
+
+class QuoteMatrix():
+    # Quotes in a 2-D array indexed by (convert row, symbol id), with the same
+    # add/get/has API and symbols dict as Quotes. Only symbols used as
+    # convert get a row, the IDs of both come from one SymbolTable.
+    table: SymbolTable
+    rates: np.ndarray
+    known: np.ndarray
+    rows: np.ndarray
+
+    def __init__(self, symbols: QuotesDict|None = None, table: SymbolTable|None = None):
+        if table is None:
+            table = SymbolTable()
+        self.table = table
+
+        size = max(GROW, len(table))
+        self.rates = np.zeros((0, size))
+        self.known = np.zeros((0, size), dtype=bool)
+        # Row of a symbol ID, -1 if it's not a convert.
+        self.rows = np.full(size, -1, dtype=np.intp)
+
+        if symbols is not None:
+            for convert, values in symbols.items():
+                for symbol, val in values.items():
+                    self.add(convert, symbol, val)
+
+    def __repr__(self):
+        return f'QuoteMatrix[c={len(self.rates)},s={len(self.table)},q={int(self.known.sum())}]'
+
+    @property
+    def symbols(self) -> QuotesDict:
+        # Same layout as Quotes.symbols (and the quotes file).
+        symbols = {}
+        for cid in np.flatnonzero(self.rows >= 0).tolist():
+            row = self.rows[cid]
+            sids = np.flatnonzero(self.known[row]).tolist()
+            symbols[self.table.name(cid)] = dict(zip([self.table.name(sid) for sid in sids], self.rates[row, sids].tolist()))
+        return symbols
+
+    def _grow(self):
+        size = self.rates.shape[1]
+        if len(self.table) <= size:
+            return
+
+        new_size = (len(self.table) // GROW + 1) * GROW
+        rates = np.zeros((len(self.rates), new_size))
+        rates[:, :size] = self.rates
+        known = np.zeros((len(self.rates), new_size), dtype=bool)
+        known[:, :size] = self.known
+        rows = np.full(new_size, -1, dtype=np.intp)
+        rows[:size] = self.rows
+
+        self.rates = rates
+        self.known = known
+        self.rows = rows
+
+    def _row(self, cid: int) -> int:
+        row = self.rows[cid]
+        if row < 0:
+            row = self.rows[cid] = len(self.rates)
+            self.rates = np.vstack((self.rates, np.zeros((1, self.rates.shape[1]))))
+            self.known = np.vstack((self.known, np.zeros((1, self.known.shape[1]), dtype=bool)))
+        return row
+
+    def _column(self, name: str) -> int|None:
+        # ID of a symbol, None if it's unknown or has no column yet.
+        sid = self.table.get(name)
+        if sid is None or sid >= self.rates.shape[1]:
+            return None
+        return sid
+
+    def add(self, convert: str, symbol: str, val: float):
+        cid = self.table.id(convert)
+        sid = self.table.id(symbol)
+        self._grow()
+
+        row = self._row(cid)
+        self.rates[row, sid] = val
+        self.known[row, sid] = True
+
+    def has(self, convert: str, symbol: str) -> bool:
+        if convert == symbol:
+            return True
+
+        cid = self._column(convert)
+        sid = self._column(symbol)
+        if cid is None or sid is None or self.rows[cid] < 0:
+            return False
+        return bool(self.known[self.rows[cid], sid])
+
+    def get(self, convert: str, symbol: str) -> float:
+        if convert == symbol:
+            return 1.0
+
+        cid = self._column(convert)
+        if cid is None or self.rows[cid] < 0:
+            raise ValueError(f'convert not found in quotes: {convert}: {self.symbols.keys()}')
+
+        sid = self._column(symbol)
+        if sid is None or not self.known[self.rows[cid], sid]:
+            raise ValueError(f'symbol not found in quotes: convert={convert} symbol={symbol}')
+
+        return float(self.rates[self.rows[cid], sid])
+
+    def get_ids(self, cids: np.ndarray, sids: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        # Quotes for arrays of convert and symbol IDs, and a mask of the known ones.
+        # A symbol in itself is 1.0. IDs without a column (-1, or added to the
+        # table after the last add()) are not known, the matrix isn't changed.
+        cids = np.asarray(cids, dtype=np.intp)
+        sids = np.asarray(sids, dtype=np.intp)
+        size = self.rates.shape[1]
+
+        valid = (cids >= 0) & (cids < size) & (sids >= 0) & (sids < size)
+        safe_cids = np.where(valid, cids, 0)
+        safe_sids = np.where(valid, sids, 0)
+        rows = np.where(valid, self.rows[safe_cids], -1)
+        has_row = rows >= 0
+        safe_rows = np.where(has_row, rows, 0)
+        if len(self.rates) == 0:
+            values = np.zeros(len(cids))
+            known = np.zeros(len(cids), dtype=bool)
+        else:
+            values = self.rates[safe_rows, safe_sids]
+            known = has_row & self.known[safe_rows, safe_sids]
+
+        same = (cids == sids) & (cids >= 0)
+        values = np.where(same, 1.0, values)
+        known = known | same
+        return values, known
+
+    def get_many(self, converts: list[str], symbols: list[str]) -> np.ndarray:
+        # Like get() for lists, raises the same error for the first missing quote.
+        # Unknown names are looked up without adding them to the table.
+        values, known = self.get_ids(self.table.get_list(converts), self.table.get_list(symbols))
+        if not known.all():
+            for n in np.flatnonzero(~known).tolist():
+                values[n] = self.get(converts[n], symbols[n])
+        return values
@@ -4,7 +4,9 @@ QuotesDict = dict[str, dict[str, float]]
 class Quotes():
     symbols: QuotesDict
 
-    def __init__(self, symbols: dict = {}) -> None:
+    def __init__(self, symbols: dict|None = None) -> None:
+        if symbols is None:
+            symbols = {}
         self.symbols = symbols
 
     def add(self, convert: str, symbol: str, val: float):
@@ -16,6 +18,12 @@ class Quotes():
 
         self.symbols[convert][symbol] = val
 
+    def has(self, convert: str, symbol: str) -> bool:
+        if convert == symbol:
+            return True
+
+        return convert in self.symbols and symbol in self.symbols[convert]
+
     def get(self, convert: str, symbol: str) -> float:
         if convert == symbol:
             return 1.0
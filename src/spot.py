@@ -1,9 +1,10 @@
 
 class Spot():
+    __slots__ = ('symbol', 'quantity', 'trx_count', '_transactions', 'value', 'profit', 'price')
+
     symbol: str
     quantity: float
     trx_count: int
-    transactions = list
 
     value: float # TODO move to different class
     profit: float
@@ -13,7 +14,7 @@ class Spot():
         self.symbol = s
         self.quantity = q
         self.trx_count = 0
-        self.transactions = []
+        self._transactions = None
 
         self.value = None
         self.profit = None
@@ -34,6 +35,13 @@ class Spot():
             'profit': self.profit,
         }
 
+    @property
+    def transactions(self) -> list:
+        # Only the spots of portfolios and holdings have transactions, not every spot needs a list.
+        if self._transactions is None:
+            self._transactions = []
+        return self._transactions
+
     def to_str(self) -> str:
         return f'{self.quantity:.2f} {self.symbol}'
 
@@ -0,0 +1,191 @@
+
+import os
+import sys
+import json
+import asyncio
+from logging import getLogger
+from pathlib import Path
+from typing import Callable
+
+_logger = getLogger(f'app.{__name__}')
+
+# Fields a message can carry besides 'symbol' and 'convert'. All of them are optional.
+MESSAGE_FIELDS = ('price', 'last_updated', 'volume_24h', 'volume_change_24h', 'percent_change_24h', 'market_cap_dominance')
+
+# Lines longer than this are dropped.
+LINE_LIMIT = 64 * 1024
+
+SOURCE_KINDS = ('unix', 'tcp', 'pipe', 'file')
+
+# Reads newline-delimited JSON price updates, one message per line:
+#   {"symbol": "BTC", "price": 61234.5, "percent_change_24h": 1.2}
+# The source is a Unix socket (unix:PATH), a TCP socket (tcp:HOST:PORT),
+# a named pipe (pipe:PATH), stdin (-) or a file which is tailed (file:PATH or PATH).
+class StreamFeed():
+    source: str
+    convert: str
+    reconnect: float
+    poll_interval: float
+    from_start: bool
+    subscribe: list[str]|None
+    received: int
+    errors: int
+
+    def __init__(self, stream_config: dict, convert: str, subscribe: list[str]|None = None, on_status: Callable[[str], None]|None = None):
+        if 'source' not in stream_config:
+            raise ValueError('data_provider.stream.source is required for the stream data provider')
+
+        self.source = stream_config['source']
+        self.convert = convert
+        self.reconnect = stream_config.get('reconnect', 1.0)
+        self.poll_interval = stream_config.get('poll_interval', 0.1)
+        self.from_start = stream_config.get('from_start', False)
+        self.subscribe = subscribe
+        self.received = 0
+        self.errors = 0
+        self._on_status = on_status
+
+    def source_kind(self) -> tuple[str, str]:
+        if self.source == '-':
+            return 'stdin', ''
+
+        kind, sep, target = self.source.partition(':')
+        if sep == '' or kind not in SOURCE_KINDS:
+            return 'file', self.source
+        return kind, target
+
+    def _status(self, text: str):
+        _logger.debug(text)
+        if self._on_status is not None:
+            self._on_status(text)
+
+    async def read(self):
+        kind, target = self.source_kind()
+        from_start = self.from_start
+
+        while True:
+            try:
+                if kind == 'file':
+                    lines = self._tail(Path(target), from_start)
+                else:
+                    lines = self._read_stream(kind, target)
+
+                async for line in lines:
+                    message = self.parse(line)
+                    if message is not None:
+                        yield message
+            except (OSError, ValueError) as error:
+                self._status(f'Stream {self.source}: {error}')
+
+            if kind == 'stdin':
+                self._status(f'Stream {self.source} closed')
+                return
+
+            # A file which shows up or is replaced later is read from the beginning.
+            from_start = True
+
+            await asyncio.sleep(self.reconnect)
+
+    async def _read_stream(self, kind: str, target: str):
+        loop = asyncio.get_running_loop()
+
+        if kind == 'unix':
+            reader, writer = await asyncio.open_unix_connection(target, limit=LINE_LIMIT)
+            close = writer.close
+        elif kind == 'tcp':
+            host, _, port = target.rpartition(':')
+            reader, writer = await asyncio.open_connection(host, int(port), limit=LINE_LIMIT)
+            close = writer.close
+        else:
+            if kind == 'stdin':
+                pipe = sys.stdin
+            else:
+                # Non-blocking, opening a named pipe would block until a writer shows up.
+                pipe = open(os.open(target, os.O_RDONLY | os.O_NONBLOCK), 'rb', buffering=0)
+
+            reader = asyncio.StreamReader(limit=LINE_LIMIT)
+            transport, _ = await loop.connect_read_pipe(lambda: asyncio.StreamReaderProtocol(reader), pipe)
+            close = transport.close
+
+        if self.subscribe is not None and kind in ('unix', 'tcp'):
+            # Tell a ticker server which symbols to send.
+            writer.write(json.dumps({'subscribe': self.subscribe, 'convert': self.convert}).encode() + b'\n')
+
+        self._status(f'Stream {self.source} connected')
+        try:
+            while True:
+                line = await reader.readline()
+                if line == b'':
+                    break
+                yield line
+        finally:
+            close()
+
+        self._status(f'Stream {self.source} disconnected')
+
+    async def _tail(self, path: Path, from_start: bool):
+        with open(path, 'rb') as f:
+            if not from_start:
+                f.seek(0, os.SEEK_END)
+            self._status(f'Stream {self.source} opened')
+
+            buf = b''
+            while True:
+                chunk = f.read(LINE_LIMIT)
+                if chunk:
+                    buf += chunk
+                    *lines, buf = buf.split(b'\n')
+                    for line in lines:
+                        yield line
+
+                    if len(buf) > LINE_LIMIT:
+                        self.errors += 1
+                        buf = b''
+                    continue
+
+                # Reopen the file when it was truncated or replaced (log rotation).
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    return
+                if stat.st_ino != os.fstat(f.fileno()).st_ino or stat.st_size < f.tell():
+                    return
+
+                await asyncio.sleep(self.poll_interval)
+
+    def parse(self, line: bytes) -> tuple[str, dict]|None:
+        line = line.strip()
+        if line == b'':
+            return None
+
+        try:
+            message = json.loads(line)
+        except ValueError:
+            self.errors += 1
+            return None
+
+        if isinstance(message, dict) and 'error' in message:
+            self.errors += 1
+            self._status(f'Stream {self.source}: {message["error"]}')
+            return None
+
+        if not isinstance(message, dict) or not isinstance(message.get('symbol'), str):
+            self.errors += 1
+            return None
+
+        if message.get('convert', self.convert) != self.convert:
+            return None
+
+        quote = {}
+        for field in MESSAGE_FIELDS:
+            if field not in message:
+                continue
+
+            value = message[field]
+            if field != 'last_updated' and (isinstance(value, bool) or not isinstance(value, (int, float))):
+                self.errors += 1
+                return None
+            quote[field] = value
+
+        self.received += 1
+        return message['symbol'], quote
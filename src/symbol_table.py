@@ -0,0 +1,42 @@
+
+class SymbolTable():
+    # Dense integer IDs for symbols, in the order they are first seen.
+    ids: dict[str, int]
+    names: list[str]
+
+    def __init__(self, names: list[str]|None = None):
+        self.ids = {}
+        self.names = []
+        if names is not None:
+            for name in names:
+                self.id(name)
+
+    def __repr__(self):
+        return f'SymbolTable[n={len(self.names)}]'
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    def __contains__(self, name: str) -> bool:
+        return name in self.ids
+
+    def id(self, name: str) -> int:
+        # Adds the symbol if it's new.
+        sid = self.ids.get(name)
+        if sid is None:
+            sid = self.ids[name] = len(self.names)
+            self.names.append(name)
+        return sid
+
+    def get(self, name: str) -> int|None:
+        return self.ids.get(name)
+
+    def name(self, sid: int) -> str:
+        return self.names[sid]
+
+    def id_list(self, names: list[str]) -> list[int]:
+        return [self.id(name) for name in names]
+
+    def get_list(self, names: list[str]) -> list[int]:
+        # Like get(), -1 for unknown names.
+        return [self.ids.get(name, -1) for name in names]
@@ -0,0 +1,130 @@
+
+import re
+from datetime import datetime
+from math import isnan
+
+# Renders tables like pandas DataFrame.to_string(index=False) with display.precision=6,
+# without building a DataFrame.
+
+PRECISION = 6
+NA_REP = 'NaN'
+
+_NUMBER_RE = re.compile(r'^\s*[\+-]?[0-9]+\.[0-9]*$')
+
+Column = tuple[str, list]
+
+def _is_na(value) -> bool:
+    return value is None or (isinstance(value, float) and isnan(value))
+
+def _column_kind(values: list) -> str:
+    # Same dtype inference as the DataFrame constructor for the types used here.
+    numbers = 0
+    floats = 0
+    nas = 0
+    strs = 0
+    datetimes = 0
+
+    for value in values:
+        if _is_na(value):
+            nas += 1
+            if value is not None:
+                floats += 1
+        elif isinstance(value, bool):
+            return 'object'
+        elif isinstance(value, int):
+            numbers += 1
+        elif isinstance(value, float):
+            numbers += 1
+            floats += 1
+        elif isinstance(value, str):
+            strs += 1
+        elif isinstance(value, datetime):
+            datetimes += 1
+        else:
+            return 'object'
+
+    if datetimes == len(values):
+        return 'datetime'
+    if numbers > 0 and numbers + nas == len(values):
+        return 'float' if floats > 0 or nas > 0 else 'int'
+    if strs > 0 and strs + nas == len(values):
+        return 'str'
+    return 'object'
+
+def _trim_zeros(values: list[str]) -> list[str]:
+    # Trim trailing zeros as long as all numbers end with one, keep one digit after the point.
+    while True:
+        numbers = [value for value in values if _NUMBER_RE.match(value)]
+        if len(numbers) == 0 or not all(value.endswith('0') for value in numbers):
+            break
+        values = [value[:-1] if _NUMBER_RE.match(value) else value for value in values]
+
+    return [value + '0' if _NUMBER_RE.match(value) and value.endswith('.') else value for value in values]
+
+def _format_floats(values: list) -> list[str]:
+    floats = [float('nan') if value is None else float(value) for value in values]
+
+    def format_with(fmt: str) -> list[str]:
+        return _trim_zeros([NA_REP if isnan(value) else fmt.format(value) for value in floats])
+
+    formatted = format_with(f'{{:.{PRECISION}f}}')
+
+    too_long = max(len(value) for value in formatted) > PRECISION + 6
+    has_large_values = any(abs(value) > 1e6 for value in floats if not isnan(value))
+    has_small_values = any(0 < abs(value) < 10 ** -PRECISION for value in floats if not isnan(value))
+    if has_small_values or (too_long and has_large_values):
+        formatted = format_with(f'{{:.{PRECISION}e}}')
+
+    return formatted
+
+def _format_object(value) -> str:
+    if isinstance(value, float):
+        if isnan(value):
+            return NA_REP
+
+        value_s = f'{value: .{PRECISION}f}'.rstrip('0')
+        if value_s.endswith('.'):
+            value_s += '0'
+        return value_s
+
+    if value is None:
+        return 'None'
+
+    return str(value)
+
+def _format_datetimes(values: list[datetime]) -> list[str]:
+    if all(value.hour == 0 and value.minute == 0 and value.second == 0 and value.microsecond == 0 for value in values):
+        return [value.strftime('%Y-%m-%d') for value in values]
+    return [value.strftime('%Y-%m-%d %H:%M:%S') for value in values]
+
+def format_column(values: list) -> tuple[list[str], bool]:
+    kind = _column_kind(values)
+
+    if kind == 'float':
+        return _format_floats(values), True
+    if kind == 'int':
+        return [str(value) for value in values], True
+    if kind == 'datetime':
+        return _format_datetimes(values), False
+    if kind == 'str':
+        return [NA_REP if _is_na(value) else value for value in values], False
+    return [_format_object(value) for value in values], False
+
+def render_table(columns: list[Column]) -> str:
+    if len(set(len(values) for _, values in columns)) > 1:
+        raise ValueError('All columns must be of the same length')
+
+    str_columns = []
+    for label, values in columns:
+        formatted, numeric = format_column(values)
+
+        # Numeric column headers are indented by one space.
+        header = f' {label}' if numeric else str(label)
+
+        width = max(len(header), *(len(value) for value in formatted))
+        str_columns.append([header.rjust(width)] + [value.rjust(width) for value in formatted])
+
+    lines = []
+    for row in zip(*str_columns):
+        lines.append(' '.join(row))
+    return '\n'.join(lines)
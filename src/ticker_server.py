@@ -0,0 +1,142 @@
+
+import json
+import asyncio
+from logging import getLogger
+from pathlib import Path
+from stream_feed import MESSAGE_FIELDS, LINE_LIMIT
+
+_logger = getLogger(f'app.{__name__}')
+
+# A client which doesn't read its updates is disconnected when this much is queued for it.
+MAX_CLIENT_BUFFER = 1024 * 1024
+
+class Subscriber():
+    writer: asyncio.StreamWriter
+    symbols: set[str]
+
+    def __init__(self, writer: asyncio.StreamWriter):
+        self.writer = writer
+        self.symbols = set()
+
+# Publishes the quotes fetched by one bittrackr instance to many clients over a
+# Unix socket. Clients send a subscription line and receive the same
+# newline-delimited JSON messages the stream data provider reads:
+#   -> {"subscribe": ["BTC", "ETH"], "convert": "EUR"}
+#   <- {"symbol": "BTC", "convert": "EUR", "price": 61234.5, ...}
+class TickerServer():
+    path: Path
+    convert: str
+    clients: list[Subscriber]
+    latest: dict[str, bytes]
+    published: int
+
+    def __init__(self, path: Path, convert: str):
+        self.path = path
+        self.convert = convert
+        self.clients = []
+        self.latest = {}
+        self.published = 0
+        self._server = None
+
+    async def start(self):
+        if self.path.exists():
+            # Don't take over the socket of a server which is still running.
+            try:
+                _, writer = await asyncio.open_unix_connection(str(self.path))
+            except OSError:
+                self.path.unlink()
+            else:
+                writer.close()
+                raise ValueError(f'Ticker server already running: {self.path}')
+
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._server = await asyncio.start_unix_server(self._handle, path=str(self.path), limit=LINE_LIMIT)
+        _logger.debug(f'listening on {self.path}')
+
+    async def close(self):
+        if self._server is None:
+            return
+
+        self._server.close()
+        for client in self.clients:
+            client.writer.close()
+        self.clients = []
+        await self._server.wait_closed()
+        self._server = None
+
+        self.path.unlink(missing_ok=True)
+
+    def symbols(self) -> set[str]:
+        # Symbols subscribed to by all clients.
+        symbols = set()
+        for client in self.clients:
+            symbols |= client.symbols
+        return symbols
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        client = Subscriber(writer)
+        self.clients.append(client)
+        _logger.debug(f'client connected, {len(self.clients)} clients')
+
+        try:
+            while True:
+                line = await reader.readline()
+                if line == b'':
+                    break
+
+                try:
+                    request = json.loads(line)
+                except ValueError:
+                    continue
+                if not isinstance(request, dict) or not isinstance(request.get('subscribe'), list):
+                    continue
+
+                if request.get('convert', self.convert) != self.convert:
+                    self._send(client, [json.dumps({'error': f'convert {request["convert"]} not served, only {self.convert}'}).encode() + b'\n'])
+                    continue
+
+                client.symbols = {symbol for symbol in request['subscribe'] if isinstance(symbol, str)}
+
+                # Send what is known already, the client doesn't have to wait for the next fetch.
+                self._send(client, [self.latest[symbol] for symbol in client.symbols if symbol in self.latest])
+        except (OSError, ValueError):
+            pass
+        finally:
+            if client in self.clients:
+                self.clients.remove(client)
+            writer.close()
+            _logger.debug(f'client disconnected, {len(self.clients)} clients')
+
+    def _send(self, client: Subscriber, lines: list[bytes]):
+        if len(lines) == 0 or client.writer.is_closing():
+            return
+
+        if client.writer.transport.get_write_buffer_size() > MAX_CLIENT_BUFFER:
+            _logger.warning('client too slow, disconnected')
+            client.writer.close()
+            return
+
+        client.writer.write(b''.join(lines))
+
+    def publish(self, data: dict[str, list]):
+        # data is the 'data' part of a CMC quotes response.
+        lines = {}
+        for symbol, sdata in data.items():
+            if len(sdata) == 0:
+                continue
+
+            quote = sdata[0]['quote'].get(self.convert)
+            if quote is None:
+                continue
+
+            message = {'symbol': symbol, 'convert': self.convert}
+            for field in MESSAGE_FIELDS:
+                if field in quote:
+                    message[field] = quote[field]
+
+            lines[symbol] = self.latest[symbol] = json.dumps(message).encode() + b'\n'
+
+        for client in self.clients:
+            self._send(client, [lines[symbol] for symbol in client.symbols if symbol in lines])
+
+        self.published += 1
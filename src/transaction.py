@@ -1,11 +1,28 @@
 
+from sys import intern
 from spot import Spot
 from pair import Pair
 
+# Keys of a transaction in a portfolio file which are kept as attributes,
+# everything else goes to Transaction.extra.
+_KEYS = frozenset(('date', 'price', 'quantity', 'location', 'note', 'profit', 'state', 'ignore', 'target', 'cprice'))
+
+def _intern(value):
+    # Symbols, dates and states repeat a lot, keep one string of each.
+    if type(value) is str:
+        return intern(value)
+    return value
+
 class Transaction():
+    # The Pair, Spot and fee Spot are only created when they are used.
+    __slots__ = (
+        'source', 'pair_s', 'sell_symbol', 'buy_symbol', 'date', 'ttype', 'price', 'cprice', 'quantity',
+        '_fee', 'location', 'note', '_pair', 'is_pair', '_spot', 'profit', 'state', 'ignore',
+        'target', 'target_f', 'target_spot', 'extra',
+    )
+
     source: str
     pair_s: str
-    symbol: str
     sell_symbol: str|None
     buy_symbol: str|None
     date: str|None
@@ -13,82 +30,64 @@ class Transaction():
     price: float|None
     cprice: float|None
     quantity: float
-    fee: Spot|None
     location: str|None
     note: str|None
-    pair: Pair|None
     is_pair: bool
-    spot: Spot|None
     profit: float|None
     state: str|None
     ignore: bool|None
     target: str|None
     target_f: float|None
     target_spot: Spot|None
+    extra: dict|None
 
     def __init__(self, source: str, pair: str, d: dict):
-        self.source = source
-        self.pair_s = pair
+        self.source = _intern(source)
+        self.pair_s = _intern(pair)
         self.date = None
         self.ttype = None
         self.price = None
         self.cprice = None
         self.quantity = None
-        self.fee = None
+        self._fee = None
         self.location = None
         self.note = None
-        self.pair = None
-        self.spot = None
+        self._pair = None
+        self._spot = None
         self.profit = None
         self.state = None
         self.ignore = None
         self.target = None
         self.target_f = None
         self.target_spot = None
+        self.extra = None
 
         if '/' in self.pair_s:
             self.is_pair = True
             sell_symbol, buy_symbol = self.pair_s.split('/')
-            self.sell_symbol = sell_symbol
-            self.buy_symbol = buy_symbol
+            self.sell_symbol = intern(sell_symbol)
+            self.buy_symbol = intern(buy_symbol)
         else:
             self.is_pair = False
             self.sell_symbol = None
             self.buy_symbol = None
 
         for key, value in d.items():
-            setattr(self, key, value)
-
-        self.ttype = getattr(self, 'type')
+            if key in _KEYS:
+                setattr(self, key, _intern(value))
+            elif key == 'type':
+                self.ttype = _intern(value)
+            elif key == 'fee':
+                if len(value) == 2:
+                    self._fee = (value[0], _intern(value[1]))
+            else:
+                if self.extra is None:
+                    self.extra = {}
+                self.extra[key] = value
 
         if self.target is not None:
             self.target_f = float(self.target)
 
-        if self.fee is not None:
-            if len(self.fee) == 2:
-                self.fee = Spot(s=self.fee[1], q=self.fee[0])
-            else:
-                self.fee = None
-
-        if self.is_pair:
-            pair: Pair = Pair(self.pair_s)
-
-            # print(f'self={self}')
-            # print(f'self.price={self.price}')
-            # print(f'self.quantity={self.quantity}')
-            # print(f'-------')
-
-            q = self.price * self.quantity
-            pair.sell_spot = Spot(s=self.sell_symbol, q=q)
-
-            pair.buy_spot = Spot(s=self.buy_symbol, q=self.quantity)
-
-            self.pair = pair
-        else:
-            self.spot = Spot(s=self.pair_s, q=self.quantity)
-
-        # print(f'self={self}')
-
     def __repr__(self):
         return f'Transaction[{self.pair_s},t={self.ttype},p={self.pair},s={self.spot}]'
 
@@ -102,3 +101,41 @@ class Transaction():
             'spot': self.spot,
             'profit': self.profit,
         }
+
+    @property
+    def sell_quantity(self) -> float:
+        return self.price * self.quantity
+
+    @property
+    def pair(self) -> Pair|None:
+        if self._pair is None and self.is_pair:
+            pair = Pair(self.pair_s)
+            pair.sell_spot = Spot(s=self.sell_symbol, q=self.sell_quantity)
+            pair.buy_spot = Spot(s=self.buy_symbol, q=self.quantity)
+            self._pair = pair
+        return self._pair
+
+    @property
+    def spot(self) -> Spot|None:
+        if self._spot is None and not self.is_pair:
+            self._spot = Spot(s=self.pair_s, q=self.quantity)
+        return self._spot
+
+    @property
+    def fee(self) -> Spot|None:
+        # Fees are only read, a new Spot is returned every time.
+        if self._fee is None:
+            return None
+        return Spot(s=self._fee[1], q=self._fee[0])
+
+    @property
+    def fee_symbol(self) -> str|None:
+        if self._fee is None:
+            return None
+        return self._fee[1]
+
+    @property
+    def fee_quantity(self) -> float|None:
+        if self._fee is None:
+            return None
+        return self._fee[0]
@@ -0,0 +1,318 @@
+
+import io
+from json import JSONDecoder
+from logging import getLogger
+from pathlib import Path
+from typing import Callable, BinaryIO
+from portfolio_file import portfolio_suffix, open_portfolio_file, COMPRESSED_SUFFIXES
+from transaction import Transaction
+
+_logger = getLogger(f'app.{__name__}')
+
+# Files larger than this (or compressed) are read as a stream instead of at once.
+DEFAULT_STREAM_SIZE = 16 * 1024 * 1024
+
+# Bytes read at a time from a streamed file.
+CHUNK_SIZE = 64 * 1024
+
+# Decides before a Transaction is created: accept(pair, transaction dict)
+Accept = Callable[[str, dict], bool]
+
+def should_stream(file: Path, stream_size: int|None = DEFAULT_STREAM_SIZE) -> bool:
+    if stream_size is None or portfolio_suffix(file) not in ('.json', '.yml'):
+        return False
+    return file.suffix in COMPRESSED_SUFFIXES or file.stat().st_size > stream_size
+
+def _add_transaction(transactions: list[Transaction], source: str, pair: str, d: dict, accept: Accept|None):
+    if d.get('ignore'):
+        return
+    if accept is not None and not accept(pair, d):
+        return
+    transactions.append(Transaction(source=source, pair=pair, d=d))
+
+def _set_states(transactions: list[Transaction], state: str|None):
+    for transaction in transactions:
+        if state is not None and transaction.state is None:
+            transaction.state = state
+
+        if transaction.state is None:
+            if transaction.ttype == 'buy':
+                transaction.state = 'open'
+
+def data_transactions(file: Path, raw_data: dict, accept: Accept|None = None) -> list[Transaction]:
+    transactions = []
+
+    if 'ignore' in raw_data:
+        if raw_data['ignore']:
+            return transactions
+
+    if 'sources' not in raw_data:
+        raise ValueError(f'No sources-field found in file: {file}')
+
+    for source in raw_data['sources']:
+        if 'pairs' in source:
+            pairs = source['pairs']
+        if 'ignore' in source:
+            if source['ignore']:
+                continue
+
+        for pair in pairs:
+            if 'ignore' in pair and pair['ignore']:
+                continue
+
+            start = len(transactions)
+            for transaction_j in pair['transactions']:
+                _add_transaction(transactions, source['source'], pair['pair'], transaction_j, accept)
+
+            _set_states(transactions[start:], pair.get('state'))
+
+    return transactions
+
+class _JsonReader():
+    # Pulls a JSON document apart one value at a time, only the current
+    # value has to fit into the buffer.
+    def __init__(self, f: BinaryIO):
+        self.f = io.TextIOWrapper(f, encoding='utf-8')
+        self.buf = ''
+        self.pos = 0
+        self.eof = False
+        self.decoder = JSONDecoder()
+
+    def _fill(self) -> bool:
+        if self.eof:
+            return False
+
+        # Large values are read in growing chunks, not parsed again for every chunk.
+        chunk = self.f.read(max(CHUNK_SIZE, len(self.buf) - self.pos))
+        if chunk == '':
+            self.eof = True
+            return False
+
+        self.buf = self.buf[self.pos:] + chunk
+        self.pos = 0
+        return True
+
+    def _peek(self) -> str:
+        while True:
+            while self.pos < len(self.buf) and self.buf[self.pos] in ' \t\r\n':
+                self.pos += 1
+            if self.pos < len(self.buf):
+                return self.buf[self.pos]
+            if not self._fill():
+                return ''
+
+    def _expect(self, c: str):
+        if self._peek() != c:
+            raise ValueError(f'Invalid JSON: expected {c!r}, got {self._peek()!r}')
+        self.pos += 1
+
+    def is_map(self) -> bool:
+        return self._peek() == '{'
+
+    def is_list(self) -> bool:
+        return self._peek() == '['
+
+    def value(self):
+        self._peek()
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.buf, self.pos)
+            except ValueError:
+                if not self._fill():
+                    raise
+                continue
+
+            # A number at the end of the buffer may go on in the next chunk.
+            if end == len(self.buf) and self._fill():
+                continue
+
+            self.pos = end
+            return value
+
+    def map_keys(self):
+        # Yields the keys, the caller reads every value before the next key.
+        self._expect('{')
+        if self._peek() == '}':
+            self.pos += 1
+            return
+        while True:
+            key = self.value()
+            self._expect(':')
+            yield key
+
+            c = self._peek()
+            self.pos += 1
+            if c == '}':
+                return
+            if c != ',':
+                raise ValueError(f'Invalid JSON: expected \',\' or \'}}\', got {c!r}')
+
+    def list_items(self):
+        self._expect('[')
+        if self._peek() == ']':
+            self.pos += 1
+            return
+        while True:
+            yield
+
+            c = self._peek()
+            self.pos += 1
+            if c == ']':
+                return
+            if c != ',':
+                raise ValueError(f'Invalid JSON: expected \',\' or \']\', got {c!r}')
+
+def _yaml_loader(f: BinaryIO):
+    # Events from libyaml if available, composing and constructing is the same as SafeLoader.
+    import yaml
+    try:
+        from yaml.cyaml import CParser
+    except ImportError:
+        return yaml.SafeLoader(f)
+
+    from yaml.composer import Composer
+    from yaml.constructor import SafeConstructor
+    from yaml.resolver import Resolver
+
+    class _CSafeEventLoader(CParser, Composer, SafeConstructor, Resolver):
+        def __init__(self, stream):
+            CParser.__init__(self, stream)
+            Composer.__init__(self)
+            SafeConstructor.__init__(self)
+            Resolver.__init__(self)
+
+    return _CSafeEventLoader(f)
+
+class _YamlReader():
+    # Walks the YAML events, only single values are composed and constructed.
+    def __init__(self, f: BinaryIO):
+        import yaml
+
+        self.yaml = yaml
+        self.loader = _yaml_loader(f)
+        self.loader.get_event() # StreamStart
+        self.loader.get_event() # DocumentStart
+
+    def is_map(self) -> bool:
+        return self.loader.check_event(self.yaml.MappingStartEvent)
+
+    def is_list(self) -> bool:
+        return self.loader.check_event(self.yaml.SequenceStartEvent)
+
+    def value(self):
+        node = self.loader.compose_node(None, None)
+        value = self.loader.construct_object(node, deep=True)
+
+        # The loader keeps every constructed object until the end of the document.
+        self.loader.constructed_objects = {}
+        self.loader.recursive_objects = {}
+        return value
+
+    def map_keys(self):
+        self.loader.get_event()
+        while not self.loader.check_event(self.yaml.MappingEndEvent):
+            yield self.value()
+        self.loader.get_event()
+
+    def list_items(self):
+        self.loader.get_event()
+        while not self.loader.check_event(self.yaml.SequenceEndEvent):
+            yield
+        self.loader.get_event()
+
+def portfolio_reader(file: Path, f: BinaryIO) -> _JsonReader|_YamlReader:
+    # Pull reader for an opened portfolio file: is_map(), is_list(), map_keys(), list_items() and value().
+    if portfolio_suffix(file) == '.json':
+        return _JsonReader(f)
+    return _YamlReader(f)
+
+def stream_transactions(file: Path, accept: Accept|None = None) -> list[Transaction]:
+    # Same result as data_transactions(), without having the whole file in memory.
+    # Keys may come in any order: transactions are dropped when their pair, source
+    # or file turns out to be ignored, and get their source and state at the end.
+    _logger.debug(f'stream: {file}')
+
+    transactions = []
+    ignore = False
+    has_sources = False
+    with open_portfolio_file(file) as f:
+        reader = portfolio_reader(file, f)
+        if not reader.is_map():
+            raise ValueError(f'No sources-field found in file: {file}')
+
+        for key in reader.map_keys():
+            if key == 'sources' and reader.is_list():
+                has_sources = True
+                for _ in reader.list_items():
+                    _stream_source(reader, transactions, accept)
+            elif key == 'ignore':
+                ignore = reader.value()
+            else:
+                reader.value()
+
+    if ignore:
+        return []
+    if not has_sources:
+        raise ValueError(f'No sources-field found in file: {file}')
+    return transactions
+
+def _stream_source(reader: _JsonReader|_YamlReader, transactions: list[Transaction], accept: Accept|None):
+    start = len(transactions)
+    source = None
+    ignore = False
+    for key in reader.map_keys():
+        if key == 'pairs' and reader.is_list():
+            for _ in reader.list_items():
+                _stream_pair(reader, transactions, accept, source)
+        elif key == 'source':
+            source = reader.value()
+        elif key == 'ignore':
+            ignore = reader.value()
+        else:
+            reader.value()
+
+    if ignore:
+        del transactions[start:]
+        return
+
+    if source is None and len(transactions) > start:
+        raise ValueError('No source-field found in source')
+    for transaction in transactions[start:]:
+        if transaction.source is None:
+            transaction.source = source
+
+def _stream_pair(reader: _JsonReader|_YamlReader, transactions: list[Transaction], accept: Accept|None, source: str|None):
+    start = len(transactions)
+    pair = None
+    state = None
+    ignore = False
+
+    # Transactions before the name of the pair have to wait for it.
+    waiting = []
+    for key in reader.map_keys():
+        if key == 'transactions' and reader.is_list():
+            for _ in reader.list_items():
+                transaction_j = reader.value()
+                if pair is None:
+                    waiting.append(transaction_j)
+                else:
+                    _add_transaction(transactions, source, pair, transaction_j, accept)
+        elif key == 'pair':
+            pair = reader.value()
+            for transaction_j in waiting:
+                _add_transaction(transactions, source, pair, transaction_j, accept)
+            waiting = []
+        elif key == 'state':
+            state = reader.value()
+        elif key == 'ignore':
+            ignore = reader.value()
+        else:
+            reader.value()
+
+    if ignore:
+        del transactions[start:]
+        return
+    if len(waiting) > 0:
+        raise ValueError('No pair-field found in pair')
+
+    _set_states(transactions[start:], state)
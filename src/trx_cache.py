@@ -0,0 +1,164 @@
+
+import os
+import struct
+from hashlib import sha1, sha256
+from logging import getLogger
+from pathlib import Path
+from portfolio_file import parse_portfolio_file
+from compiled import COMPILED_SUFFIX, compile_portfolio, decode_portfolio
+
+_logger = getLogger(f'app.{__name__}')
+
+CACHE_VERSION = 2
+DEFAULT_MAX_SIZE = 256 * 1024 * 1024
+
+# Cache entry: magic, version, mtime, size and sha256 of the portfolio
+# file, followed by the parsed data as compiled portfolio (.bpc).
+ENTRY_SUFFIX = '.entry'
+_ENTRY_MAGIC = b'BTRC'
+_ENTRY_HEADER = struct.Struct('<4sIqQ32s')
+
+class TrxCache():
+    path: Path
+    max_size: int
+    rebuild: bool
+    hits: int
+    misses: int
+
+    def __init__(self, path: Path, max_size: int = DEFAULT_MAX_SIZE, rebuild: bool = False):
+        self.path = path
+        self.max_size = max_size
+        self.rebuild = rebuild
+        self.hits = 0
+        self.misses = 0
+
+        self.path.mkdir(parents=True, exist_ok=True)
+
+    def load(self, file: Path) -> dict:
+        if file.suffix == COMPILED_SUFFIX:
+            # Compiled files are already faster to load than a cache entry.
+            return parse_portfolio_file(file)
+
+        file = file.resolve()
+        entry_path = self._entry_path(file)
+        stat = file.stat()
+
+        entry = None
+        if not self.rebuild:
+            entry = self._read_entry(entry_path)
+
+        if entry is not None and entry[0] == stat.st_mtime_ns and entry[1] == stat.st_size:
+            raw_data = self._decode_entry(entry_path, entry[3])
+            if raw_data is not None:
+                _logger.debug(f'cache hit: {file}')
+                self.hits += 1
+                self._touch(entry_path)
+                return raw_data
+            entry = None
+
+        data = file.read_bytes()
+        digest = sha256(data).digest()
+
+        raw_data = None
+        if entry is not None and entry[2] == digest:
+            # Only the mtime changed, the content is the same.
+            raw_data = self._decode_entry(entry_path, entry[3])
+
+        if raw_data is None:
+            _logger.debug(f'cache miss: {file}')
+            self.misses += 1
+            raw_data = parse_portfolio_file(file, data)
+            payload = self._encode(file, raw_data)
+            if payload is None:
+                return raw_data
+        else:
+            _logger.debug(f'cache hit (digest): {file}')
+            self.hits += 1
+            payload = entry[3]
+
+        self._write_entry(entry_path, _ENTRY_HEADER.pack(_ENTRY_MAGIC, CACHE_VERSION, stat.st_mtime_ns, stat.st_size, digest) + payload)
+
+        return raw_data
+
+    def evict(self):
+        entries = []
+        total_size = 0
+        for entry_path in self.path.glob(f'*{ENTRY_SUFFIX}'):
+            try:
+                stat = entry_path.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime_ns, stat.st_size, entry_path))
+            total_size += stat.st_size
+
+        if total_size <= self.max_size:
+            return
+
+        # Least recently used first.
+        entries.sort()
+        for mtime, size, entry_path in entries:
+            if total_size <= self.max_size:
+                break
+
+            _logger.debug(f'cache evict: {entry_path}')
+            entry_path.unlink(missing_ok=True)
+            total_size -= size
+
+    def _entry_path(self, file: Path) -> Path:
+        key = sha1(str(file).encode('utf-8')).hexdigest()
+        return self.path / f'{key}{ENTRY_SUFFIX}'
+
+    def _read_entry(self, entry_path: Path) -> tuple[int, int, bytes, memoryview]|None:
+        try:
+            data = entry_path.read_bytes()
+        except FileNotFoundError:
+            return None
+
+        if len(data) < _ENTRY_HEADER.size:
+            _logger.warning(f'cache entry broken: {entry_path}')
+            return None
+
+        magic, version, mtime, size, digest = _ENTRY_HEADER.unpack_from(data)
+        if magic != _ENTRY_MAGIC or version != CACHE_VERSION:
+            return None
+
+        return mtime, size, digest, memoryview(data)[_ENTRY_HEADER.size:]
+
+    def _decode_entry(self, entry_path: Path, payload: memoryview) -> dict|None:
+        try:
+            return decode_portfolio(payload)
+        except (ValueError, TypeError, IndexError) as error:
+            _logger.warning(f'cache entry broken: {entry_path}: {error}')
+            return None
+
+    def _encode(self, file: Path, raw_data: dict) -> bytes|None:
+        try:
+            payload = compile_portfolio(raw_data)
+        except (ValueError, TypeError) as error:
+            _logger.debug(f'cache skip: {file}: {error}')
+            return None
+
+        # Values without a column in the compiled format (e.g. YAML dates)
+        # don't come back the same, such files are not cached.
+        if decode_portfolio(payload) != raw_data:
+            _logger.debug(f'cache skip: {file}: not representable')
+            return None
+
+        return payload
+
+    def _write_entry(self, entry_path: Path, entry: bytes):
+        tmp_path = entry_path.with_suffix(f'.{os.getpid()}.tmp')
+        try:
+            with open(tmp_path, 'wb') as f:
+                f.write(entry)
+            os.replace(tmp_path, entry_path)
+        except OSError as error:
+            # The file was parsed, a missing cache entry only costs time next run.
+            _logger.warning(f'cache write failed: {entry_path}: {error}')
+            tmp_path.unlink(missing_ok=True)
+
+    def _touch(self, entry_path: Path):
+        try:
+            os.utime(entry_path)
+        except FileNotFoundError:
+            pass
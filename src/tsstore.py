@@ -0,0 +1,376 @@
+#!/usr/bin/env python3
+
+import os
+import mmap
+import fcntl
+import struct
+from argparse import ArgumentParser
+from bisect import bisect_left, bisect_right
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from logging import getLogger
+from pathlib import Path
+from time import time
+from urllib.parse import quote, unquote
+from helper import default_data_dir
+
+_logger = getLogger(f'app.{__name__}')
+
+# Quote time-series store
+#
+# One file per convert and symbol: <path>/<convert>/<symbol>.ts
+# All values are little-endian. The header is followed by fixed-width records:
+#
+#   header   magic, version, record_size                                 (16 bytes)
+#   f64      time, price, volume_24h, volume_change_24h,
+#            percent_change_24h, market_cap_dominance                    [n_records]
+#
+# time is the quote's last_updated in seconds since the epoch (UTC). Records are
+# sorted by time and unique, so the time column is the index: a range is found by
+# bisecting the mmap'ed file. Values which are not set are stored as NaN.
+
+STORE_SUFFIX = '.ts'
+MAGIC = b'BTS1'
+VERSION = 1
+
+FIELDS = ('time', 'price', 'volume_24h', 'volume_change_24h', 'percent_change_24h', 'market_cap_dominance')
+
+_HEADER = struct.Struct('<4sHH8x')
+_RECORD = struct.Struct('<' + 'd' * len(FIELDS))
+_TIME = struct.Struct('<d')
+
+_NAN = float('nan')
+
+Record = tuple[float, ...]
+
+def parse_time(value) -> float|None:
+    if value is None:
+        return None
+    if isinstance(value, (int, float)):
+        return float(value)
+
+    try:
+        dt = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    except (AttributeError, ValueError):
+        return None
+
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+    return dt.timestamp()
+
+def quote_record(quote: dict) -> Record|None:
+    # A quote without last_updated (file provider, ...) can't be placed in time.
+    record_time = parse_time(quote.get('last_updated'))
+    if record_time is None or quote.get('price') is None:
+        return None
+
+    values = [record_time]
+    for field in FIELDS[1:]:
+        value = quote.get(field)
+        values.append(_NAN if value is None else float(value))
+    return tuple(values)
+
+class _TimeColumn():
+    # Sequence view of the time column of a mapped file, for bisect.
+    def __init__(self, buf: mmap.mmap, count: int):
+        self.buf = buf
+        self.count = count
+
+    def __len__(self) -> int:
+        return self.count
+
+    def __getitem__(self, n: int) -> float:
+        return _TIME.unpack_from(self.buf, _HEADER.size + n * _RECORD.size)[0]
+
+@contextmanager
+def _locked(path: Path):
+    # Compaction replaces files. A writer has to hold the lock on the file
+    # which is currently at path, not on one which was replaced meanwhile.
+    while True:
+        fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+        fcntl.flock(fd, fcntl.LOCK_EX)
+        try:
+            if os.stat(path).st_ino == os.fstat(fd).st_ino:
+                break
+        except FileNotFoundError:
+            pass
+        os.close(fd)
+
+    try:
+        yield fd
+    finally:
+        os.close(fd)
+
+def _check_header(header: bytes, path: Path):
+    magic, version, record_size = _HEADER.unpack(header)
+    if magic != MAGIC or version != VERSION or record_size != _RECORD.size:
+        raise ValueError(f'Not a quote store file (version {VERSION}): {path}')
+
+class QuoteStore():
+    path: Path
+    retention: float|None
+    resolution: float|None
+    resolution_after: float
+    appended: int
+
+    def __init__(self, path: Path, retention: float|None = None, resolution: float|None = None, resolution_after: float = 0.0):
+        self.path = path
+        self.retention = retention
+        self.resolution = resolution
+        self.resolution_after = resolution_after
+        self.appended = 0
+
+    def file(self, convert: str, symbol: str) -> Path:
+        return self.path / quote(convert, safe='') / (quote(symbol, safe='') + STORE_SUFFIX)
+
+    def converts(self) -> list[str]:
+        if not self.path.is_dir():
+            return []
+        return sorted(unquote(path.name) for path in self.path.iterdir() if path.is_dir())
+
+    def symbols(self, convert: str) -> list[str]:
+        cpath = self.path / quote(convert, safe='')
+        if not cpath.is_dir():
+            return []
+        return sorted(unquote(path.name[:-len(STORE_SUFFIX)]) for path in cpath.glob(f'*{STORE_SUFFIX}'))
+
+    def append(self, convert: str, symbol: str, records: list[Record]) -> int:
+        if len(records) == 0:
+            return 0
+
+        path = self.file(convert, symbol)
+        path.parent.mkdir(parents=True, exist_ok=True)
+
+        with _locked(path) as fd:
+            size = os.fstat(fd).st_size
+            if size < _HEADER.size:
+                os.pwrite(fd, _HEADER.pack(MAGIC, VERSION, _RECORD.size), 0)
+                size = _HEADER.size
+            else:
+                _check_header(os.pread(fd, _HEADER.size, 0), path)
+
+            # Drop what is left of an interrupted write.
+            end = _HEADER.size + (size - _HEADER.size) // _RECORD.size * _RECORD.size
+            if end != size:
+                os.ftruncate(fd, end)
+
+            last = None
+            if end > _HEADER.size:
+                last = _TIME.unpack(os.pread(fd, _TIME.size, end - _RECORD.size))[0]
+
+            # Records are only appended, a quote which is not newer than the
+            # last one was stored already (the same last_updated fetched again).
+            new = []
+            for record in sorted(records):
+                if last is None or record[0] > last:
+                    new.append(record)
+                    last = record[0]
+
+            if len(new) > 0:
+                os.pwrite(fd, b''.join(_RECORD.pack(*record) for record in new), end)
+
+        self.appended += len(new)
+        return len(new)
+
+    def append_response(self, convert: str, data: dict[str, list]) -> int:
+        # data is the 'data' part of a CMC quotes response.
+        appended = 0
+        for symbol, sdata in data.items():
+            if len(sdata) == 0:
+                continue
+
+            quote_data = sdata[0].get('quote', {}).get(convert)
+            if quote_data is None:
+                continue
+
+            record = quote_record(quote_data)
+            if record is not None:
+                appended += self.append(convert, symbol, [record])
+        return appended
+
+    @contextmanager
+    def _mapped(self, convert: str, symbol: str):
+        path = self.file(convert, symbol)
+        try:
+            f = open(path, 'rb')
+        except FileNotFoundError:
+            yield None, 0
+            return
+
+        with f:
+            count = (os.fstat(f.fileno()).st_size - _HEADER.size) // _RECORD.size
+            if count <= 0:
+                yield None, 0
+                return
+
+            _check_header(f.read(_HEADER.size), path)
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as buf:
+                yield buf, count
+
+    def info(self, convert: str, symbol: str) -> tuple[int, float|None, float|None]:
+        # Number of records and the time of the first and the last one.
+        with self._mapped(convert, symbol) as (buf, count):
+            if buf is None:
+                return 0, None, None
+
+            times = _TimeColumn(buf, count)
+            return count, times[0], times[count - 1]
+
+    def range(self, convert: str, symbol: str, start: float|None = None, end: float|None = None) -> list[Record]:
+        with self._mapped(convert, symbol) as (buf, count):
+            if buf is None:
+                return []
+
+            times = _TimeColumn(buf, count)
+            lo = 0 if start is None else bisect_left(times, start)
+            hi = count if end is None else bisect_right(times, end)
+            if lo >= hi:
+                return []
+
+            return list(_RECORD.iter_unpack(buf[_HEADER.size + lo * _RECORD.size:_HEADER.size + hi * _RECORD.size]))
+
+    def latest(self, convert: str, symbol: str, at: float|None = None) -> Record|None:
+        with self._mapped(convert, symbol) as (buf, count):
+            if buf is None:
+                return None
+
+            n = count if at is None else bisect_right(_TimeColumn(buf, count), at)
+            if n == 0:
+                return None
+            return _RECORD.unpack_from(buf, _HEADER.size + (n - 1) * _RECORD.size)
+
+    def compact(self, now: float|None = None) -> tuple[int, int]:
+        # Applies the retention and thins out old records to one per resolution
+        # seconds. Returns the number of records kept and removed.
+        if now is None:
+            now = time()
+
+        kept_c = 0
+        removed_c = 0
+        for convert in self.converts():
+            for symbol in self.symbols(convert):
+                kept, removed = self._compact_file(self.file(convert, symbol), now)
+                kept_c += kept
+                removed_c += removed
+        return kept_c, removed_c
+
+    def _compact_file(self, path: Path, now: float) -> tuple[int, int]:
+        with _locked(path) as fd:
+            size = os.fstat(fd).st_size
+            if size < _HEADER.size:
+                os.unlink(path)
+                return 0, 0
+
+            _check_header(os.pread(fd, _HEADER.size, 0), path)
+            data = os.pread(fd, size - _HEADER.size, _HEADER.size)
+            records = list(_RECORD.iter_unpack(data[:len(data) // _RECORD.size * _RECORD.size]))
+
+            kept = []
+            for record in records:
+                if self.retention is not None and record[0] < now - self.retention:
+                    continue
+
+                if self.resolution is not None and record[0] < now - self.resolution_after and len(kept) > 0:
+                    # Keep the last record of each resolution bucket.
+                    if kept[-1][0] // self.resolution == record[0] // self.resolution:
+                        kept[-1] = record
+                        continue
+                kept.append(record)
+
+            removed = len(records) - len(kept)
+            if removed == 0:
+                return len(kept), 0
+
+            if len(kept) == 0:
+                os.unlink(path)
+                return 0, removed
+
+            tmp_path = path.with_suffix(f'.{os.getpid()}.tmp')
+            with open(tmp_path, 'wb') as f:
+                f.write(_HEADER.pack(MAGIC, VERSION, _RECORD.size))
+                f.write(b''.join(_RECORD.pack(*record) for record in kept))
+            os.replace(tmp_path, path)
+
+        return len(kept), removed
+
+def create_quote_store(config: dict, enabled: bool|None = None) -> QuoteStore|None:
+    # Appending is opt-in with quote_store.enabled, enabled (--quote-store)
+    # overrides the config. Reading an existing store passes enabled=True.
+    store_config = config.get('quote_store', {})
+    if enabled is None:
+        enabled = store_config.get('enabled', False)
+    if not enabled:
+        return None
+
+    if 'path' in store_config:
+        path = Path(store_config['path'])
+    else:
+        path = default_data_dir('quotes')
+
+    return QuoteStore(
+        path,
+        retention=store_config.get('retention'),
+        resolution=store_config.get('resolution'),
+        resolution_after=store_config.get('resolution_after', 0.0),
+    )
+
+def _format_time(value: float) -> str:
+    return datetime.fromtimestamp(value, timezone.utc).strftime('%Y-%m-%d %H:%M:%S')
+
+def main():
+    parser = ArgumentParser(prog='tsstore', description='Quote time-series store')
+    parser.add_argument('-c', '--config', type=str, nargs='?', required=False, help='Path to Config File (YAML or JSON)')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    subparsers.add_parser('info', help='List stored symbols')
+
+    range_parser = subparsers.add_parser('range', help='Print the records of a symbol')
+    range_parser.add_argument('convert', type=str, help='Convert symbol')
+    range_parser.add_argument('symbol', type=str, help='Symbol')
+    range_parser.add_argument('--start', type=str, nargs='?', required=False, help='From date/time (ISO 8601, UTC)')
+    range_parser.add_argument('--end', type=str, nargs='?', required=False, help='To date/time (ISO 8601, UTC)')
+
+    compact_parser = subparsers.add_parser('compact', help='Apply retention and resolution (see quote_store in config)')
+    compact_parser.add_argument('--retention', type=float, nargs='?', required=False, help='Remove records older than this many seconds')
+    compact_parser.add_argument('--resolution', type=float, nargs='?', required=False, help='Keep one record per this many seconds')
+    compact_parser.add_argument('--resolution-after', type=float, nargs='?', required=False, help='Only for records older than this many seconds')
+
+    args = parser.parse_args()
+
+    config = {}
+    if args.config is not None:
+        from yaml import safe_load
+        with open(args.config, 'r') as f:
+            config = safe_load(f) or {}
+
+    store = create_quote_store(config, enabled=True)
+
+    if args.command == 'info':
+        print(f'-> quote store: {store.path}')
+        for convert in store.converts():
+            for symbol in store.symbols(convert):
+                records, first, last = store.info(convert, symbol)
+                if records == 0:
+                    continue
+                print(f'{convert:5s} {symbol:8s} {records:>8d} {_format_time(first)} - {_format_time(last)}')
+
+    elif args.command == 'range':
+        start = None if args.start is None else parse_time(args.start)
+        end = None if args.end is None else parse_time(args.end)
+        print(' '.join(FIELDS))
+        for record in store.range(args.convert, args.symbol, start, end):
+            print(_format_time(record[0]), ' '.join(str(value) for value in record[1:]))
+
+    elif args.command == 'compact':
+        if args.retention is not None:
+            store.retention = args.retention
+        if args.resolution is not None:
+            store.resolution = args.resolution
+        if args.resolution_after is not None:
+            store.resolution_after = args.resolution_after
+
+        kept, removed = store.compact()
+        print(f'-> compacted: {kept} records kept, {removed} removed')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,153 @@
+
+import numpy as np
+from logging import getLogger
+from spot import Spot
+from quotes import Quotes
+from quote_matrix import QuoteMatrix
+from transaction import Transaction
+
+_logger = getLogger(f'app.{__name__}')
+
+class _QuoteIndex():
+    keys: dict[tuple[str, str], int]
+
+    def __init__(self):
+        self.keys = {}
+
+    def index(self, convert: str, symbol: str) -> int:
+        key = (convert, symbol)
+        if key not in self.keys:
+            self.keys[key] = len(self.keys)
+        return self.keys[key]
+
+    def values(self, quotes: Quotes|QuoteMatrix) -> list[float]:
+        if isinstance(quotes, QuoteMatrix):
+            return quotes.get_many([convert for convert, _ in self.keys], [symbol for _, symbol in self.keys]).tolist()
+        return [quotes.get(convert, symbol) for convert, symbol in self.keys]
+
+def valuate_transactions(transactions: list[Transaction], quotes: Quotes|QuoteMatrix, convert: str, detail: bool = True):
+    _logger.debug(f'valuate_transactions({len(transactions)})')
+
+    qindex = _QuoteIndex()
+
+    # Pair transactions
+    pair_trxs = []
+    p_is_cross = []
+    p_is_sell = []
+    p_sell_q = []
+    p_buy_q = []
+    p_target = []
+    p_has_target = []
+    p_cquote_i = []
+    p_sell_quote_i = []
+    p_buy_quote_i = []
+
+    # Spot transactions
+    spot_trxs = []
+    s_is_out = []
+    s_q = []
+    s_quote_i = []
+
+    for transaction in transactions:
+        if transaction.is_pair:
+            sell_symbol = transaction.sell_symbol
+            buy_symbol = transaction.buy_symbol
+
+            if sell_symbol == convert:
+                is_cross = False
+                has_target = bool(transaction.target_f)
+                cquote_i = qindex.index(convert, buy_symbol)
+                sell_quote_i = cquote_i
+            elif buy_symbol == convert:
+                raise NotImplementedError()
+            else:
+                is_cross = True
+                has_target = bool(transaction.target)
+                cquote_i = qindex.index(sell_symbol, buy_symbol)
+                sell_quote_i = qindex.index(convert, sell_symbol)
+
+            pair_trxs.append(transaction)
+            p_is_cross.append(is_cross)
+            p_is_sell.append(transaction.ttype == 'sell')
+            p_sell_q.append(transaction.sell_quantity)
+            p_buy_q.append(transaction.quantity)
+            p_has_target.append(has_target)
+            p_target.append(transaction.target_f if has_target else 0.0)
+            p_cquote_i.append(cquote_i)
+            p_sell_quote_i.append(sell_quote_i)
+            p_buy_quote_i.append(qindex.index(convert, buy_symbol))
+        else:
+            if transaction.ttype not in ('in', 'out'):
+                raise ValueError(f'Unknown Transaction type: {transaction.ttype}')
+
+            spot_trxs.append(transaction)
+            s_is_out.append(transaction.ttype == 'out')
+            s_q.append(transaction.quantity)
+            s_quote_i.append(qindex.index(convert, transaction.pair_s))
+
+    # The quotes are kept as they are for display, the vector is used for arithmetic.
+    qlist = qindex.values(quotes)
+    qvec = np.array(qlist, dtype=np.float64)
+
+    if len(pair_trxs) > 0:
+        is_cross = np.array(p_is_cross, dtype=bool)
+        is_sell = np.array(p_is_sell, dtype=bool)
+        sell_q = np.array(p_sell_q, dtype=np.float64)
+        buy_q = np.array(p_buy_q, dtype=np.float64)
+
+        cquote = qvec[np.array(p_cquote_i, dtype=np.intp)]
+        sell_quote = qvec[np.array(p_sell_quote_i, dtype=np.intp)]
+        buy_quote = qvec[np.array(p_buy_quote_i, dtype=np.intp)]
+
+        # Pairs with the convert symbol as sell symbol take the sell quantity as value.
+        sell_value = np.where(is_cross, sell_quote * sell_q, sell_q)
+        buy_value = buy_quote * buy_q
+        profit = np.where(is_sell, sell_value - buy_value, buy_value - sell_value)
+        target = cquote - np.array(p_target, dtype=np.float64)
+
+        profit_l = profit.tolist()
+        if detail:
+            sell_value_l = sell_value.tolist()
+            buy_value_l = buy_value.tolist()
+            target_l = target.tolist()
+
+        for n, transaction in enumerate(pair_trxs):
+            transaction.profit = profit_l[n]
+
+            # Without detail the Pair of a transaction isn't created.
+            if not detail:
+                continue
+
+            pair = transaction.pair
+            pair.profit = profit_l[n]
+            transaction.cprice = qlist[p_buy_quote_i[n]]
+            pair.value = buy_value_l[n]
+            pair.buy_spot.value = buy_value_l[n]
+            if p_is_cross[n]:
+                pair.sell_spot.value = sell_value_l[n]
+            else:
+                pair.sell_spot.value = pair.sell_spot.quantity
+
+            if transaction.state == 'open':
+                target_spot = Spot(s=pair.sell_spot.symbol)
+                if p_has_target[n]:
+                    target_spot.value = target_l[n]
+                transaction.target_spot = target_spot
+
+    if len(spot_trxs) > 0:
+        quote = qvec[np.array(s_quote_i, dtype=np.intp)]
+        value = quote * np.array(s_q, dtype=np.float64)
+        profit = np.where(np.array(s_is_out, dtype=bool), -value, value)
+
+        profit_l = profit.tolist()
+        if detail:
+            value_l = value.tolist()
+
+        for n, transaction in enumerate(spot_trxs):
+            transaction.profit = profit_l[n]
+
+            if detail:
+                spot = transaction.spot
+                spot.profit = profit_l[n]
+                spot.value = value_l[n]
+                spot.price = qlist[s_quote_i[n]]
@@ -0,0 +1,135 @@
+
+import os
+from time import sleep
+from logging import getLogger
+from pathlib import Path
+from portfolio_file import is_portfolio_file
+
+try:
+    from inotify_simple import INotify, flags
+except ImportError:
+    INotify = None
+
+_logger = getLogger(f'app.{__name__}')
+
+class Changes():
+    files: set[Path]
+    dirs: bool
+
+    def __init__(self):
+        self.files = set()
+        self.dirs = False
+
+    def __repr__(self):
+        return f'Changes[f={len(self.files)},d={self.dirs}]'
+
+    def __bool__(self):
+        return self.dirs or len(self.files) > 0
+
+class PollingWatcher():
+    path: Path
+    interval: float
+    files: dict[Path, tuple[int, int]]
+    dirs: set[Path]
+
+    def __init__(self, path: Path, interval: float = 1.0):
+        self.path = path
+        self.interval = interval
+        self.files, self.dirs = self._snapshot()
+
+    def poll(self) -> Changes:
+        sleep(self.interval)
+
+        files, dirs = self._snapshot()
+
+        changes = Changes()
+        changes.dirs = dirs != self.dirs
+        for file in files.keys() | self.files.keys():
+            if files.get(file) != self.files.get(file):
+                changes.files.add(file)
+
+        self.files = files
+        self.dirs = dirs
+
+        return changes
+
+    def close(self):
+        pass
+
+    def _snapshot(self) -> tuple[dict[Path, tuple[int, int]], set[Path]]:
+        files = {}
+        dirs = set()
+
+        def scan(path: str):
+            dirs.add(Path(path))
+            with os.scandir(path) as it:
+                for entry in it:
+                    if entry.is_dir():
+                        scan(entry.path)
+                    elif entry.is_file() and is_portfolio_file(Path(entry.name)):
+                        stat = entry.stat()
+                        files[Path(entry.path)] = (stat.st_mtime_ns, stat.st_size)
+
+        scan(str(self.path))
+        return files, dirs
+
+class InotifyWatcher():
+    path: Path
+    interval: float
+    watches: dict[int, Path]
+
+    def __init__(self, path: Path, interval: float = 1.0):
+        self.path = path
+        self.interval = interval
+        self.inotify = INotify()
+        self.watches = {}
+        self._add_watches(path)
+
+    def poll(self) -> Changes:
+        changes = Changes()
+
+        events = self.inotify.read(timeout=int(self.interval * 1000))
+        if len(events) > 0:
+            # Editors write files in several steps, collect them into one update.
+            events += self.inotify.read(timeout=50)
+
+        for event in events:
+            if event.wd not in self.watches:
+                continue
+
+            if event.mask & flags.IGNORED:
+                del self.watches[event.wd]
+                continue
+
+            path = self.watches[event.wd] / event.name
+            if event.mask & flags.ISDIR or event.mask & flags.DELETE_SELF:
+                changes.dirs = True
+            elif is_portfolio_file(path):
+                changes.files.add(path)
+
+        if changes.dirs:
+            self._add_watches(self.path)
+
+        return changes
+
+    def close(self):
+        self.inotify.close()
+
+    def _add_watches(self, path: Path):
+        watch_flags = flags.CLOSE_WRITE | flags.CREATE | flags.DELETE | flags.MOVED_FROM | flags.MOVED_TO | flags.DELETE_SELF
+        wd = self.inotify.add_watch(path, watch_flags)
+        self.watches[wd] = path
+
+        with os.scandir(path) as it:
+            for entry in it:
+                if entry.is_dir():
+                    self._add_watches(Path(entry.path))
+
+def create_watcher(path: Path, interval: float = 1.0) -> PollingWatcher|InotifyWatcher:
+    if INotify is not None:
+        try:
+            return InotifyWatcher(path, interval)
+        except OSError as error:
+            _logger.warning(f'inotify not available, using polling: {error}')
+
+    return PollingWatcher(path, interval)
@@ -0,0 +1,5 @@
+import sys
+from pathlib import Path
+
+# The modules in src/ are imported by their bare name, like the scripts do.
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / 'src'))
@@ -0,0 +1,112 @@
+import io
+import re
+from frame import Frame, FrameRenderer, RESET
+
+_ESCAPE = re.compile(r'\033\[(\d+);(\d+)H|\033\[[0-9;]*m')
+
+def apply(screen: dict[tuple[int, int], tuple[str, str]], output: str):
+    # Minimal terminal: cursor moves, styles and printable characters.
+    row, col = 0, 0
+    style = ''
+    pos = 0
+    while pos < len(output):
+        match = _ESCAPE.match(output, pos)
+        if match is not None:
+            if match.group(1) is not None:
+                row, col = int(match.group(1)) - 1, int(match.group(2)) - 1
+            elif match.group(0) == RESET:
+                style = ''
+            else:
+                style += match.group(0)
+            pos = match.end()
+            continue
+
+        screen[(row, col)] = (output[pos], style)
+        col += 1
+        pos += 1
+
+def visible(cells: dict) -> dict[tuple[int, int], tuple[str, str]]:
+    return {pos: cell for pos, cell in cells.items() if cell[0] != ' '}
+
+def frame_cells(frame: Frame) -> dict[tuple[int, int], tuple[str, str]]:
+    return visible({(row, col): cell for row, cells in frame.rows.items() for col, cell in enumerate(cells)})
+
+def render(renderer: FrameRenderer, screen: dict, frame: Frame) -> str:
+    out = renderer.out
+    out.seek(0)
+    out.truncate()
+    renderer.render(frame)
+    apply(screen, out.getvalue())
+    return out.getvalue()
+
+def test_render_changes():
+    renderer = FrameRenderer(io.StringIO())
+    screen = {}
+
+    frame = Frame()
+    frame.text(0, 0, 'BTC 61234.50 +1.2%', '\033[32m')
+    frame.text(1, 0, 'ETH  3012.10 -0.4%', '\033[31m')
+    render(renderer, screen, frame)
+    assert visible(screen) == frame_cells(frame)
+
+    frame = Frame()
+    frame.text(0, 0, 'BTC 61235.70 +1.3%', '\033[32m')
+    frame.text(1, 0, 'ETH  3012.10 -0.4%', '\033[31m')
+    output = render(renderer, screen, frame)
+    assert visible(screen) == frame_cells(frame)
+
+    # One cursor move for the row: the unchanged '.' and ' +1.' are shorter written again.
+    assert len(re.findall(r'\033\[\d+;\d+H', output)) == 2
+    assert '5.70 +1.3' in output
+
+def test_render_long_gap_moves_the_cursor():
+    renderer = FrameRenderer(io.StringIO())
+    screen = {}
+
+    frame = Frame()
+    frame.text(0, 0, 'a' + ' ' * 30 + 'b')
+    render(renderer, screen, frame)
+
+    frame = Frame()
+    frame.text(0, 0, 'x' + ' ' * 30 + 'y')
+    output = render(renderer, screen, frame)
+    assert screen[(0, 0)] == ('x', '')
+    assert screen[(0, 31)] == ('y', '')
+    assert ' ' * 30 not in output
+
+def test_render_gap_keeps_styles():
+    renderer = FrameRenderer(io.StringIO())
+    screen = {}
+
+    frame = Frame()
+    frame.text(0, 0, 'ab', '\033[31m')
+    frame.text(0, 2, 'c', '\033[32m')
+    frame.text(0, 3, 'de', '\033[31m')
+    render(renderer, screen, frame)
+
+    frame = Frame()
+    frame.text(0, 0, 'xb', '\033[31m')
+    frame.text(0, 2, 'c', '\033[32m')
+    frame.text(0, 3, 'dy', '\033[31m')
+    render(renderer, screen, frame)
+    assert visible(screen) == frame_cells(frame)
+
+def test_render_shorter_row():
+    renderer = FrameRenderer(io.StringIO())
+    screen = {}
+
+    frame = Frame()
+    frame.text(0, 0, 'abcdef')
+    render(renderer, screen, frame)
+
+    frame = Frame()
+    frame.text(0, 0, 'abc')
+    render(renderer, screen, frame)
+    assert visible(screen) == frame_cells(frame)
+
+def test_render_unchanged():
+    renderer = FrameRenderer(io.StringIO())
+    frame = Frame()
+    frame.text(0, 0, 'abc')
+    renderer.render(frame)
+    assert renderer.render(frame) == 0
@@ -0,0 +1,178 @@
+import sys
+import pytest
+from pathlib import Path
+import importer
+from importer import PRESETS, CsvFormat, PortfolioWriter, csv_chunks, import_csv, split_market
+from portfolio_file import parse_portfolio_file
+
+BINANCE_CSV = '''Date(UTC),Market,Type,Price,Amount,Total,Fee,Fee Coin
+2024-01-01 10:00:00,BTCUSDT,BUY,42000,0.5,21000,0.0005,BNB
+2024-01-01 10:00:00,BTCUSDT,BUY,42000,0.5,21000,0.0005,BNB
+2024-01-02 11:00:00,ETHBTC,SELL,0.05,2,0.1,0,BTC
+2024-01-01 10:00:00,BTCUSDT,BUY,42000,0.5,21000,0.0005,BNB
+2024-01-03 12:00:00,BTCUSDT,HOLD,42000,0.5,21000,0,BNB
+'''
+
+COINBASE_CSV = '''portfolio,trade id,product,side,created at,size,size unit,price,fee,total,price/fee/total unit
+default,1001,BTC-EUR,BUY,2024-01-01T10:00:00.123Z,0.1,BTC,40000,4,-4004,EUR
+default,1002,ETH-EUR,SELL,2024-01-02T11:00:00Z,1,ETH,2000,2,1998,EUR
+default,1002,ETH-EUR,SELL,2024-01-02T11:00:00Z,1,ETH,2000,2,1998,EUR
+'''
+
+@pytest.mark.parametrize('market, separator, expected', [
+    ('BTC-EUR', '-', ('BTC', 'EUR')),
+    ('btc/eur', '-', ('BTC', 'EUR')),
+    ('ETH_BTC', '-', ('ETH', 'BTC')),
+    ('BTC|EUR', '|', ('BTC', 'EUR')),
+    ('BTCUSDT', '-', ('BTC', 'USDT')),
+    ('ETHBTC', '-', ('ETH', 'BTC')),
+    ('BTCFDUSD', '-', ('BTC', 'FDUSD')),
+    ('XXBTZEUR', '-', ('BTC', 'EUR')),
+    ('XBT-EUR', '-', ('BTC', 'EUR')),
+    ('XDGUSD', '-', ('DOGE', 'USD')),
+    (' btcusdt ', '-', ('BTC', 'USDT')),
+])
+def test_split_market(market: str, separator: str, expected: tuple[str, str]):
+    assert split_market(market, separator) == expected
+
+@pytest.mark.parametrize('market', ['FOOBAR', 'USDT', ''])
+def test_split_market_unknown(market: str):
+    with pytest.raises(ValueError, match='Unknown market'):
+        split_market(market)
+
+@pytest.mark.parametrize('name, header, expected', [
+    ('coinbase', COINBASE_CSV.splitlines()[0].split(','), {'id': 1, 'pair': 2, 'side': 3, 'date': 4, 'quantity': 5, 'price': 7, 'fee': 8, 'fee_symbol': 10}),
+    ('binance', BINANCE_CSV.splitlines()[0].split(','), {'date': 0, 'pair': 1, 'side': 2, 'price': 3, 'quantity': 4, 'total': 5, 'fee': 6, 'fee_symbol': 7}),
+    ('kraken', ['txid', 'ordertxid', 'pair', 'time', 'type', 'ordertype', 'price', 'cost', 'fee', 'vol'], {'id': 0, 'pair': 2, 'date': 3, 'side': 4, 'price': 6, 'total': 7, 'fee': 8, 'quantity': 9}),
+    ('generic', ['ID', 'Date', 'Base', 'Quote', 'Side', 'Total', 'Quantity'], {'id': 0, 'date': 1, 'base': 2, 'quote': 3, 'side': 4, 'total': 5, 'quantity': 6}),
+])
+def test_preset_indexes(name: str, header: list[str], expected: dict[str, int]):
+    assert CsvFormat(name, {}).indexes(header) == expected
+
+@pytest.mark.parametrize('name', list(PRESETS))
+def test_preset_missing_columns(name: str):
+    with pytest.raises(ValueError, match='Missing CSV columns'):
+        CsvFormat(name, {}).indexes(['foo', 'bar'])
+
+def test_format_columns():
+    fmt = CsvFormat('binance', {'pair': 'Symbol'})
+    indexes = fmt.indexes(['Date(UTC)', 'Symbol', 'Type', 'Price', 'Amount'])
+    assert indexes['pair'] == 1
+
+    with pytest.raises(ValueError, match='Unknown CSV format'):
+        CsvFormat('foo', {})
+    with pytest.raises(ValueError, match='Unknown CSV field'):
+        CsvFormat('binance', {'foo': 'bar'})
+
+def _records(fmt: CsvFormat, file: Path, jobs: int = 1) -> tuple[list[tuple[str, str, dict]], int]:
+    records = []
+    skipped = 0
+    for chunk_records, chunk_skipped in csv_chunks(fmt, file, jobs=jobs):
+        records.extend(chunk_records)
+        skipped += chunk_skipped
+    return records, skipped
+
+@pytest.mark.parametrize('jobs', [1, 2])
+@pytest.mark.parametrize('chunk_size', [16, 1024 * 1024])
+def test_repeated_rows_without_id(tmp_path: Path, monkeypatch, jobs: int, chunk_size: int):
+    monkeypatch.setattr(importer._read_chunks, '__defaults__', (chunk_size,))
+    file = tmp_path / 'trades.csv'
+    file.write_text(BINANCE_CSV)
+
+    records, skipped = _records(CsvFormat('binance', {}), file, jobs=jobs)
+    assert skipped == 1
+
+    ids = [trade_id for trade_id, _, _ in records]
+    first = ids[0]
+    assert ids == [first, f'{first}-2', ids[2], f'{first}-3']
+    assert len(set(ids)) == 4
+    assert [transaction['id'] for _, _, transaction in records] == ids
+
+    assert [pair for _, pair, _ in records] == ['USDT/BTC', 'USDT/BTC', 'BTC/ETH', 'USDT/BTC']
+    assert records[0][2] == {'id': first, 'date': '2024-01-01 10:00:00', 'type': 'buy', 'price': 42000.0, 'quantity': 0.5, 'fee': [0.0005, 'BNB']}
+    assert 'fee' not in records[2][2]
+
+    # The same rows get the same ids again.
+    assert [trade_id for trade_id, _, _ in _records(CsvFormat('binance', {}), file)[0]] == ids
+
+def test_rows_with_id(tmp_path: Path):
+    file = tmp_path / 'trades.csv'
+    file.write_text(COINBASE_CSV)
+
+    records, skipped = _records(CsvFormat('coinbase', {}), file)
+    assert skipped == 0
+    # Ids of the export are kept, duplicates are left to the writer.
+    assert [trade_id for trade_id, _, _ in records] == ['1001', '1002', '1002']
+    assert records[0][1] == 'EUR/BTC'
+    assert records[0][2]['date'] == '2024-01-01 10:00:00'
+    assert records[0][2]['fee'] == [4.0, 'EUR']
+
+def _import(fmt: CsvFormat, files: list[Path], output: Path, jobs: int = 1) -> PortfolioWriter:
+    writer = PortfolioWriter(output)
+    try:
+        import_csv(fmt, files, writer, fmt.name, jobs=jobs)
+        if writer.added > 0:
+            writer.write()
+    finally:
+        writer.close()
+    return writer
+
+@pytest.mark.parametrize('suffix', ['.json', '.yml'])
+@pytest.mark.parametrize('jobs', [1, 2])
+def test_import_again(tmp_path: Path, suffix: str, jobs: int):
+    if suffix == '.yml':
+        pytest.importorskip('yaml')
+
+    binance = tmp_path / 'binance.csv'
+    binance.write_text(BINANCE_CSV)
+    output = tmp_path / f'portfolio{suffix}'
+
+    writer = _import(CsvFormat('binance', {}), [binance], output, jobs=jobs)
+    assert (writer.added, writer.duplicates) == (4, 0)
+    content = output.read_bytes()
+
+    data = parse_portfolio_file(output)
+    assert [source['source'] for source in data['sources']] == ['binance']
+    pairs = data['sources'][0]['pairs']
+    assert [(pair['pair'], len(pair['transactions'])) for pair in pairs] == [('USDT/BTC', 3), ('BTC/ETH', 1)]
+
+    writer = _import(CsvFormat('binance', {}), [binance, binance], output, jobs=jobs)
+    assert (writer.added, writer.duplicates) == (0, 8)
+    assert output.read_bytes() == content
+
+def test_import_appends(tmp_path: Path):
+    binance = tmp_path / 'binance.csv'
+    binance.write_text(BINANCE_CSV)
+    coinbase = tmp_path / 'coinbase.csv'
+    coinbase.write_text(COINBASE_CSV)
+    output = tmp_path / 'portfolio.json'
+
+    _import(CsvFormat('binance', {}), [binance], output)
+    writer = _import(CsvFormat('coinbase', {}), [coinbase], output)
+    assert (writer.added, writer.duplicates) == (2, 1)
+
+    # A longer export of the same exchange adds only the new rows.
+    binance.write_text(BINANCE_CSV + '2024-01-04 13:00:00,BTCUSDT,SELL,43000,0.5,21500,0,BNB\n')
+    writer = _import(CsvFormat('binance', {}), [binance], output)
+    assert (writer.added, writer.duplicates) == (1, 4)
+
+    data = parse_portfolio_file(output)
+    assert [source['source'] for source in data['sources']] == ['binance', 'coinbase']
+    assert [len(pair['transactions']) for pair in data['sources'][0]['pairs']] == [4, 1]
+    assert [len(pair['transactions']) for pair in data['sources'][1]['pairs']] == [1, 1]
+
+def test_main(tmp_path: Path, monkeypatch, capsys):
+    binance = tmp_path / 'binance.csv'
+    binance.write_text(BINANCE_CSV)
+    output = tmp_path / 'portfolio.json'
+
+    monkeypatch.setattr(sys, 'argv', ['importer.py', 'binance', str(binance), '-o', str(output), '-j', '1'])
+    importer.main()
+    assert '-> imported: 4 transactions, 0 duplicates, 1 skipped rows' in capsys.readouterr().out
+
+    importer.main()
+    assert '-> imported: 0 transactions, 4 duplicates, 1 skipped rows' in capsys.readouterr().out
+
+def test_writer_unsupported(tmp_path: Path):
+    with pytest.raises(ValueError, match='Unsupported portfolio file'):
+        PortfolioWriter(tmp_path / 'portfolio.bpc')
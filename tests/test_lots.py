@@ -0,0 +1,170 @@
+import pytest
+from lots import LotBook, LotEngine
+from portfolio import Portfolio
+from transaction import Transaction
+
+def trx(pair: str, ttype: str, date: str, quantity: float, price: float|None = None, fee: list|None = None) -> Transaction:
+    d = {'date': date, 'type': ttype, 'quantity': quantity}
+    if price is not None:
+        d['price'] = price
+    if fee is not None:
+        d['fee'] = fee
+    return Transaction(source='test', pair=pair, d=d)
+
+def book_with_two_lots(method: str) -> LotBook:
+    book = LotBook('BTC', method)
+    book.acquire(1.0, 100.0)
+    book.acquire(1.0, 200.0)
+    return book
+
+@pytest.mark.parametrize('method, realized, cost', [
+    ('fifo', 200.0, 200.0),
+    ('lifo', 100.0, 100.0),
+    ('average', 150.0, 150.0),
+])
+def test_sell_one_lot(method: str, realized: float, cost: float):
+    book = book_with_two_lots(method)
+    assert book.sell(1.0, 300.0) == pytest.approx(realized)
+    assert book.realized == pytest.approx(realized)
+    assert book.quantity == pytest.approx(1.0)
+    assert book.cost == pytest.approx(cost)
+
+@pytest.mark.parametrize('method, cost', [
+    ('fifo', 100.0 + 100.0),
+    ('lifo', 200.0 + 50.0),
+    ('average', 225.0),
+])
+def test_dispose_splits_a_lot(method: str, cost: float):
+    book = book_with_two_lots(method)
+    assert book.dispose(1.5) == pytest.approx(cost)
+    assert book.quantity == pytest.approx(0.5)
+    assert book.cost == pytest.approx(300.0 - cost)
+
+def test_sell_beyond_lots_is_unmatched():
+    book = book_with_two_lots('fifo')
+    assert book.sell(3.0, 900.0) == pytest.approx(600.0)
+    assert book.unmatched == pytest.approx(1.0)
+    assert book.quantity == 0.0
+    assert book.cost == 0.0
+    assert len(book.lots) == 0
+
+def test_unknown_method():
+    with pytest.raises(ValueError):
+        LotBook('BTC', 'hifo')
+    with pytest.raises(ValueError):
+        LotEngine('hifo', 'EUR')
+
+def tree(method: str = 'fifo') -> tuple[Portfolio, Portfolio, Portfolio]:
+    lots = LotEngine(method, 'EUR')
+    root = Portfolio('root', lots=lots)
+    a = Portfolio('a', parent=root, lots=lots)
+    b = Portfolio('b', parent=root, lots=lots)
+    return root, a, b
+
+@pytest.mark.parametrize('method, realized, cost', [
+    ('fifo', 250.0 - 101.0, 200.0),
+    ('lifo', 250.0 - 200.0, 101.0),
+    ('average', 250.0 - 150.5, 150.5),
+])
+def test_buy_and_sell_against_convert(method: str, realized: float, cost: float):
+    lots = LotEngine(method, 'EUR')
+    portfolio = Portfolio('p', lots=lots)
+    # The fees are part of the cost of the lot and reduce the proceeds.
+    portfolio.add_transaction(trx('EUR/BTC', 'buy', '2024-01-01', 1.0, 100.0, fee=[1.0, 'EUR']))
+    portfolio.add_transaction(trx('EUR/BTC', 'buy', '2024-01-02', 1.0, 200.0))
+    portfolio.add_transaction(trx('EUR/BTC', 'sell', '2024-01-03', 1.0, 251.0, fee=[1.0, 'EUR']))
+
+    assert lots.realized(portfolio, 'BTC') == pytest.approx(realized)
+    assert lots.cost(portfolio, 'BTC') == pytest.approx(cost)
+    assert lots.unmatched(portfolio, 'BTC') == 0.0
+
+def test_trade_carries_the_cost_over():
+    lots = LotEngine('fifo', 'EUR')
+    portfolio = Portfolio('p', lots=lots)
+    portfolio.add_transaction(trx('EUR/BTC', 'buy', '2024-01-01', 1.0, 100.0))
+    # 0.5 BTC for 10 ETH, the ETH cost half of the BTC lot.
+    portfolio.add_transaction(trx('BTC/ETH', 'buy', '2024-01-02', 10.0, 0.05))
+
+    assert lots.cost(portfolio, 'BTC') == pytest.approx(50.0)
+    assert lots.cost(portfolio, 'ETH') == pytest.approx(50.0)
+    assert lots.realized(portfolio, 'BTC') == 0.0
+    assert lots.realized(portfolio, 'ETH') == 0.0
+
+def test_trade_without_lots_is_unmatched():
+    lots = LotEngine('fifo', 'EUR')
+    portfolio = Portfolio('p', lots=lots)
+    portfolio.add_transaction(trx('ETH/BTC', 'buy', '2024-01-02', 0.1, 20.0))
+
+    assert lots.unmatched(portfolio, 'ETH') == pytest.approx(2.0)
+    assert lots.cost(portfolio, 'BTC') == 0.0
+
+def test_priced_transfers():
+    lots = LotEngine('fifo', 'EUR')
+    portfolio = Portfolio('p', lots=lots)
+    portfolio.add_transaction(trx('BTC', 'in', '2024-01-01', 2.0, 100.0))
+    portfolio.add_transaction(trx('BTC', 'out', '2024-01-02', 1.0, 150.0))
+
+    assert lots.realized(portfolio, 'BTC') == pytest.approx(50.0)
+    assert lots.cost(portfolio, 'BTC') == pytest.approx(100.0)
+
+def test_unpriced_out_moves_lots_to_the_next_in():
+    root, a, b = tree()
+    a.add_transaction(trx('EUR/BTC', 'buy', '2024-01-01', 1.0, 100.0))
+    a.add_transaction(trx('EUR/BTC', 'buy', '2024-01-02', 1.0, 200.0))
+    a.add_transaction(trx('BTC', 'out', '2024-01-03', 1.5))
+    b.add_transaction(trx('BTC', 'in', '2024-01-04', 1.0))
+    b.add_transaction(trx('BTC', 'in', '2024-01-05', 1.0))
+
+    lots = root.lots
+    # Nothing is realized by moving lots.
+    assert lots.realized(a, 'BTC') == 0.0
+    assert lots.realized(b, 'BTC') == 0.0
+    assert lots.cost(a, 'BTC') == pytest.approx(100.0)
+    # 1.5 were moved at a cost of 200 (the first lot and half of the second),
+    # the second in takes the rest of them and 0.5 without lots at no cost.
+    assert lots.cost(b, 'BTC') == pytest.approx(200.0)
+    assert lots.book(b, 'BTC').quantity == pytest.approx(2.0)
+
+def test_unpriced_in_on_the_same_date_comes_after_the_out():
+    root, a, b = tree()
+    a.add_transaction(trx('EUR/BTC', 'buy', '2024-01-01', 1.0, 100.0))
+    b.add_transaction(trx('BTC', 'in', '2024-01-02', 1.0))
+    a.add_transaction(trx('BTC', 'out', '2024-01-02', 1.0))
+
+    assert root.lots.cost(b, 'BTC') == pytest.approx(100.0)
+    assert root.lots.cost(a, 'BTC') == 0.0
+
+def test_out_of_order_is_replayed():
+    transactions = [
+        trx('EUR/BTC', 'buy', '2024-01-01', 1.0, 100.0),
+        trx('EUR/BTC', 'buy', '2024-01-02', 1.0, 200.0),
+        trx('EUR/BTC', 'sell', '2024-01-03', 1.0, 300.0),
+        trx('EUR/BTC', 'buy', '2024-01-04', 1.0, 400.0),
+    ]
+
+    in_order = LotEngine('fifo', 'EUR')
+    p1 = Portfolio('p', lots=in_order)
+    for transaction in transactions:
+        p1.add_transaction(transaction)
+
+    out_of_order = LotEngine('fifo', 'EUR')
+    p2 = Portfolio('p', lots=out_of_order)
+    for i in (3, 0, 2, 1):
+        p2.add_transaction(transactions[i])
+
+    assert out_of_order.realized(p2, 'BTC') == pytest.approx(in_order.realized(p1, 'BTC')) == pytest.approx(200.0)
+    assert out_of_order.cost(p2, 'BTC') == pytest.approx(in_order.cost(p1, 'BTC')) == pytest.approx(600.0)
+
+    # Transactions in order after the replay are applied directly.
+    p2.add_transaction(trx('EUR/BTC', 'sell', '2024-01-05', 1.0, 500.0))
+    assert out_of_order.realized(p2, 'BTC') == pytest.approx(200.0 + 300.0)
+
+def test_remove_portfolio():
+    root, a, b = tree()
+    a.add_transaction(trx('EUR/BTC', 'buy', '2024-01-01', 1.0, 100.0))
+    a.add_transaction(trx('BTC', 'out', '2024-01-02', 1.0))
+    b.add_transaction(trx('BTC', 'in', '2024-01-03', 1.0))
+
+    # Without a, the in of b has no lots to take over.
+    root.lots.remove_portfolio(a)
+    assert root.lots.cost(b, 'BTC') == 0.0
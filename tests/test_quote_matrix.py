@@ -0,0 +1,50 @@
+import pytest
+
+np = pytest.importorskip('numpy')
+
+from quote_matrix import QuoteMatrix
+from quotes import Quotes
+
+QUOTES = {
+    'EUR': {'BTC': 60000.0, 'ETH': 3000.0},
+    'BTC': {'ETH': 0.05},
+}
+
+def test_get_many_like_quotes():
+    matrix = QuoteMatrix(QUOTES)
+    quotes = Quotes(QUOTES)
+
+    converts = ['EUR', 'EUR', 'BTC', 'EUR', 'ETH']
+    symbols = ['BTC', 'ETH', 'ETH', 'EUR', 'ETH']
+    assert matrix.get_many(converts, symbols).tolist() == [quotes.get(c, s) for c, s in zip(converts, symbols)]
+
+def test_get_many_unknown_does_not_change_the_matrix():
+    matrix = QuoteMatrix(QUOTES)
+    size = len(matrix.table)
+    shape = matrix.rates.shape
+
+    with pytest.raises(ValueError, match='symbol not found'):
+        matrix.get_many(['EUR', 'EUR'], ['BTC', 'DOGE'])
+    with pytest.raises(ValueError, match='convert not found'):
+        matrix.get_many(['USD'], ['BTC'])
+    with pytest.raises(ValueError):
+        matrix.get_many(['USD'], ['DOGE'])
+
+    assert len(matrix.table) == size
+    assert 'DOGE' not in matrix.table
+    assert matrix.rates.shape == shape
+
+def test_get_many_unknown_symbol_in_itself():
+    matrix = QuoteMatrix(QUOTES)
+    assert matrix.get_many(['XYZ', 'EUR'], ['XYZ', 'BTC']).tolist() == [1.0, 60000.0]
+    assert 'XYZ' not in matrix.table
+
+def test_get_many_ids_added_to_a_shared_table():
+    matrix = QuoteMatrix(QUOTES)
+    # More symbols than columns, added by another user of the table.
+    for n in range(200):
+        matrix.table.id(f'S{n}')
+
+    assert matrix.get_many(['EUR'], ['ETH']).tolist() == [3000.0]
+    with pytest.raises(ValueError):
+        matrix.get_many(['EUR'], ['S150'])
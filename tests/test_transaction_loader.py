@@ -0,0 +1,168 @@
+import gzip
+import json
+import pytest
+from pathlib import Path
+import transaction_loader
+from transaction_loader import data_transactions, stream_transactions, should_stream
+from portfolio_file import parse_portfolio_file
+
+PORTFOLIO = {
+    'sources': [
+        {
+            'source': 'binance',
+            'pairs': [
+                {
+                    'pair': 'EUR/BTC',
+                    'state': 'closed',
+                    'transactions': [
+                        {'date': '2024-01-01 10:00:00', 'type': 'buy', 'price': 61234.123456789, 'quantity': 0.000123456789, 'fee': [0.0001, 'BNB']},
+                        {'date': '2024-01-02', 'type': 'sell', 'price': 62000, 'quantity': 1e-5, 'state': 'open', 'note': 'ünïcode'},
+                        {'date': '2024-01-03', 'type': 'buy', 'price': 1, 'quantity': 2, 'ignore': True},
+                    ],
+                },
+                {
+                    'pair': 'EUR/ETH',
+                    'ignore': True,
+                    'transactions': [{'date': '2024-01-01', 'type': 'buy', 'price': 3000, 'quantity': 1}],
+                },
+                {
+                    'pair': 'EUR/ETH',
+                    'ignore': False,
+                    'transactions': [{'date': '2024-01-04', 'type': 'buy', 'price': 3000.5, 'quantity': 12345678901234567890, 'target': 4000}],
+                },
+            ],
+        },
+        {
+            'source': 'wallet',
+            'ignore': True,
+            'pairs': [{'pair': 'BTC', 'transactions': [{'date': '2024-01-05', 'type': 'in', 'quantity': 1}]}],
+        },
+        {
+            'source': 'ledger',
+            'note': {'nested': [1, 2, {'a': None}]},
+            'pairs': [
+                {'pair': 'ETH', 'transactions': [{'date': '2024-01-06', 'type': 'in', 'quantity': 3, 'location': 'cold'}]},
+                {'pair': 'BTC', 'transactions': []},
+            ],
+        },
+    ],
+}
+
+def reversed_keys(value):
+    # The same data with the keys of every map in reverse order: transactions
+    # before their pair, pairs before their source, sources before ignore.
+    if isinstance(value, dict):
+        return {key: reversed_keys(value[key]) for key in reversed(list(value))}
+    if isinstance(value, list):
+        return [reversed_keys(item) for item in value]
+    return value
+
+def tuples(transactions) -> list[tuple]:
+    return [
+        (t.source, t.pair_s, t.date, t.ttype, t.price, t.quantity, t._fee, t.state, t.location, t.note, t.target, t.ignore, t.extra)
+        for t in transactions
+    ]
+
+def write(path: Path, data: dict):
+    suffixes = path.suffixes
+    if '.yml' in suffixes:
+        yaml = pytest.importorskip('yaml')
+        raw = yaml.safe_dump(data, sort_keys=False, allow_unicode=True).encode('utf-8')
+    else:
+        raw = json.dumps(data, indent=1, ensure_ascii=False).encode('utf-8')
+
+    if path.suffix == '.gz':
+        raw = gzip.compress(raw)
+    elif path.suffix == '.zst':
+        zstandard = pytest.importorskip('zstandard')
+        raw = zstandard.ZstdCompressor().compress(raw)
+    path.write_bytes(raw)
+
+def assert_same(file: Path, data: dict, accept=None):
+    expected = data_transactions(file, data, accept)
+    assert tuples(stream_transactions(file, accept)) == tuples(expected)
+    # The file itself parses to the same data.
+    assert tuples(data_transactions(file, parse_portfolio_file(file), accept)) == tuples(expected)
+    return expected
+
+@pytest.mark.parametrize('name', ['p.json', 'p.yml', 'p.json.gz', 'p.yml.gz', 'p.json.zst', 'p.yml.zst'])
+def test_same_as_data_transactions(tmp_path: Path, name: str):
+    file = tmp_path / name
+    write(file, PORTFOLIO)
+    transactions = assert_same(file, PORTFOLIO)
+    assert [t.source for t in transactions] == ['binance', 'binance', 'binance', 'ledger']
+
+@pytest.mark.parametrize('name', ['p.json', 'p.yml'])
+def test_keys_in_any_order(tmp_path: Path, name: str):
+    data = reversed_keys(PORTFOLIO)
+    assert list(data['sources'][0]['pairs'][0])[0] == 'transactions'
+
+    file = tmp_path / name
+    write(file, data)
+    assert tuples(assert_same(file, data)) == tuples(data_transactions(file, PORTFOLIO))
+
+@pytest.mark.parametrize('name', ['p.json', 'p.yml'])
+def test_pair_after_transactions(tmp_path: Path, name: str):
+    data = {'sources': [{'source': 'x', 'pairs': [{'transactions': [{'date': '2024-01-01', 'type': 'buy', 'price': 1, 'quantity': 1}], 'state': 'open', 'pair': 'EUR/BTC'}]}]}
+    file = tmp_path / name
+    write(file, data)
+    transactions = assert_same(file, data)
+    assert transactions[0].pair_s == 'EUR/BTC'
+
+@pytest.mark.parametrize('name', ['p.json', 'p.yml'])
+@pytest.mark.parametrize('ignore', [True, False])
+def test_ignore_file(tmp_path: Path, name: str, ignore: bool):
+    for data in ({'ignore': ignore, **PORTFOLIO}, {**PORTFOLIO, 'ignore': ignore}):
+        file = tmp_path / name
+        write(file, data)
+        transactions = assert_same(file, data)
+        assert (len(transactions) == 0) == ignore
+
+@pytest.mark.parametrize('name', ['p.json', 'p.yml'])
+def test_accept(tmp_path: Path, name: str):
+    file = tmp_path / name
+    write(file, PORTFOLIO)
+    transactions = assert_same(file, PORTFOLIO, accept=lambda pair, d: d['type'] != 'sell')
+    assert all(t.ttype != 'sell' for t in transactions)
+
+@pytest.mark.parametrize('chunk_size', [1, 2, 3, 5, 7, 11, 16])
+def test_json_chunk_boundaries(tmp_path: Path, monkeypatch, chunk_size: int):
+    # Every value, including the long numbers, is split somewhere by a small chunk size.
+    monkeypatch.setattr(transaction_loader, 'CHUNK_SIZE', chunk_size)
+    file = tmp_path / 'p.json'
+    write(file, PORTFOLIO)
+    assert_same(file, PORTFOLIO)
+
+def test_json_number_at_chunk_end(tmp_path: Path, monkeypatch):
+    data = {'sources': [{'source': 'x', 'pairs': [{'pair': 'EUR/BTC', 'transactions': [{'date': '2024-01-01', 'type': 'buy', 'price': 1, 'quantity': 123456.789}]}]}]}
+    raw = json.dumps(data, separators=(',', ':'))
+    # The chunk ends in the middle of the number: 12345 | 6.789
+    monkeypatch.setattr(transaction_loader, 'CHUNK_SIZE', raw.index('123456.789') + 5)
+
+    file = tmp_path / 'p.json'
+    file.write_text(raw)
+    assert stream_transactions(file)[0].quantity == 123456.789
+
+@pytest.mark.parametrize('name', ['p.json', 'p.yml'])
+def test_without_sources(tmp_path: Path, name: str):
+    file = tmp_path / name
+    write(file, {'note': 'x'})
+    with pytest.raises(ValueError):
+        stream_transactions(file)
+    with pytest.raises(ValueError):
+        data_transactions(file, parse_portfolio_file(file))
+
+def test_invalid_json(tmp_path: Path):
+    file = tmp_path / 'p.json'
+    file.write_text('{"sources": [{"source": "x" "pairs": []}]}')
+    with pytest.raises(ValueError):
+        stream_transactions(file)
+
+def test_should_stream(tmp_path: Path):
+    file = tmp_path / 'p.json'
+    write(file, PORTFOLIO)
+    assert not should_stream(file)
+    assert should_stream(file, stream_size=10)
+    assert not should_stream(file, stream_size=None)
+    assert should_stream(tmp_path / 'p.json.gz')
+    assert not should_stream(tmp_path / 'p.bpc', stream_size=0)
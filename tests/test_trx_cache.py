@@ -0,0 +1,170 @@
+import os
+import json
+import pytest
+from pathlib import Path
+from trx_cache import TrxCache, ENTRY_SUFFIX
+
+PORTFOLIO = {
+    'sources': [{
+        'source': 'exchange',
+        'pairs': [{
+            'pair': 'EUR/BTC',
+            'transactions': [
+                {'date': '2024-01-01', 'type': 'buy', 'price': 100, 'quantity': 2},
+                {'date': '2024-01-02', 'type': 'sell', 'price': 150.5, 'quantity': 1, 'fee': [0.5, 'EUR']},
+            ],
+        }],
+    }],
+}
+
+def write_portfolio(file: Path, data: dict, mtime_ns: int = 1_700_000_000_000_000_000):
+    file.write_text(json.dumps(data))
+    os.utime(file, ns=(mtime_ns, mtime_ns))
+
+def entries(cache: TrxCache) -> list[Path]:
+    return sorted(cache.path.glob(f'*{ENTRY_SUFFIX}'))
+
+@pytest.fixture
+def cache(tmp_path: Path) -> TrxCache:
+    return TrxCache(tmp_path / 'cache')
+
+@pytest.fixture
+def file(tmp_path: Path) -> Path:
+    file = tmp_path / 'portfolio.json'
+    write_portfolio(file, PORTFOLIO)
+    return file
+
+def test_miss_then_hit(cache: TrxCache, file: Path):
+    assert cache.load(file) == PORTFOLIO
+    assert (cache.hits, cache.misses) == (0, 1)
+    assert len(entries(cache)) == 1
+
+    assert cache.load(file) == PORTFOLIO
+    assert (cache.hits, cache.misses) == (1, 1)
+
+def test_hit_does_not_read_the_file(cache: TrxCache, file: Path, monkeypatch):
+    cache.load(file)
+
+    def parse(*args):
+        raise AssertionError('parsed again')
+    monkeypatch.setattr('trx_cache.parse_portfolio_file', parse)
+
+    assert cache.load(file) == PORTFOLIO
+    assert cache.hits == 1
+
+def test_new_cache_reuses_entries(cache: TrxCache, file: Path):
+    cache.load(file)
+
+    cache = TrxCache(cache.path)
+    assert cache.load(file) == PORTFOLIO
+    assert (cache.hits, cache.misses) == (1, 0)
+
+def test_mtime_change_same_content(cache: TrxCache, file: Path):
+    cache.load(file)
+    os.utime(file, ns=(1_800_000_000_000_000_000, 1_800_000_000_000_000_000))
+
+    # The sha256 is the same, the entry is reused and gets the new mtime.
+    assert cache.load(file) == PORTFOLIO
+    assert (cache.hits, cache.misses) == (1, 1)
+
+    cache.load(file)
+    assert (cache.hits, cache.misses) == (2, 1)
+
+def test_size_change(cache: TrxCache, file: Path):
+    cache.load(file)
+
+    changed = json.loads(json.dumps(PORTFOLIO))
+    changed['sources'][0]['pairs'][0]['transactions'].append({'date': '2024-01-03', 'type': 'buy', 'price': 90, 'quantity': 1})
+    write_portfolio(file, changed)
+
+    assert cache.load(file) == changed
+    assert (cache.hits, cache.misses) == (0, 2)
+    assert cache.load(file) == changed
+    assert cache.hits == 1
+
+def test_content_change_same_size(cache: TrxCache, file: Path):
+    cache.load(file)
+    size = file.stat().st_size
+
+    changed = json.loads(json.dumps(PORTFOLIO))
+    changed['sources'][0]['pairs'][0]['transactions'][0]['price'] = 200
+    write_portfolio(file, changed, mtime_ns=1_800_000_000_000_000_000)
+    assert file.stat().st_size == size
+
+    assert cache.load(file) == changed
+    assert (cache.hits, cache.misses) == (0, 2)
+
+def test_rebuild(tmp_path: Path, file: Path):
+    TrxCache(tmp_path / 'cache').load(file)
+
+    cache = TrxCache(tmp_path / 'cache', rebuild=True)
+    assert cache.load(file) == PORTFOLIO
+    assert (cache.hits, cache.misses) == (0, 1)
+
+def test_broken_entry(cache: TrxCache, file: Path):
+    cache.load(file)
+    entry_path, = entries(cache)
+    entry_path.write_bytes(entry_path.read_bytes()[:60])
+
+    assert cache.load(file) == PORTFOLIO
+    assert cache.misses == 2
+    assert cache.load(file) == PORTFOLIO
+    assert cache.hits == 1
+
+def test_evict_least_recently_used(tmp_path: Path):
+    cache = TrxCache(tmp_path / 'cache')
+    files = []
+    for i in range(3):
+        file = tmp_path / f'p{i}.json'
+        write_portfolio(file, PORTFOLIO)
+        cache.load(file)
+        files.append(file)
+
+    entry_paths = {file: cache._entry_path(file.resolve()) for file in files}
+    for i, file in enumerate(files):
+        os.utime(entry_paths[file], ns=(i * 1_000_000_000, i * 1_000_000_000))
+
+    # A hit makes the entry the most recently used one.
+    cache.load(files[0])
+
+    size = entry_paths[files[0]].stat().st_size
+    cache.max_size = size * 2
+    cache.evict()
+
+    assert not entry_paths[files[1]].exists()
+    assert entry_paths[files[0]].exists()
+    assert entry_paths[files[2]].exists()
+
+def test_evict_under_max_size(cache: TrxCache, file: Path):
+    cache.load(file)
+    cache.evict()
+    assert len(entries(cache)) == 1
+
+def test_not_representable_is_not_cached(cache: TrxCache, tmp_path: Path):
+    pytest.importorskip('yaml')
+
+    # An unquoted YAML date is parsed as datetime.date, which the compiled format can't keep.
+    file = tmp_path / 'portfolio.yml'
+    file.write_text('sources:\n- source: x\n  pairs:\n  - pair: EUR/BTC\n    transactions:\n    - date: 2024-01-01\n      type: buy\n      price: 1\n      quantity: 2\n')
+
+    raw_data = cache.load(file)
+    assert raw_data['sources'][0]['pairs'][0]['transactions'][0]['date'].isoformat() == '2024-01-01'
+    assert entries(cache) == []
+
+    assert cache.load(file) == raw_data
+    assert (cache.hits, cache.misses) == (0, 2)
+
+def test_without_sources_is_not_cached(cache: TrxCache, tmp_path: Path):
+    file = tmp_path / 'portfolio.json'
+    write_portfolio(file, {'ignore': True})
+
+    assert cache.load(file) == {'ignore': True}
+    assert entries(cache) == []
+
+def test_write_failure_leaves_no_tmp_file(cache: TrxCache, file: Path, monkeypatch):
+    def replace(src, dst):
+        raise OSError(28, 'No space left on device')
+    monkeypatch.setattr('trx_cache.os.replace', replace)
+
+    assert cache.load(file) == PORTFOLIO
+    assert list(cache.path.iterdir()) == []